@@ -0,0 +1,93 @@
+"""
+Two-replica check of the StateStore contract. No network.
+
+    python bench/check_state_store.py
+    python bench/check_state_store.py --backend redis
+
+Two "replicas" (lease owners) share one store - SQLiteStateStore on a
+temp file, or RedisStateStore over bench.fakes.FakeRedis - and go
+through what run_tracker relies on: one owner per lease, renewal,
+takeover once the holder stops renewing, the old holder noticing it
+lost the lease, and put_if_absent deciding which replica starts a run.
+Exits non-zero on the first broken expectation.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FakeRedis  # noqa: E402
+
+
+# Lease / key ttl in seconds; short so expiry is part of the check
+TTL = 0.3
+
+
+def _stores(backend: str):
+    """Two store instances sharing one backend, as two replicas would."""
+    from databricks.state_store import RedisStateStore, SQLiteStateStore
+
+    if backend == "redis":
+        redis = FakeRedis()
+        return RedisStateStore(redis, prefix="check:"), RedisStateStore(redis, prefix="check:")
+    path = os.path.join(tempfile.mkdtemp(prefix="state-check-"), "state.sqlite")
+    return SQLiteStateStore(path), SQLiteStateStore(path)
+
+
+def check(backend: str) -> None:
+    a, b = _stores(backend)
+    lease = "run:check"
+
+    def expect(condition: bool, what: str) -> None:
+        print(f"   {'✅' if condition else '❌'} {what}")
+        if not condition:
+            raise SystemExit(f"{backend}: {what}")
+
+    print(f"🔎 {backend}")
+
+    # Dedupe: only one replica registers the in-flight run
+    expect(a.put_if_absent("inflight:k", {"handle_id": "a"}, ttl=TTL), "A registers the in-flight run")
+    expect(not b.put_if_absent("inflight:k", {"handle_id": "b"}, ttl=TTL), "B sees A's in-flight run")
+    expect((b.get("inflight:k") or {}).get("handle_id") == "a", "B reads A's handle")
+
+    # Lease: A holds and renews it, B cannot take it meanwhile
+    expect(a.acquire_lease(lease, "replica-a", TTL), "A takes the run lease")
+    expect(not b.acquire_lease(lease, "replica-b", TTL), "B is refused while A holds it")
+    time.sleep(TTL * 0.6)
+    expect(a.acquire_lease(lease, "replica-a", TTL), "A renews the lease")
+    time.sleep(TTL * 0.6)
+    expect(not b.acquire_lease(lease, "replica-b", TTL), "B is still refused after A renewed")
+
+    # Handoff: A stops renewing (dies), B takes over, A has lost it
+    time.sleep(TTL * 1.2)
+    expect(b.acquire_lease(lease, "replica-b", TTL), "B takes over once A's lease expired")
+    expect(not a.acquire_lease(lease, "replica-a", TTL), "A finds its lease lost")
+    a.release_lease(lease, "replica-a")
+    expect(not a.acquire_lease(lease, "replica-a", TTL), "A's release leaves B's lease alone")
+    b.release_lease(lease, "replica-b")
+    expect(a.acquire_lease(lease, "replica-a", TTL), "the lease is free after B releases it")
+
+    # The in-flight entry expired with its ttl; the next run can register
+    expect(b.get("inflight:k") is None, "the in-flight entry expired")
+    expect(b.put_if_absent("inflight:k", {"handle_id": "b"}, ttl=TTL), "B registers the next run")
+    b.delete("inflight:k")
+    expect(a.get("inflight:k") is None, "delete is visible to A")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["sqlite", "redis", "all"], default="all")
+    args = parser.parse_args(argv)
+
+    for backend in (["sqlite", "redis"] if args.backend == "all" else [args.backend]):
+        check(backend)
+    print("✅ StateStore contract holds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
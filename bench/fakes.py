@@ -0,0 +1,611 @@
+"""
+Local stand-ins for the Databricks Jobs API and Azure Storage.
+
+FakeJobsServer is a real HTTP server (so requests sessions, timeouts
+and response handling run exactly as in production) that implements
+jobs/run-now, jobs/runs/submit, jobs/runs/get, jobs/runs/list,
+jobs/runs/get-output, jobs/runs/cancel and jobs/get, plus clusters/get and
+instance-pools/get for warm submission.
+Each run walks through PENDING -> RUNNING -> TERMINATED on a timeline
+and, like the real Python task, writes result.json into a FakeBlobStore
+before it exits and prints {"drive_link": ...} as its last log line.
+
+The storage fakes are in-process objects with the small slice of the
+azure-storage-blob / azure-storage-file-datalake client API the app uses;
+FakeRedis does the same for the Redis state store backend.
+"""
+
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceNotModifiedError
+
+
+# ------------------------------------------------------------
+# Scenario
+# ------------------------------------------------------------
+@dataclass
+class FakeTimings:
+    """
+    Durations in simulated seconds. Everything is multiplied by
+    time_scale, which the harness also applies to the app's poll delays
+    (POLL_TIME_SCALE), so a 2-minute cluster start replays in ~1s.
+    """
+
+    pending_s: float = 120.0       # queueing + job cluster start
+    warm_pending_s: float = 3.0    # runs/submit onto a running cluster
+    pool_pending_s: float = 40.0   # runs/submit onto a cluster from idle pool instances
+    running_s: float = 60.0        # job runtime
+    terminating_s: float = 2.0
+    jitter: float = 0.2            # +/- fraction applied to each run's durations
+    api_latency_s: float = 0.15    # per Jobs API request
+    blob_latency_s: float = 0.05   # per blob download / datalake call
+    error_rate: float = 0.0        # fraction of Jobs API requests answered 503
+    job_failure_rate: float = 0.0  # fraction of runs ending with result_state FAILED
+    log_link_rate: float = 1.0     # fraction of runs printing the drive link last
+    rate_limit: float = 0.0        # Jobs API requests / simulated second; 0 = unlimited
+    max_concurrent_runs: int = 0   # job setting; runs past it are SKIPPED; 0 = unlimited
+    warm_cluster_running: bool = True
+    pool_idle_instances: int = 4
+    time_scale: float = 0.01
+
+    def scaled(self, seconds: float) -> float:
+        return seconds * self.time_scale
+
+
+class CallCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+
+    def add(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.calls)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+
+
+# ------------------------------------------------------------
+# Blob storage
+# ------------------------------------------------------------
+class FakeBlobStore:
+    """
+    container/blob -> [(visible_from, bytes), ...]. A blob can be given
+    several versions up front (e.g. progress.json during a run); reads
+    see the newest one already visible.
+    """
+
+    def __init__(self, timings: FakeTimings, counter: CallCounter):
+        self.timings = timings
+        self.counter = counter
+        self._lock = threading.Lock()
+        self._blobs: Dict[str, list] = {}
+
+    def put(self, path: str, data: bytes, visible_from: Optional[float] = None) -> None:
+        """Replaces the blob."""
+        with self._lock:
+            self._blobs[path] = [(visible_from or time.time(), data)]
+
+    def put_version(self, path: str, data: bytes, visible_from: float) -> None:
+        """Adds a version that overwrites the blob once visible_from passes."""
+        with self._lock:
+            versions = self._blobs.setdefault(path, [])
+            versions.append((visible_from, data))
+            versions.sort(key=lambda v: v[0])
+
+    def delete_after(self, path: str, moment: float) -> None:
+        """Drops versions that would become visible after moment."""
+        with self._lock:
+            versions = [v for v in self._blobs.get(path, []) if v[0] <= moment]
+            if versions:
+                self._blobs[path] = versions
+            else:
+                self._blobs.pop(path, None)
+
+    def _visible(self, path: str) -> Optional[tuple]:
+        now = time.time()
+        with self._lock:
+            versions = [v for v in self._blobs.get(path, []) if v[0] <= now]
+        return versions[-1] if versions else None
+
+    def get(self, path: str) -> tuple:
+        """(etag, bytes) of the newest visible version."""
+        time.sleep(self.timings.scaled(self.timings.blob_latency_s))
+        entry = self._visible(path)
+        if entry is None:
+            raise ResourceNotFoundError(f"The specified blob does not exist: {path}")
+        return f'"{hash(entry):x}"', entry[1]
+
+    def exists(self, path: str) -> bool:
+        return self._visible(path) is not None
+
+
+class _Download:
+    def __init__(self, etag: str, data: bytes):
+        self._data = data
+        self.properties = type("BlobProperties", (), {"etag": etag})()
+
+    def readall(self) -> bytes:
+        return self._data
+
+
+class FakeBlobClient:
+    def __init__(self, store: FakeBlobStore, path: str):
+        self.store = store
+        self.path = path
+
+    def download_blob(self, etag: Optional[str] = None, match_condition=None) -> _Download:
+        self.store.counter.add("blob/download")
+        current, data = self.store.get(self.path)
+        if match_condition == MatchConditions.IfModified and etag == current:
+            raise ResourceNotModifiedError("The condition specified using HTTP conditional header(s) is not met.")
+        return _Download(current, data)
+
+
+class FakeBlobService:
+    """Drop-in for databricks.clients.blob_service(...)."""
+
+    def __init__(self, store: FakeBlobStore):
+        self.store = store
+
+    def get_blob_client(self, container: str, blob: str) -> FakeBlobClient:
+        return FakeBlobClient(self.store, f"{container}/{blob}")
+
+
+class FakeDataLakeFile:
+    def __init__(self, store: FakeBlobStore, path: str):
+        self.store = store
+        self.path = path
+        self._chunks = []
+
+    def _call(self, name: str) -> None:
+        self.store.counter.add(f"datalake/{name}")
+        time.sleep(self.store.timings.scaled(self.store.timings.blob_latency_s))
+
+    def exists(self) -> bool:
+        self._call("exists")
+        return self.store.exists(self.path)
+
+    def create_file(self) -> None:
+        self._call("create")
+        self._chunks = []
+
+    def append_data(self, data: bytes, offset: int, length: int) -> None:
+        self._call("append")
+        self._chunks.append(bytes(data))
+
+    def flush_data(self, offset: int) -> None:
+        self._call("flush")
+        self.store.put(self.path, b"".join(self._chunks))
+
+
+class FakeDataLakeService:
+    """Drop-in for databricks.clients.datalake_service(...)."""
+
+    def __init__(self, store: FakeBlobStore):
+        self.store = store
+
+    def get_file_system_client(self, file_system: str):
+        service = self
+
+        class _FileSystem:
+            def get_file_client(self, path: str) -> FakeDataLakeFile:
+                return FakeDataLakeFile(service.store, f"{file_system}/{path}")
+
+        return _FileSystem()
+
+
+# ------------------------------------------------------------
+# Redis
+# ------------------------------------------------------------
+class FakeRedis:
+    """
+    In-process stand-in for the slice of redis-py RedisStateStore uses
+    (get / set with nx and px / delete / pexpire). Values come back as
+    bytes, like a client without decode_responses. Several app
+    "replicas" sharing one instance behave like replicas sharing a
+    Redis server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (bytes, expires_at or None)
+        self._data: Dict[str, tuple] = {}
+        self.calls = 0
+
+    def _live(self, key: str) -> Optional[tuple]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            self.calls += 1
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key: str, value, px: Optional[int] = None, nx: bool = False, **_) -> Optional[bool]:
+        data = value.encode() if isinstance(value, str) else value
+        with self._lock:
+            self.calls += 1
+            if nx and self._live(key) is not None:
+                return None
+            self._data[key] = (data, time.time() + px / 1000 if px else None)
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            self.calls += 1
+            return sum(1 for k in keys if self._data.pop(k, None) is not None)
+
+    def pexpire(self, key: str, px: int) -> bool:
+        with self._lock:
+            self.calls += 1
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._data[key] = (entry[0], time.time() + px / 1000)
+            return True
+
+
+# ------------------------------------------------------------
+# Jobs API
+# ------------------------------------------------------------
+class _Run:
+    def __init__(
+        self,
+        run_id: int,
+        job_id: Optional[int],
+        params: dict,
+        timings: FakeTimings,
+        pending_s: float,
+    ):
+        def span(seconds):
+            return timings.scaled(seconds * random.uniform(1 - timings.jitter, 1 + timings.jitter))
+
+        self.run_id = run_id
+        self.job_id = job_id
+        self.params = params
+        self.start = time.time()
+        self.running_at = self.start + span(pending_s)
+        self.terminating_at = self.running_at + span(timings.running_s)
+        self.terminated_at = self.terminating_at + timings.scaled(timings.terminating_s)
+        self.failed = random.random() < timings.job_failure_rate
+        self.skipped_at_limit: Optional[int] = None
+        self.cancelled = False
+        self.prints_link = random.random() < timings.log_link_rate
+        self.timings = timings
+
+    def cancel(self, now: float) -> None:
+        if now >= self.terminating_at:
+            return
+        self.cancelled = True
+        self.running_at = min(self.running_at, now)
+        self.terminating_at = now
+        self.terminated_at = now + self.timings.scaled(self.timings.terminating_s)
+
+    def skip(self, limit: int) -> None:
+        """Never starts, as when the job is already at max_concurrent_runs."""
+        self.skipped_at_limit = limit
+        self.running_at = self.terminating_at = self.terminated_at = self.start
+
+    def state(self, now: float) -> dict:
+        if self.skipped_at_limit is not None:
+            return {
+                "life_cycle_state": "SKIPPED",
+                "state_message": f"Skipping this run because the limit of {self.skipped_at_limit} "
+                                 "maximum concurrent runs has been reached.",
+            }
+        if now < self.running_at:
+            return {"life_cycle_state": "PENDING", "state_message": "Waiting for cluster"}
+        if now < self.terminating_at:
+            return {"life_cycle_state": "RUNNING", "state_message": ""}
+        if now < self.terminated_at:
+            return {"life_cycle_state": "TERMINATING", "state_message": ""}
+        if self.cancelled:
+            result_state = "CANCELED"
+        else:
+            result_state = "FAILED" if self.failed else "SUCCESS"
+        return {
+            "life_cycle_state": "TERMINATED",
+            "result_state": result_state,
+            "state_message": "",
+        }
+
+    def as_dict(self, now: float) -> dict:
+        return {
+            "run_id": self.run_id,
+            "job_id": self.job_id,
+            "start_time": int(self.start * 1000),
+            "state": self.state(now),
+        }
+
+
+class FakeJobsServer:
+    """
+    Threaded HTTP server for the Jobs 2.1 endpoints the app calls.
+    `counter` records every request by endpoint, including rejected ones.
+    """
+
+    def __init__(self, blobs: FakeBlobStore, timings: FakeTimings, counter: CallCounter):
+        self.blobs = blobs
+        self.timings = timings
+        self.counter = counter
+        self.runs: Dict[int, _Run] = {}
+        # idempotency_token -> run_id
+        self._tokens: Dict[str, int] = {}
+        self.peak_active_runs = 0
+        self.skipped_runs = 0
+        self._next_run_id = 1000
+        self._lock = threading.Lock()
+        self._bucket = 0.0
+        self._bucket_at = time.time()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def start(self) -> "FakeJobsServer":
+        threading.Thread(target=self._httpd.serve_forever, name="fake-jobs", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+
+    def active_runs(self) -> int:
+        now = time.time()
+        with self._lock:
+            return sum(1 for r in self.runs.values() if r.terminated_at > now)
+
+    # --------------------------------------------------------
+    # Request handling
+    # --------------------------------------------------------
+    def _rate_limited(self) -> bool:
+        """Token bucket in simulated time; one second of burst."""
+        if not self.timings.rate_limit:
+            return False
+        with self._lock:
+            now = time.time()
+            elapsed = (now - self._bucket_at) / self.timings.time_scale
+            self._bucket = min(self.timings.rate_limit, self._bucket + elapsed * self.timings.rate_limit)
+            self._bucket_at = now
+            if self._bucket < 1:
+                return True
+            self._bucket -= 1
+            return False
+
+    def _start_run(self, job_id: Optional[int], params: dict, pending_s: float) -> _Run:
+        with self._lock:
+            self._next_run_id += 1
+            run = _Run(self._next_run_id, job_id, params, self.timings, pending_s)
+            active = sum(1 for r in self.runs.values() if r.terminated_at > run.start)
+            limit = self.timings.max_concurrent_runs
+            if limit and active >= limit:
+                run.skip(limit)
+                self.skipped_runs += 1
+            else:
+                active += 1
+            self.runs[run.run_id] = run
+            self.peak_active_runs = max(self.peak_active_runs, active)
+        if run.skipped_at_limit is not None:
+            return run
+
+        result_path = params.get("result_path") or (
+            f"{params['client_name']}/{params['use_case_name']}"
+        )
+        # progress.json after each stage, as the real job writes it
+        stages = ("extract", "map", "price")
+        for i, stage in enumerate(stages, start=1):
+            self.blobs.put_version(
+                f"finops-output/{result_path}/progress.json",
+                json.dumps({
+                    "stage": stage,
+                    "stages_done": list(stages[:i]),
+                    "resources": [{"resource": f"r{n}", "monthly_cost": 100.0} for n in range(i * 2)],
+                    "subtotal": {"Azure": 200.0 * i},
+                }).encode(),
+                visible_from=run.running_at + (run.terminating_at - run.running_at) * i / (len(stages) + 1),
+            )
+        if not run.failed:
+            self.blobs.put(
+                f"finops-output/{result_path}/result.json",
+                json.dumps({"drive_link": f"https://drive.example/{run.run_id}"}).encode(),
+                visible_from=run.terminating_at,
+            )
+        return run
+
+    def _known_run(self, body: dict) -> Optional[_Run]:
+        token = body.get("idempotency_token")
+        with self._lock:
+            return self.runs.get(self._tokens.get(token)) if token else None
+
+    def _remember_token(self, body: dict, run: _Run) -> None:
+        if body.get("idempotency_token"):
+            with self._lock:
+                self._tokens[body["idempotency_token"]] = run.run_id
+
+    def _run_now(self, body: dict):
+        run = self._known_run(body)
+        if run is None:
+            params = json.loads(body["python_params"][0])
+            run = self._start_run(body["job_id"], params, self.timings.pending_s)
+            self._remember_token(body, run)
+        return 200, {"run_id": run.run_id, "number_in_job": run.run_id}
+
+    def _runs_submit(self, body: dict):
+        known = self._known_run(body)
+        if known is not None:
+            return 200, {"run_id": known.run_id}
+        task = body["tasks"][0]
+        params = json.loads(task["spark_python_task"]["parameters"][0])
+        if "existing_cluster_id" in task:
+            pending_s = self.timings.warm_pending_s
+        elif "instance_pool_id" in (task.get("new_cluster") or {}):
+            pending_s = self.timings.pool_pending_s
+        else:
+            pending_s = self.timings.pending_s
+        # One-off runs do not belong to a job, so runs/list never returns them
+        run = self._start_run(None, params, pending_s)
+        self._remember_token(body, run)
+        return 200, {"run_id": run.run_id}
+
+    def _runs_cancel(self, body: dict):
+        run = self.runs.get(int(body["run_id"]))
+        if run is None:
+            return 400, {"error_code": "INVALID_PARAMETER_VALUE", "message": "Run not found"}
+        now = time.time()
+        with self._lock:
+            run.cancel(now)
+        if run.cancelled:
+            result_path = run.params.get("result_path") or (
+                f"{run.params['client_name']}/{run.params['use_case_name']}"
+            )
+            self.blobs.delete_after(f"finops-output/{result_path}/result.json", now)
+            self.blobs.delete_after(f"finops-output/{result_path}/progress.json", now)
+        return 200, {}
+
+    def _jobs_get(self, query: dict):
+        return 200, {
+            "job_id": int(query["job_id"][0]),
+            "settings": {
+                "name": "finops-estimate",
+                "job_clusters": [{
+                    "job_cluster_key": "estimate",
+                    "new_cluster": {
+                        "spark_version": "15.4.x-scala2.12",
+                        "node_type_id": "Standard_DS3_v2",
+                        "num_workers": 1,
+                    },
+                }],
+                "tasks": [{
+                    "task_key": "estimate",
+                    "job_cluster_key": "estimate",
+                    "spark_python_task": {"python_file": "dbfs:/finops/estimate.py"},
+                }],
+            },
+        }
+
+    def _clusters_get(self, query: dict):
+        state = "RUNNING" if self.timings.warm_cluster_running else "TERMINATED"
+        return 200, {"cluster_id": query["cluster_id"][0], "state": state}
+
+    def _pools_get(self, query: dict):
+        return 200, {
+            "instance_pool_id": query["instance_pool_id"][0],
+            "stats": {"idle_count": self.timings.pool_idle_instances, "used_count": 0},
+        }
+
+    def _runs_get(self, query: dict):
+        run = self.runs.get(int(query["run_id"][0]))
+        if run is None:
+            return 400, {"error_code": "INVALID_PARAMETER_VALUE", "message": "Run not found"}
+        return 200, run.as_dict(time.time())
+
+    def _runs_get_output(self, query: dict):
+        run = self.runs.get(int(query["run_id"][0]))
+        if run is None:
+            return 400, {"error_code": "INVALID_PARAMETER_VALUE", "message": "Run not found"}
+        body = {"metadata": run.as_dict(time.time())}
+        if run.state(time.time())["life_cycle_state"] == "TERMINATED":
+            lines = ["Extracting resources", "Writing result.json"]
+            if run.prints_link:
+                lines.append(json.dumps({"drive_link": f"https://drive.example/{run.run_id}"}))
+            body["logs"] = "\n".join(lines) + "\n"
+            body["logs_truncated"] = False
+        return 200, body
+
+    def _runs_list(self, query: dict):
+        now = time.time()
+        job_id = int(query["job_id"][0])
+        since = int(query.get("start_time_from", ["0"])[0]) / 1000
+        limit = int(query.get("limit", ["25"])[0])
+        offset = int(query.get("page_token", ["0"])[0])
+
+        with self._lock:
+            runs = sorted(
+                (r for r in self.runs.values() if r.job_id == job_id and r.start >= since),
+                key=lambda r: r.start,
+                reverse=True,
+            )
+        page = runs[offset:offset + limit]
+        body = {"runs": [r.as_dict(now) for r in page], "has_more": offset + limit < len(runs)}
+        if body["has_more"]:
+            body["next_page_token"] = str(offset + limit)
+        return 200, body
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, body: dict, headers: Optional[dict] = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, method: str):
+                parsed = urlparse(self.path)
+                endpoint = parsed.path.replace("/api/2.1/", "").replace("/api/2.0/", "")
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                server.counter.add(endpoint)
+
+                time.sleep(server.timings.scaled(server.timings.api_latency_s))
+
+                if server._rate_limited():
+                    self._reply(429, {"error_code": "REQUEST_LIMIT_EXCEEDED"}, {"Retry-After": "1"})
+                    return
+                if random.random() < server.timings.error_rate:
+                    self._reply(503, {"error_code": "TEMPORARILY_UNAVAILABLE"})
+                    return
+
+                routes = {
+                    ("POST", "jobs/run-now"): lambda: server._run_now(body),
+                    ("GET", "jobs/runs/get"): lambda: server._runs_get(parse_qs(parsed.query)),
+                    ("GET", "jobs/runs/list"): lambda: server._runs_list(parse_qs(parsed.query)),
+                    ("GET", "jobs/runs/get-output"): lambda: server._runs_get_output(parse_qs(parsed.query)),
+                    ("POST", "jobs/runs/submit"): lambda: server._runs_submit(body),
+                    ("POST", "jobs/runs/cancel"): lambda: server._runs_cancel(body),
+                    ("GET", "jobs/get"): lambda: server._jobs_get(parse_qs(parsed.query)),
+                    ("GET", "clusters/get"): lambda: server._clusters_get(parse_qs(parsed.query)),
+                    ("GET", "instance-pools/get"): lambda: server._pools_get(parse_qs(parsed.query)),
+                }
+                route = routes.get((method, endpoint))
+                if route is None:
+                    self._reply(404, {"error_code": "ENDPOINT_NOT_FOUND"})
+                    return
+                self._reply(*route())
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
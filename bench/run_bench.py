@@ -0,0 +1,339 @@
+"""
+Offline orchestrator benchmark. No network, no cluster time.
+
+    python bench/run_bench.py
+    python bench/run_bench.py --levels 1,16,64,128 --rate-limit 30 --error-rate 0.02
+
+Runs the real submit_estimate -> trigger_job -> wait_for_run ->
+fetch_result (run output, result.json fallback) path, and upload_files -> upload_to_adls,
+against bench/fakes.py: a local HTTP server for the Jobs API and
+in-process Blob / Data Lake fakes. Simulated durations (cluster start,
+job runtime, poll delays) are compressed by --time-scale; reported
+latencies are converted back to simulated seconds.
+
+For each concurrency level, that many sessions each run --rounds
+estimates back to back. A level is sustainable when nothing failed and
+p99 end-to-end latency is within --slo times the ideal latency (the
+fake job's pending + running + terminating time).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import (  # noqa: E402
+    CallCounter,
+    FakeBlobService,
+    FakeBlobStore,
+    FakeDataLakeService,
+    FakeJobsServer,
+    FakeRedis,
+    FakeTimings,
+)
+
+
+# ------------------------------------------------------------
+# Setup
+# ------------------------------------------------------------
+def configure_env(server_url: str, time_scale: float, workdir: str, args) -> None:
+    """Points the app's config at the fakes. Must run before importing databricks.*"""
+    os.environ.update({
+        "DATABRICKS_WORKSPACE_URL": server_url,
+        "DATABRICKS_TOKEN": "bench",
+        "DATABRICKS_JOB_ID": "1",
+        "AZURE_STORAGE_ACCOUNT": "bench",
+        "AZURE_BLOB_CONTAINER": "bench",
+        "AZURE_STORAGE_CONNECTION_STRING": "bench",
+        "ACCOUNT_KEY": "bench",
+        "POLL_TIME_SCALE": str(time_scale),
+        "TRACE_LOG_PATH": "",
+        "RESULT_CACHE_PATH": os.path.join(workdir, "result_cache.sqlite"),
+        "ARTIFACT_INDEX_PATH": os.path.join(workdir, "artifact_index.sqlite"),
+        "HISTORY_PATH": os.path.join(workdir, "history.sqlite"),
+        "STATE_STORE_PATH": os.path.join(workdir, "state.sqlite"),
+        "SUBMIT_MODE": args.submit_mode,
+        # Unlimited workspace: admit everything, as before admission control
+        "MAX_CONCURRENT_RUNS": str(args.admission_cap or args.max_concurrent_runs or 1000),
+    })
+    for name in ("WARM_CLUSTER_ID", "WARM_INSTANCE_POOL_ID"):
+        os.environ.pop(name, None)
+    if args.warm_capacity == "cluster":
+        os.environ["WARM_CLUSTER_ID"] = "bench-warm-cluster"
+    elif args.warm_capacity == "pool":
+        os.environ["WARM_INSTANCE_POOL_ID"] = "bench-pool"
+
+
+def install_state_fake(backend: str) -> Optional[FakeRedis]:
+    """
+    --state-backend redis: runs the app on RedisStateStore over a
+    FakeRedis. Must run before the modules that bind STATE are imported.
+    """
+    if backend != "redis":
+        return None
+    from databricks import state_store
+
+    assert "databricks.run_tracker" not in sys.modules, "install_state_fake runs before the app imports"
+    redis = FakeRedis()
+    state_store.STATE = state_store.RedisStateStore(redis, prefix="bench:")
+    return redis
+
+
+def install_storage_fakes(blobs: FakeBlobStore) -> None:
+    from databricks import databricks_trigger, uploads
+
+    blob = FakeBlobService(blobs)
+    datalake = FakeDataLakeService(blobs)
+    databricks_trigger.blob_service = lambda connection_string: blob
+    uploads.datalake_service = lambda account_name, account_key: datalake
+
+
+# ------------------------------------------------------------
+# Estimates
+# ------------------------------------------------------------
+def _payload(session: int, round_no: int) -> dict:
+    from databricks.payload import payload_setter
+
+    return payload_setter(
+        image_uris=[],
+        file_uris=[],
+        client_name="bench",
+        use_case_name=f"s{session}",
+        markets=[{"market": "M1", "multiplier": 1, "start_month": 1}],
+        user_prompt=f"benchmark round {round_no}",
+        budget=None,
+    )
+
+
+def run_level(sessions: int, rounds: int, timings: FakeTimings, server, counter) -> dict:
+    from databricks.run_tracker import get_run, submit_estimate
+
+    counter.reset()
+    server.peak_active_runs = 0
+    server.skipped_runs = 0
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def session(n: int) -> None:
+        for r in range(rounds):
+            handle = submit_estimate(_payload(n, r), force_recompute=True)
+            while not handle.done:
+                time.sleep(timings.scaled(1.0))
+                handle = get_run(handle.handle_id) or handle
+            with lock:
+                if handle.status == "DONE":
+                    latencies.append(handle.elapsed / timings.time_scale)
+                else:
+                    failures.append(handle.error)
+
+    started = time.time()
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.time() - started
+
+    calls = counter.snapshot()
+    estimates = sessions * rounds
+    return {
+        "sessions": sessions,
+        "estimates": estimates,
+        "failed": len(failures),
+        "p50_s": float(np.percentile(latencies, 50)) if latencies else None,
+        "p99_s": float(np.percentile(latencies, 99)) if latencies else None,
+        "api_calls_per_estimate": round(
+            sum(v for k, v in calls.items() if k.startswith("jobs/")) / estimates, 2
+        ),
+        "blob_reads_per_estimate": round(calls.get("blob/download", 0) / estimates, 2),
+        "calls": calls,
+        "peak_active_runs": server.peak_active_runs,
+        "skipped_runs": server.skipped_runs,
+        "wall_s": round(wall, 2),
+        "errors": sorted(set(failures))[:3],
+    }
+
+
+# ------------------------------------------------------------
+# Uploads
+# ------------------------------------------------------------
+def run_uploads(files: int, size_kb: int, timings: FakeTimings, counter) -> dict:
+    from databricks.uploads import UPLOAD_CONCURRENCY, upload_files
+
+    counter.reset()
+    batch = []
+    for i in range(files):
+        f = io.BytesIO(os.urandom(size_kb * 1024))
+        f.name = f"bench-{i}.pdf"
+        batch.append(f)
+
+    started = time.time()
+    results = upload_files(batch)
+    wall = time.time() - started
+
+    calls = counter.snapshot()
+    return {
+        "files": files,
+        "size_kb": size_kb,
+        "concurrency": UPLOAD_CONCURRENCY,
+        "failed": sum(1 for r in results if not r.ok),
+        "wall_s": round(wall / timings.time_scale, 2),
+        "p50_file_s": float(np.percentile([r.seconds for r in results], 50)) / timings.time_scale,
+        "datalake_calls_per_file": round(
+            sum(v for k, v in calls.items() if k.startswith("datalake/")) / files, 2
+        ),
+    }
+
+
+# ------------------------------------------------------------
+# Report
+# ------------------------------------------------------------
+def _fmt(seconds) -> str:
+    return "-" if seconds is None else f"{seconds:7.1f}"
+
+
+def print_report(levels: list, uploads: dict, ideal: float, slo: float) -> None:
+    print(f"\nEnd-to-end estimates (simulated seconds; ideal {ideal:.0f}s, SLO p99 <= {ideal * slo:.0f}s)")
+    print(f"{'sessions':>8} {'estimates':>9} {'failed':>6} {'p50':>7} {'p99':>7} "
+          f"{'api/est':>7} {'blob/est':>8} {'peak runs':>9} {'skipped':>7} {'ok':>3}")
+    for r in levels:
+        print(f"{r['sessions']:>8} {r['estimates']:>9} {r['failed']:>6} {_fmt(r['p50_s'])} "
+              f"{_fmt(r['p99_s'])} {r['api_calls_per_estimate']:>7} "
+              f"{r['blob_reads_per_estimate']:>8} {r['peak_active_runs']:>9} "
+              f"{r['skipped_runs']:>7} {'yes' if r['sustainable'] else 'no':>3}")
+        for error in r["errors"]:
+            print(f"{'':>8} ! {error[:100]}")
+
+    sustainable = [r["sessions"] for r in levels if r["sustainable"]]
+    print(f"\nMax sustainable concurrent sessions: {max(sustainable) if sustainable else 'none'}")
+
+    print(f"\nUploads (simulated seconds): {uploads['files']} x {uploads['size_kb']} KB PDFs, "
+          f"concurrency {uploads['concurrency']}: {uploads['wall_s']}s total, "
+          f"p50 {uploads['p50_file_s']:.3f}s per file, "
+          f"{uploads['datalake_calls_per_file']} Data Lake calls per file, "
+          f"{uploads['failed']} failed")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline orchestrator benchmark.")
+    parser.add_argument("--levels", default="1,8,32,64",
+                        help="comma-separated concurrent session counts")
+    parser.add_argument("--rounds", type=int, default=2, help="estimates per session")
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="wall seconds per simulated second (default 0.01)")
+    parser.add_argument("--pending", type=float, default=120.0, help="simulated cluster start, s")
+    parser.add_argument("--running", type=float, default=60.0, help="simulated job runtime, s")
+    parser.add_argument("--api-latency", type=float, default=0.15,
+                        help="Jobs API latency per request, s")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of Jobs API requests answered 503")
+    parser.add_argument("--log-link-rate", type=float, default=1.0,
+                        help="fraction of runs that print the link as their last log line; "
+                             "the rest are read from result.json")
+    parser.add_argument("--job-failure-rate", type=float, default=0.0,
+                        help="fraction of runs that end FAILED")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Jobs API requests per simulated second (0 = unlimited)")
+    parser.add_argument("--max-concurrent-runs", type=int, default=0,
+                        help="job's max_concurrent_runs; runs past it are SKIPPED (0 = unlimited)")
+    parser.add_argument("--admission-cap", type=int, default=0,
+                        help="app's MAX_CONCURRENT_RUNS (default: --max-concurrent-runs)")
+    parser.add_argument("--submit-mode", choices=["job", "warm"], default="job",
+                        help="SUBMIT_MODE for trigger_job")
+    parser.add_argument("--warm-capacity", choices=["cluster", "pool"], default="cluster",
+                        help="warm capacity configured in --submit-mode warm")
+    parser.add_argument("--warm-unavailable", action="store_true",
+                        help="warm cluster stopped and pool empty (exercises the fallback)")
+    parser.add_argument("--state-backend", choices=["sqlite", "redis"], default="sqlite",
+                        help="shared state store; redis runs RedisStateStore over bench.fakes.FakeRedis")
+    parser.add_argument("--slo", type=float, default=1.5,
+                        help="sustainable if p99 <= SLO x ideal latency")
+    parser.add_argument("--upload-files", type=int, default=32)
+    parser.add_argument("--upload-kb", type=int, default=512)
+    parser.add_argument("--json", help="also write the raw results to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="keep the app's log output")
+    args = parser.parse_args(argv)
+
+    timings = FakeTimings(
+        pending_s=args.pending,
+        running_s=args.running,
+        api_latency_s=args.api_latency,
+        error_rate=args.error_rate,
+        job_failure_rate=args.job_failure_rate,
+        log_link_rate=args.log_link_rate,
+        warm_cluster_running=not args.warm_unavailable,
+        pool_idle_instances=0 if args.warm_unavailable else 4,
+        rate_limit=args.rate_limit,
+        max_concurrent_runs=args.max_concurrent_runs,
+        time_scale=args.time_scale,
+    )
+    pending = timings.pending_s
+    if args.submit_mode == "warm" and not args.warm_unavailable:
+        pending = timings.warm_pending_s if args.warm_capacity == "cluster" else timings.pool_pending_s
+
+    ideal = pending + timings.running_s + timings.terminating_s
+
+    counter = CallCounter()
+    blobs = FakeBlobStore(timings, counter)
+    server = FakeJobsServer(blobs, timings, counter).start()
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    configure_env(server.url, args.time_scale, workdir, args)
+    redis = install_state_fake(args.state_backend)
+    install_storage_fakes(blobs)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    levels = []
+    for sessions in [int(v) for v in args.levels.split(",") if v.strip()]:
+        print(f"⏱  {sessions} concurrent sessions...", file=sys.stderr)
+        with quiet:
+            result = run_level(sessions, args.rounds, timings, server, counter)
+        result["sustainable"] = (
+            result["failed"] == 0
+            and result["p99_s"] is not None
+            and result["p99_s"] <= ideal * args.slo
+        )
+        levels.append(result)
+
+    print("⏱  uploads...", file=sys.stderr)
+    with quiet:
+        uploads = run_uploads(args.upload_files, args.upload_kb, timings, counter)
+    server.stop()
+
+    from databricks.admission import ADMISSION
+    from databricks.databricks_trigger import submission_stats
+
+    submissions = submission_stats()
+    admission = ADMISSION.stats()
+    print_report(levels, uploads, ideal, args.slo)
+    print(f"Submissions: {submissions['warm_cluster']} warm cluster, "
+          f"{submissions['instance_pool']} instance pool, "
+          f"{submissions['job_cluster']} job cluster; "
+          f"{submissions['cold_starts_avoided']} cold starts avoided")
+    print(f"Admission: cap {ADMISSION.cap}, throttled {admission['throttled']} times, "
+          f"typical run {admission['typical_run_s']}s")
+    if redis is not None:
+        print(f"State store: RedisStateStore over FakeRedis, {redis.calls} calls")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "levels": levels,
+                "uploads": uploads,
+                "submissions": submissions,
+                "admission": admission,
+                "timings": vars(timings),
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Headless bulk estimation.
+
+    python bulk_estimate.py requests.jsonl -o results.jsonl --concurrency 8
+
+Each input line is a JSON object with payload_setter fields
+(image_uris, file_uris, client_name, use_case_name, markets,
+user_prompt, budget, documents, use_cases) and an optional "id".
+
+Results are appended to the output file as each estimate finishes. The
+output doubles as the checkpoint: re-running the same command skips ids
+that already have a DONE line, so an interrupted batch resumes where it
+stopped. FAILED ids are retried unless --skip-failed is given.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from databricks.payload import payload_setter  # noqa: E402
+from databricks.result_cache import payload_key  # noqa: E402
+from databricks.schema import SchemaError  # noqa: E402
+from databricks.run_tracker import get_run, submit_estimate  # noqa: E402
+
+
+# ------------------------------------------------------------
+# Input / checkpoint
+# ------------------------------------------------------------
+def read_requests(path: str) -> list:
+    requests = []
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                raise SystemExit(f"{path}:{line_no}: not valid JSON")
+
+            missing = [k for k in ("client_name", "use_case_name") if not item.get(k)]
+            if missing:
+                raise SystemExit(f"{path}:{line_no}: missing {', '.join(missing)}")
+
+            try:
+                payload = payload_setter(
+                    image_uris=item.get("image_uris"),
+                    file_uris=item.get("file_uris"),
+                    client_name=item["client_name"],
+                    use_case_name=item["use_case_name"],
+                    markets=item.get("markets") or [],
+                    user_prompt=item.get("user_prompt"),
+                    budget=item.get("budget"),
+                    documents=item.get("documents"),
+                    use_cases=item.get("use_cases"),
+                )
+            except SchemaError as e:
+                raise SystemExit(f"{path}:{line_no}: {e}")
+            request_id = str(item.get("id") or payload_key(payload))
+            requests.append((request_id, payload))
+
+    return requests
+
+
+def read_checkpoint(path: str) -> dict:
+    """id -> status of the latest line written for it."""
+    statuses = {}
+    if not os.path.exists(path):
+        return statuses
+
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                # Partial last line from an interrupted run
+                continue
+            statuses[row.get("id")] = row.get("status")
+
+    return statuses
+
+
+def write_result(out, request_id: str, handle) -> None:
+    row = {
+        "id": request_id,
+        "status": handle.status,
+        "drive_link": handle.drive_link,
+        "run_id": handle.run_id,
+        "cached": handle.cached,
+        "error": handle.error,
+        "submitted_at": handle.submitted_at,
+        "finished_at": handle.finished_at,
+        "elapsed_s": round(handle.elapsed, 1),
+    }
+    out.write(json.dumps(row) + "\n")
+    out.flush()
+    os.fsync(out.fileno())
+
+
+# ------------------------------------------------------------
+# Runner
+# ------------------------------------------------------------
+def run_batch(
+    requests: list,
+    output_path: str,
+    concurrency: int,
+    force_recompute: bool = False,
+    skip_failed: bool = False,
+    poll_seconds: float = 2.0,
+) -> dict:
+    done_statuses = {"DONE", "FAILED"} if skip_failed else {"DONE"}
+    checkpoint = read_checkpoint(output_path)
+
+    queue, seen = [], set()
+    for request_id, payload in requests:
+        if request_id in seen or checkpoint.get(request_id) in done_statuses:
+            continue
+        seen.add(request_id)
+        queue.append((request_id, payload))
+    skipped = len(requests) - len(queue)
+    print(f"📋 {len(requests)} requests, {skipped} already finished, {len(queue)} to run")
+
+    counts = {"DONE": 0, "FAILED": 0, "CANCELLED": 0, "skipped": skipped}
+    active = {}
+
+    with open(output_path, "a") as out:
+        if out.tell() > 0:
+            # Terminate a partial line left by a killed run
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write("\n")
+
+        while queue or active:
+            while queue and len(active) < concurrency:
+                request_id, payload = queue.pop(0)
+                active[request_id] = submit_estimate(payload, force_recompute=force_recompute)
+
+            for request_id, submitted in list(active.items()):
+                # A run owned by another process or replica comes back as
+                # a snapshot that never changes; get_run reads the latest
+                handle = get_run(submitted.handle_id)
+                if handle is None:
+                    submitted.status = "FAILED"
+                    submitted.error = "Run state expired before the run finished"
+                    handle = submitted
+                if handle.done:
+                    write_result(out, request_id, handle)
+                    counts[handle.status] += 1
+                    del active[request_id]
+                    print(f"   [{counts['DONE'] + counts['FAILED'] + counts['CANCELLED']}/{len(requests) - skipped}] "
+                          f"{request_id}: {handle.status} ({handle.elapsed:.0f}s)")
+
+            if active:
+                time.sleep(poll_seconds)
+
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run cost estimates from a JSONL file.")
+    parser.add_argument("input", help="JSONL file of payloads")
+    parser.add_argument("-o", "--output", required=True, help="JSONL results / checkpoint file")
+    parser.add_argument("-c", "--concurrency", type=int, default=4,
+                        help="estimates in flight at once (default 4)")
+    parser.add_argument("--force-recompute", action="store_true",
+                        help="ignore cached results for identical payloads")
+    parser.add_argument("--skip-failed", action="store_true",
+                        help="do not retry ids whose last result was FAILED")
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    counts = run_batch(
+        read_requests(args.input),
+        args.output,
+        concurrency=args.concurrency,
+        force_recompute=args.force_recompute,
+        skip_failed=args.skip_failed,
+    )
+
+    print(f"🎉 Finished: {counts['DONE']} done, {counts['FAILED']} failed, "
+          f"{counts['skipped']} skipped (already finished)")
+    return 1 if counts["FAILED"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
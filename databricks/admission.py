@@ -0,0 +1,332 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+from databricks.polling import POLL_TIME_SCALE
+from databricks.state_store import REPLICA_ID, STATE, StateStore
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+# Runs allowed at once across all replicas; match the job's max_concurrent_runs
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "10"))
+
+# Payloads up to this many tokens are admitted ahead of larger ones
+SMALL_PAYLOAD_TOKENS = int(os.getenv("SMALL_PAYLOAD_TOKENS", "2000"))
+
+# Slots are leases in the shared store, renewed by the run tracker
+SLOT_LEASE_SECONDS = float(os.getenv("SLOT_LEASE_SECONDS", "30"))
+
+# How often the dispatcher re-checks slots held by other replicas
+ADMISSION_POLL_SECONDS = float(os.getenv("ADMISSION_POLL_SECONDS", "2"))
+
+# After the workspace pushes back, admit no more than the runs active
+# at that moment; the cap then grows back by one run per this long
+ADMISSION_COOLDOWN_SECONDS = float(os.getenv("ADMISSION_COOLDOWN_SECONDS", "30"))
+
+# Seeds the wait estimate until real runs have been timed
+TYPICAL_RUN_SECONDS = float(os.getenv("TYPICAL_RUN_SECONDS", "180"))
+
+
+# ------------------------------------------------------------
+# Tickets
+# ------------------------------------------------------------
+@dataclass
+class Ticket:
+    ticket_id: str
+    client: str
+    tokens: int
+    seq: int
+    enqueued_at: float = field(default_factory=time.time)
+    slot: Optional[int] = None
+    admitted_at: Optional[float] = None
+    # 1 = next to be admitted; None once admitted or withdrawn
+    position: Optional[int] = None
+    on_admit: Optional[Callable[["Ticket"], None]] = field(default=None, repr=False)
+    on_update: Optional[Callable[[int, float], None]] = field(default=None, repr=False)
+
+    @property
+    def small(self) -> bool:
+        return self.tokens <= SMALL_PAYLOAD_TOKENS
+
+
+# ------------------------------------------------------------
+# Controller
+# ------------------------------------------------------------
+class AdmissionController:
+    """
+    Gate in front of trigger_job.
+
+    At most `cap` runs hold a slot at once. Slots are leases in the
+    shared state store, so the cap holds across replicas. Waiting runs
+    are queued per client_name and admitted round-robin between
+    clients, so one client's burst cannot starve the others. At each
+    turn a client whose next payload is small goes first; a large one
+    that has waited longer than a typical run counts as small. Queue
+    positions are this replica's view; runs queued on other replicas
+    are not counted.
+
+    Nothing blocks while queued: one dispatcher thread hands each run
+    to its on_admit callback once it holds a slot, and reports queue
+    moves through on_update.
+    """
+
+    def __init__(self, cap: int = MAX_CONCURRENT_RUNS, store: StateStore = STATE):
+        self.cap = cap
+        self._store = store
+        self._cond = threading.Condition()
+        self._dispatcher: Optional[threading.Thread] = None
+        # Set by anything that can change the order or free a slot
+        self._dirty = False
+        self._seq = itertools.count()
+        # client -> tickets, small payloads first, then arrival order
+        self._queues: Dict[str, Deque[Ticket]] = {}
+        # Round-robin order of clients; the next turn starts at _cursor
+        self._clients: List[str] = []
+        self._cursor = 0
+        self._admitted: Dict[str, Ticket] = {}
+        self._limited_cap: Optional[int] = None
+        self._limited_until = 0.0
+        self._cooldown = ADMISSION_COOLDOWN_SECONDS * POLL_TIME_SCALE
+        # Moving average of how long a run holds its slot
+        self._hold_seconds = TYPICAL_RUN_SECONDS * POLL_TIME_SCALE
+        self.throttle_count = 0
+
+    # --------------------------------------------------------
+    # Queue order
+    # --------------------------------------------------------
+    def _effective_cap(self) -> int:
+        if self._limited_cap is None:
+            return self.cap
+        now = time.time()
+        if now >= self._limited_until:
+            # Probe back up one run at a time rather than all at once
+            self._limited_cap += 1
+            self._limited_until = now + self._cooldown
+            if self._limited_cap >= self.cap:
+                self._limited_cap = None
+                return self.cap
+        return self._limited_cap
+
+    def _favoured(self, ticket: Ticket, now: float) -> bool:
+        return ticket.small or now - ticket.enqueued_at > self._hold_seconds
+
+    def _dispatch_order(self) -> List[Ticket]:
+        """Every queued ticket in the order it would be admitted."""
+        now = time.time()
+        queues = {c: list(q) for c, q in self._queues.items() if q}
+        clients = [c for c in self._clients if c in queues]
+        if not clients:
+            return []
+        # Rotate so the client whose turn is next comes first
+        start = next(
+            (i for i, c in enumerate(clients) if self._clients.index(c) >= self._cursor), 0
+        )
+        clients = clients[start:] + clients[:start]
+
+        order = []
+        while clients:
+            turn = next((c for c in clients if self._favoured(queues[c][0], now)), clients[0])
+            order.append(queues[turn].pop(0))
+            i = clients.index(turn)
+            clients = clients[i + 1:] + clients[:i + 1]
+            if not queues[turn]:
+                clients.remove(turn)
+        return order
+
+    def _advance_cursor(self, client: str) -> None:
+        self._cursor = self._clients.index(client) + 1
+        if self._cursor >= len(self._clients):
+            self._cursor = 0
+
+    # --------------------------------------------------------
+    # Slots
+    # --------------------------------------------------------
+    def _owner(self, ticket: Ticket) -> str:
+        return f"{REPLICA_ID}:{ticket.ticket_id}"
+
+    def _take_slot(self, ticket: Ticket) -> bool:
+        if len(self._admitted) >= self._effective_cap():
+            return False
+        for slot in range(self._effective_cap()):
+            if self._store.acquire_lease(f"admission:slot:{slot}", self._owner(ticket), SLOT_LEASE_SECONDS):
+                ticket.slot = slot
+                return True
+        return False
+
+    # --------------------------------------------------------
+    # Dispatcher
+    # --------------------------------------------------------
+    def _changed(self) -> None:
+        """Caller holds the lock."""
+        self._dirty = True
+        self._cond.notify_all()
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch, name="admission", daemon=True)
+            self._dispatcher.start()
+
+    def _admit_next(self) -> tuple:
+        """Admits what the free slots allow; returns (admitted, moved) tickets."""
+        admitted = []
+        order = self._dispatch_order()
+        while order and self._take_slot(order[0]):
+            ticket = order.pop(0)
+            self._queues[ticket.client].remove(ticket)
+            self._advance_cursor(ticket.client)
+            ticket.admitted_at = time.time()
+            ticket.position = None
+            self._admitted[ticket.ticket_id] = ticket
+            admitted.append(ticket)
+        if admitted:
+            # The cursor moved, which can reorder the rest
+            order = self._dispatch_order()
+
+        moved = []
+        for position, ticket in enumerate(order, 1):
+            if ticket.position != position:
+                ticket.position = position
+                moved.append(ticket)
+        return admitted, moved
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                if not any(self._queues.values()):
+                    # Nothing queued; the next enqueue restarts the thread
+                    self._dispatcher = None
+                    return
+                if not self._dirty:
+                    self._cond.wait(timeout=ADMISSION_POLL_SECONDS * POLL_TIME_SCALE)
+                self._dirty = False
+                try:
+                    admitted, moved = self._admit_next()
+                except Exception as e:
+                    # e.g. the state store is unreachable; retried next poll
+                    print(f"   Admission check failed ({type(e).__name__}): {e}")
+                    admitted, moved = [], []
+
+            for ticket in admitted:
+                try:
+                    ticket.on_admit(ticket)
+                except Exception as e:
+                    print(f"   Admitted run {ticket.ticket_id} not started ({type(e).__name__}): {e}")
+                    self.release(ticket)
+            for ticket in moved:
+                if ticket.on_update is not None and ticket.position is not None:
+                    try:
+                        ticket.on_update(ticket.position, self.estimated_wait(ticket.position))
+                    except Exception as e:
+                        print(f"   Queue update failed ({type(e).__name__}): {e}")
+
+    # --------------------------------------------------------
+    # Public API
+    # --------------------------------------------------------
+    def enqueue(
+        self,
+        ticket_id: str,
+        client: str,
+        tokens: int,
+        on_admit: Callable[[Ticket], None],
+        on_update: Optional[Callable[[int, float], None]] = None,
+    ) -> Ticket:
+        """
+        Queues a run. on_admit(ticket) is called on the dispatcher
+        thread once the ticket holds a slot, and must return quickly
+        (hand the run to a worker); release(ticket) frees the slot.
+        on_update(position, wait_s) is called whenever the position
+        changes.
+        """
+        client = (client or "").strip().lower()
+        ticket = Ticket(
+            ticket_id=ticket_id,
+            client=client,
+            tokens=tokens,
+            seq=next(self._seq),
+            on_admit=on_admit,
+            on_update=on_update,
+        )
+        with self._cond:
+            if client not in self._clients:
+                self._clients.append(client)
+            queue = self._queues.setdefault(client, deque())
+            queue.append(ticket)
+            self._queues[client] = deque(sorted(queue, key=lambda t: (not t.small, t.seq)))
+            self._changed()
+        return ticket
+
+    def estimated_wait(self, position: int) -> float:
+        """Seconds until a ticket at `position` is admitted, at the current pace."""
+        with self._cond:
+            return position * self._hold_seconds / max(1, self._effective_cap())
+
+    def withdraw(self, ticket: Ticket) -> bool:
+        """Drops a ticket that is still queued; False once it was admitted."""
+        with self._cond:
+            queue = self._queues.get(ticket.client)
+            if not queue or ticket not in queue:
+                return False
+            queue.remove(ticket)
+            ticket.position = None
+            self._changed()
+            return True
+
+    def release(self, ticket: Ticket) -> None:
+        """Frees the ticket's slot (or drops it from its queue)."""
+        with self._cond:
+            admitted = self._admitted.pop(ticket.ticket_id, None)
+            if admitted is not None and ticket.admitted_at:
+                held = time.time() - ticket.admitted_at
+                self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+        if admitted is None:
+            self.withdraw(ticket)
+            return
+        try:
+            self._store.release_lease(f"admission:slot:{ticket.slot}", self._owner(ticket))
+        finally:
+            with self._cond:
+                self._changed()
+
+    def renew(self) -> None:
+        """Keeps the slots of admitted runs; called with the run leases."""
+        with self._cond:
+            admitted = list(self._admitted.values())
+        for ticket in admitted:
+            self._store.acquire_lease(f"admission:slot:{ticket.slot}", self._owner(ticket), SLOT_LEASE_SECONDS)
+
+    def throttle(self, retry_after: Optional[float] = None) -> None:
+        """
+        The workspace pushed back (429, or a run skipped for max
+        concurrent runs): until the cooldown ends, admit no more than
+        the runs that are active now, then let the cap grow back one
+        run per cooldown. Repeated pushback narrows it further.
+        """
+        cooldown = max(retry_after or 0, ADMISSION_COOLDOWN_SECONDS) * POLL_TIME_SCALE
+        with self._cond:
+            self._limited_cap = max(1, min(self._effective_cap(), len(self._admitted)))
+            self._limited_until = time.time() + cooldown
+            self._cooldown = cooldown
+            self.throttle_count += 1
+            limited = self._limited_cap
+            self._changed()
+        print(f"🚦 Admission limited to {limited} runs for {cooldown:.0f}s")
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = sum(len(q) for q in self._queues.values())
+            return {
+                "active": len(self._admitted),
+                "cap": self._effective_cap(),
+                "queued": queued,
+                "clients_waiting": sum(1 for q in self._queues.values() if q),
+                "throttled": self.throttle_count,
+                "typical_run_s": round(self._hold_seconds / POLL_TIME_SCALE, 1),
+            }
+
+
+ADMISSION = AdmissionController()
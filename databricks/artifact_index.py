@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from databricks.state_store import STATE, StateStore
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+ARTIFACT_INDEX_PATH = os.getenv("ARTIFACT_INDEX_PATH", ".cache/artifacts.sqlite3")
+
+
+# ------------------------------------------------------------
+# SHA-256 -> remote URL index
+# ------------------------------------------------------------
+class ArtifactIndex:
+    """
+    Remembers where each uploaded file's content already lives, so the
+    same bytes are never uploaded twice regardless of file name.
+    With a `store`, entries are shared with the other replicas.
+    """
+
+    def __init__(self, path: str = ARTIFACT_INDEX_PATH, store: Optional[StateStore] = None):
+        self._lock = threading.Lock()
+        self._store = store
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                sha256 TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                name TEXT,
+                size INTEGER,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (sha256, kind)
+            )
+            """
+        )
+        self._db.commit()
+
+    def get(self, sha256: str, kind: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url FROM artifacts WHERE sha256 = ? AND kind = ?",
+                (sha256, kind)
+            ).fetchone()
+        if row:
+            return row[0]
+
+        shared = self._store.get(f"artifact:{kind}:{sha256}") if self._store else None
+        if shared is None:
+            return None
+        self._put_local(sha256, kind, shared["url"], shared.get("name"), shared.get("size"))
+        return shared["url"]
+
+    def put(self, sha256: str, kind: str, url: str, name: str = None, size: int = None) -> None:
+        self._put_local(sha256, kind, url, name, size)
+        if self._store is not None:
+            self._store.put(f"artifact:{kind}:{sha256}", {"url": url, "name": name, "size": size})
+
+    def _put_local(self, sha256: str, kind: str, url: str, name: str = None, size: int = None) -> None:
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO artifacts
+                    (sha256, kind, url, name, size, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (sha256, kind, url, name, size, time.time())
+            )
+            self._db.commit()
+
+    def forget(self, sha256: str, kind: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM artifacts WHERE sha256 = ? AND kind = ?", (sha256, kind)
+            )
+            self._db.commit()
+        if self._store is not None:
+            self._store.delete(f"artifact:{kind}:{sha256}")
+
+
+ARTIFACT_INDEX = ArtifactIndex(store=STATE if STATE.distributed else None)
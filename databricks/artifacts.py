@@ -0,0 +1,417 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from databricks.state_store import STATE, StateStore
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+# Files at least this large go straight to a spool file on disk
+SPOOL_THRESHOLD_BYTES = int(os.getenv("SPOOL_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+
+# In-memory artifact bytes allowed per session and across all sessions;
+# anything that would exceed them is spooled instead
+SESSION_MEMORY_CAP_BYTES = int(os.getenv("SESSION_MEMORY_CAP_BYTES", str(32 * 1024 * 1024)))
+GLOBAL_MEMORY_CAP_BYTES = int(os.getenv("GLOBAL_MEMORY_CAP_BYTES", str(256 * 1024 * 1024)))
+
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(tempfile.gettempdir(), "finops-spool"))
+
+# Spooled bytes allowed across all sessions; uploads past it are rejected.
+# Single files are capped by server.maxUploadSize in .streamlit/config.toml.
+GLOBAL_SPOOL_CAP_BYTES = int(os.getenv("GLOBAL_SPOOL_CAP_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Sessions not seen for this long are dropped with their spool files
+SESSION_IDLE_SECONDS = int(os.getenv("SESSION_IDLE_SECONDS", "7200"))
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadRejected(RuntimeError):
+    """The upload would take the app past its memory and spool caps."""
+
+
+# ------------------------------------------------------------
+# Readers
+# ------------------------------------------------------------
+class ArtifactReader(io.RawIOBase):
+    """
+    Read-only, seekable view over an artifact's bytes or its mmapped
+    spool file. Has the `name` / `size` attributes the upload pipeline
+    reads from Streamlit's UploadedFile, plus the already known sha256
+    and the artifact_id results are matched back by (names can repeat).
+    Each read copies only the requested slice.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        size: int,
+        data: Optional[bytes] = None,
+        path: Optional[str] = None,
+        sha256: Optional[str] = None,
+        artifact_id: Optional[str] = None,
+    ):
+        super().__init__()
+        self.name = name
+        self.size = size
+        self.sha256 = sha256
+        self.artifact_id = artifact_id
+        self._fd = None
+        self._mmap = None
+        if path is not None and size:
+            self._fd = open(path, "rb")
+            self._mmap = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        else:
+            self._view = memoryview(data or b"")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        chunk = bytes(self._view[self._pos:end])
+        self._pos = max(self._pos, end)
+        return chunk
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def readinto(self, buffer) -> int:
+        chunk = self.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+                self._fd.close()
+        super().close()
+
+
+# ------------------------------------------------------------
+# Artifacts
+# ------------------------------------------------------------
+@dataclass
+class Artifact:
+    artifact_id: str
+    session_id: str
+    name: str
+    kind: str  # "pdf" | "image"
+    size: int
+    sha256: str
+    # Exactly one of data / path holds the content until it is released.
+    # data is a view of the uploader's own buffer when it has one.
+    data: Optional[bytes] = field(default=None, repr=False)
+    path: Optional[str] = None
+    url: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def spooled(self) -> bool:
+        return self.path is not None
+
+    @property
+    def released(self) -> bool:
+        return self.data is None and self.path is None
+
+    def open(self) -> ArtifactReader:
+        if self.released:
+            raise RuntimeError(f"{self.name}: content already released")
+        return ArtifactReader(
+            self.name,
+            self.size,
+            data=self.data,
+            path=self.path,
+            sha256=self.sha256,
+            artifact_id=self.artifact_id,
+        )
+
+
+class ArtifactManager:
+    """
+    Holds each session's uploaded files until they are in storage.
+
+    Small files stay in memory as long as the per-session and global
+    caps allow, sharing the uploader's buffer rather than copying it;
+    everything else is copied to a spool file and streamed from an
+    mmap, so a 100 MB RFP does not sit in the app's heap. A file that
+    fits neither in memory nor under the spool cap is rejected.
+    Content is released once it has been uploaded, keeping only the
+    name / URL the payload needs.
+
+    With a `store`, the uploaded artifacts of each session (metadata
+    only) are also kept there, so a session that reconnects to another
+    replica still has its files.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str = SPOOL_DIR,
+        threshold: int = SPOOL_THRESHOLD_BYTES,
+        session_cap: int = SESSION_MEMORY_CAP_BYTES,
+        global_cap: int = GLOBAL_MEMORY_CAP_BYTES,
+        spool_cap: int = GLOBAL_SPOOL_CAP_BYTES,
+        store: Optional[StateStore] = None,
+    ):
+        self._store = store
+        self.spool_dir = spool_dir
+        self.threshold = threshold
+        self.session_cap = session_cap
+        self.global_cap = global_cap
+        self.spool_cap = spool_cap
+        self._lock = threading.Lock()
+        # session_id -> {artifact_id: Artifact}, in upload order
+        self._sessions: Dict[str, Dict[str, Artifact]] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._memory_bytes = 0
+        self._spool_bytes = 0
+
+    # --------------------------------------------------------
+    # Adding
+    # --------------------------------------------------------
+    def _session_memory(self, session_id: str) -> int:
+        return sum(a.size for a in self._sessions.get(session_id, {}).values() if a.data is not None)
+
+    def _fits_in_memory(self, session_id: str, size: int) -> bool:
+        return (
+            size < self.threshold
+            and self._session_memory(session_id) + size <= self.session_cap
+            and self._memory_bytes + size <= self.global_cap
+        )
+
+    def add(self, session_id: str, file) -> Artifact:
+        """
+        Takes a file-like with `name` (Streamlit's UploadedFile). The same
+        content added twice in one session returns the existing artifact.
+        Raises UploadRejected when the file fits under none of the caps.
+        """
+        with self._lock:
+            known = session_id in self._sessions
+        if not known:
+            self._restore(session_id)
+
+        size = getattr(file, "size", None)
+        if size is None:
+            size = file.seek(0, io.SEEK_END)
+        kind = "pdf" if file.name.lower().endswith(".pdf") else "image"
+
+        with self._lock:
+            self._last_seen[session_id] = time.time()
+            in_memory = self._fits_in_memory(session_id, size)
+            if not in_memory and self._spool_bytes + size > self.spool_cap:
+                raise UploadRejected(
+                    f"the server is holding {self._spool_bytes / 1024 / 1024:.0f} MB of "
+                    "uploads not yet in storage; try again once they are uploaded"
+                )
+            # Reserve now so concurrent sessions cannot overshoot the caps
+            if in_memory:
+                self._memory_bytes += size
+            else:
+                self._spool_bytes += size
+
+        digest = hashlib.sha256()
+        data, path = None, None
+        file.seek(0)
+        try:
+            if in_memory:
+                # UploadedFile is a BytesIO: share its buffer, no second copy
+                getbuffer = getattr(file, "getbuffer", None)
+                data = getbuffer() if getbuffer is not None else file.read()
+                digest.update(data)
+                if len(data) != size:
+                    with self._lock:
+                        self._memory_bytes += len(data) - size
+                    size = len(data)
+            else:
+                os.makedirs(self.spool_dir, exist_ok=True)
+                with tempfile.NamedTemporaryFile(dir=self.spool_dir, delete=False) as spool:
+                    path = spool.name
+                    while True:
+                        chunk = file.read(SPOOL_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        spool.write(chunk)
+        except BaseException:
+            with self._lock:
+                if in_memory:
+                    self._memory_bytes -= size
+                else:
+                    self._spool_bytes -= size
+            if path:
+                _unlink(path)
+            raise
+        finally:
+            file.seek(0)
+
+        artifact = Artifact(
+            artifact_id=uuid.uuid4().hex,
+            session_id=session_id,
+            name=file.name,
+            kind=kind,
+            size=size,
+            sha256=digest.hexdigest(),
+            data=data,
+            path=path,
+        )
+
+        with self._lock:
+            artifacts = self._sessions.setdefault(session_id, {})
+            existing = next(
+                (a for a in artifacts.values() if a.sha256 == artifact.sha256 and a.kind == kind),
+                None
+            )
+            if existing is None:
+                artifacts[artifact.artifact_id] = artifact
+        if existing is not None:
+            self._drop_content(artifact)
+            return existing
+        return artifact
+
+    # --------------------------------------------------------
+    # Updating / removing
+    # --------------------------------------------------------
+    def _drop_content(self, artifact: Artifact) -> None:
+        with self._lock:
+            if artifact.data is not None:
+                self._memory_bytes -= artifact.size
+            if artifact.path is not None:
+                self._spool_bytes -= artifact.size
+            artifact.data = None
+            path, artifact.path = artifact.path, None
+        if path:
+            _unlink(path)
+
+    def _persist(self, session_id: str) -> None:
+        if self._store is None:
+            return
+        with self._lock:
+            uploaded = [
+                {
+                    "artifact_id": a.artifact_id,
+                    "name": a.name,
+                    "kind": a.kind,
+                    "size": a.size,
+                    "sha256": a.sha256,
+                    "url": a.url,
+                    "created_at": a.created_at,
+                }
+                for a in self._sessions.get(session_id, {}).values() if a.url
+            ]
+        try:
+            self._store.put(f"uploads:{session_id}", {"artifacts": uploaded}, ttl=SESSION_IDLE_SECONDS)
+        except Exception as e:
+            print(f"   Upload state not shared ({type(e).__name__}): {e}")
+
+    def set_url(self, artifact: Artifact, url: str) -> None:
+        with self._lock:
+            artifact.url = url
+        self._persist(artifact.session_id)
+
+    def release(self, artifact: Artifact) -> None:
+        """Frees the content; name, sha256 and url are kept."""
+        self._drop_content(artifact)
+
+    def remove(self, session_id: str, artifact_id: str) -> Optional[Artifact]:
+        with self._lock:
+            artifact = self._sessions.get(session_id, {}).pop(artifact_id, None)
+        if artifact is not None:
+            self._drop_content(artifact)
+            self._persist(session_id)
+        return artifact
+
+    def _forget(self, session_id: str) -> None:
+        with self._lock:
+            artifacts = list(self._sessions.pop(session_id, {}).values())
+            self._last_seen.pop(session_id, None)
+        for artifact in artifacts:
+            self._drop_content(artifact)
+
+    def clear_session(self, session_id: str) -> None:
+        self._forget(session_id)
+        if self._store is not None:
+            self._store.delete(f"uploads:{session_id}")
+
+    def prune_idle(self, max_idle: float = SESSION_IDLE_SECONDS) -> int:
+        """
+        Drops this replica's copy of sessions not seen for max_idle
+        seconds; returns how many. The shared entry expires on its own,
+        as the session may have moved to another replica.
+        """
+        cutoff = time.time() - max_idle
+        with self._lock:
+            idle = [s for s, seen in self._last_seen.items() if seen < cutoff]
+        for session_id in idle:
+            self._forget(session_id)
+        return len(idle)
+
+    # --------------------------------------------------------
+    # Reads
+    # --------------------------------------------------------
+    def _restore(self, session_id: str) -> None:
+        """Loads a session uploaded through another replica (content already released)."""
+        shared = self._store.get(f"uploads:{session_id}") if self._store else None
+        if not shared:
+            return
+        with self._lock:
+            if session_id in self._sessions:
+                return
+            self._sessions[session_id] = {
+                a["artifact_id"]: Artifact(session_id=session_id, **a) for a in shared["artifacts"]
+            }
+
+    def session_artifacts(self, session_id: str) -> List[Artifact]:
+        with self._lock:
+            known = session_id in self._sessions
+        if not known:
+            self._restore(session_id)
+        with self._lock:
+            self._last_seen[session_id] = time.time()
+            return list(self._sessions.get(session_id, {}).values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            artifacts = [a for s in self._sessions.values() for a in s.values()]
+            return {
+                "sessions": len(self._sessions),
+                "artifacts": len(artifacts),
+                "memory_bytes": self._memory_bytes,
+                "spooled": sum(1 for a in artifacts if a.spooled),
+                "disk_bytes": sum(a.size for a in artifacts if a.spooled),
+            }
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError as e:
+        # e.g. still mapped by a reader on Windows; the temp dir is cleaned eventually
+        print(f"   Spool file not removed ({type(e).__name__}): {e}")
+
+
+ARTIFACTS = ArtifactManager(store=STATE)
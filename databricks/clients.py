@@ -0,0 +1,170 @@
+import os
+import threading
+from typing import Dict, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient
+from azure.storage.filedatalake import DataLakeServiceClient
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+# Keep-alive connections kept per host. Size this to the number of
+# worker threads that can talk to one host at the same time.
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
+# (connect, read) timeouts in seconds per endpoint
+ENDPOINT_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    "jobs/run-now": (5, 30),
+    "jobs/runs/submit": (5, 30),
+    "jobs/runs/cancel": (5, 15),
+    "jobs/runs/get": (5, 15),
+    "jobs/runs/get-output": (5, 15),
+    "jobs/get": (5, 15),
+    "clusters/get": (5, 15),
+    "instance-pools/get": (5, 15),
+    "jobs/runs/list": (5, 30),
+    "blob": (5, 60),
+    "datalake": (5, 300),
+    "default": (5, 30),
+}
+
+
+def timeout_for(endpoint: str) -> Tuple[float, float]:
+    return ENDPOINT_TIMEOUTS.get(endpoint, ENDPOINT_TIMEOUTS["default"])
+
+
+# ------------------------------------------------------------
+# Shared sessions
+# ------------------------------------------------------------
+_lock = threading.Lock()
+_sessions: Dict[str, requests.Session] = {}
+_azure_clients: Dict[tuple, object] = {}
+_azure_clients_created = 0
+
+
+def _new_session(name: str) -> requests.Session:
+    session = requests.Session()
+
+    if name == "azure":
+        # azure-core runs its own retry policy; urllib3 must not retry too
+        retries = Retry(total=False, redirect=False, raise_on_status=False)
+    else:
+        retries = 0
+
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retries,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def http_session(name: str = "databricks") -> requests.Session:
+    """
+    Process-wide keep-alive session. requests.Session is safe to share
+    between threads for plain request/response calls.
+    """
+    with _lock:
+        if name not in _sessions:
+            _sessions[name] = _new_session(name)
+        return _sessions[name]
+
+
+def _azure_transport(endpoint: str) -> RequestsTransport:
+    connect_timeout, read_timeout = timeout_for(endpoint)
+    return RequestsTransport(
+        session=http_session("azure"),
+        session_owner=False,
+        connection_timeout=connect_timeout,
+        read_timeout=read_timeout,
+    )
+
+
+# ------------------------------------------------------------
+# Shared Azure clients
+# ------------------------------------------------------------
+def blob_service(connection_string: str) -> BlobServiceClient:
+    global _azure_clients_created
+    key = ("blob", connection_string)
+
+    with _lock:
+        client = _azure_clients.get(key)
+    if client is not None:
+        return client
+
+    client = BlobServiceClient.from_connection_string(
+        connection_string,
+        transport=_azure_transport("blob")
+    )
+    with _lock:
+        if key not in _azure_clients:
+            _azure_clients[key] = client
+            _azure_clients_created += 1
+        return _azure_clients[key]
+
+
+def datalake_service(account_name: str, account_key: str) -> DataLakeServiceClient:
+    global _azure_clients_created
+    key = ("datalake", account_name, account_key)
+
+    with _lock:
+        client = _azure_clients.get(key)
+    if client is not None:
+        return client
+
+    client = DataLakeServiceClient(
+        account_url=f"https://{account_name}.dfs.core.windows.net",
+        credential=account_key,
+        transport=_azure_transport("datalake")
+    )
+    with _lock:
+        if key not in _azure_clients:
+            _azure_clients[key] = client
+            _azure_clients_created += 1
+        return _azure_clients[key]
+
+
+# ------------------------------------------------------------
+# Stats
+# ------------------------------------------------------------
+def _pool_stats(session: requests.Session) -> Dict[str, int]:
+    requests_made = 0
+    connections = 0
+
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_made += pool.num_requests
+            connections += pool.num_connections
+
+    return {
+        "requests": requests_made,
+        "connections_opened": connections,
+        "reused": max(0, requests_made - connections),
+    }
+
+
+def connection_stats() -> dict:
+    """
+    Requests vs new connections per shared session. With keep-alive
+    working, connections_opened stays near the number of concurrent
+    workers while requests keeps growing.
+    """
+    with _lock:
+        sessions = dict(_sessions)
+        created = _azure_clients_created
+
+    stats = {name: _pool_stats(session) for name, session in sessions.items()}
+    stats["azure_clients_created"] = created
+    return stats
@@ -0,0 +1,331 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# ------------------------------------------------------------
+# Dimensions
+# ------------------------------------------------------------
+CLOUDS = ["Databricks", "AWS", "Azure"]
+USE_CASES = ["data_migration", "ml", "reporting", "llm"]
+RESOURCES = [
+    "compute_hours",
+    "gpu_hours",
+    "storage_gb_month",
+    "inference_requests_k",
+    "bi_user_months",
+    "llm_requests_k",
+]
+COMPUTE, GPU, STORAGE, INFERENCE, BI_USERS, LLM_REQUESTS = range(len(RESOURCES))
+
+DAYS_PER_MONTH = 30
+HOURS_PER_MONTH = 24 * DAYS_PER_MONTH
+
+# ------------------------------------------------------------
+# Unit prices (USD, indicative list prices) — CLOUDS x RESOURCES
+# bi_user_months and llm_requests_k depend on the chosen tool / model,
+# not the cloud; they are filled in by unit_rates().
+# ------------------------------------------------------------
+BASE_UNIT_RATES = np.array([
+    # compute  gpu   storage  inference_k  bi   llm_k
+    [0.55,     3.20, 0.023,   0.070,       0.0, 0.0],  # Databricks
+    [0.40,     3.06, 0.023,   0.060,       0.0, 0.0],  # AWS
+    [0.42,     3.40, 0.021,   0.060,       0.0, 0.0],  # Azure
+])
+
+BI_LICENSE_PER_USER_MONTH = {
+    ("Power BI", "Viewer"): 0.0,
+    ("Power BI", "Pro"): 10.0,
+    ("Power BI", "Premium"): 20.0,
+    ("Tableau", "Viewer"): 15.0,
+    ("Tableau", "Pro"): 42.0,
+    ("Tableau", "Premium"): 75.0,
+}
+
+# ~1.5k tokens per request (1k prompt, 0.5k completion)
+LLM_PRICE_PER_1K_REQUESTS = {
+    "GPT-4.1": 6.0,
+    "GPT-4o": 7.5,
+    "GPT-4.0": 60.0,
+}
+LLM_CATEGORY_FACTOR = {
+    "Generative AI": 1.0,
+    "Embedding / Vector Search": 0.02,
+    "Fine-tuning": 1.5,
+    "RAG (Retrieval Augmented Generation)": 1.3,
+}
+
+# Compute hours per GB for the one-time historical load
+HISTORICAL_HOURS_PER_GB = {
+    "Low (Copy)": 0.002,
+    "Medium (Joins)": 0.005,
+    "High (Aggregations / Enrichment)": 0.010,
+}
+COMPLEXITY_FACTOR = {
+    "Low (Copy)": 1.0,
+    "Medium (Joins)": 1.3,
+    "High (Aggregations / Enrichment)": 1.7,
+}
+TRAININGS_PER_MONTH = {
+    "Daily": 30.0,
+    "Weekly": 4.33,
+    "Monthly": 1.0,
+    "On Demand": 1.0,
+}
+# Real-time serving: one always-on node per this many concurrent requests
+CONCURRENT_REQUESTS_PER_NODE = 10
+MODEL_ARTIFACT_GB = 1.0
+
+
+def _num(store: dict, key: str) -> np.ndarray:
+    """Store value as a float array; scalars for the UI, arrays for sweeps."""
+    value = store.get(key)
+    return np.asarray(0 if value is None else value, dtype=float)
+
+
+# ------------------------------------------------------------
+# Per use case monthly usage (before market scaling)
+# Each returns (recurring, one_time, storage_base, storage_growth,
+# storage_cap) with any leading batch shape of the inputs.
+# ------------------------------------------------------------
+def _zeros_like(*arrays) -> np.ndarray:
+    shape = np.broadcast_shapes(*(np.shape(a) for a in arrays)) if arrays else ()
+    return np.zeros(shape + (len(RESOURCES),))
+
+
+def _data_migration(dm: dict):
+    historical_gb = _num(dm, "historical_data_gb")
+    daily_gb = _num(dm, "daily_incremental_gb")
+    pipelines = _num(dm, "pipelines")
+    runs = _num(dm, "runs_per_day")
+    runtime = _num(dm, "avg_runtime_hours")
+    retention = _num(dm, "storage_retention_days")
+
+    migration = dm.get("migration_type") or "Both"
+    complexity = dm.get("transformation_complexity") or "Low (Copy)"
+    historical = migration in ("One-time Historical Load", "Both")
+    incremental = migration in ("Ongoing Incremental", "Both")
+
+    recurring = _zeros_like(historical_gb, daily_gb, pipelines, runs, runtime, retention)
+    one_time = np.zeros_like(recurring)
+
+    if incremental:
+        if dm.get("pipeline_mode") == "Streaming":
+            hours = pipelines * HOURS_PER_MONTH
+        else:
+            hours = pipelines * runs * runtime * DAYS_PER_MONTH
+        recurring[..., COMPUTE] = hours * COMPLEXITY_FACTOR.get(complexity, 1.0)
+
+    if historical:
+        one_time[..., COMPUTE] = historical_gb * HISTORICAL_HOURS_PER_GB.get(complexity, 0.005)
+
+    storage_base = historical_gb if historical else np.zeros_like(historical_gb)
+    growth = daily_gb * DAYS_PER_MONTH if incremental else np.zeros_like(daily_gb)
+    # Raw data older than the retention window is dropped (0 = keep forever)
+    cap = np.where(retention > 0, daily_gb * retention, np.inf)
+
+    return recurring, one_time, storage_base, growth, cap
+
+
+def _ml(ml: dict):
+    training_gb = _num(ml, "training_data_gb")
+    training_hours = _num(ml, "avg_training_hours")
+    models = _num(ml, "models_count")
+    requests_per_day = _num(ml, "inference_requests_per_day")
+    concurrency = _num(ml, "peak_concurrency")
+    gpu_per_day = _num(ml, "gpu_hours_per_day")
+
+    workloads = ml.get("workload_types") or []
+    use_gpu = ml.get("use_gpu") == "Yes"
+
+    recurring = _zeros_like(training_gb, training_hours, models, requests_per_day, concurrency, gpu_per_day)
+
+    if not workloads or "Training" in workloads:
+        hours = models * training_hours * TRAININGS_PER_MONTH.get(ml.get("training_frequency"), 1.0)
+        recurring[..., GPU if use_gpu else COMPUTE] += hours
+
+    if use_gpu:
+        recurring[..., GPU] += gpu_per_day * DAYS_PER_MONTH
+
+    recurring[..., INFERENCE] = requests_per_day * DAYS_PER_MONTH / 1000
+
+    if "Real-time Inference" in workloads:
+        nodes = np.ceil(concurrency / CONCURRENT_REQUESTS_PER_NODE)
+        recurring[..., COMPUTE] += nodes * HOURS_PER_MONTH
+
+    storage_base = training_gb + models * MODEL_ARTIFACT_GB
+    return recurring, np.zeros_like(recurring), storage_base, np.zeros_like(storage_base), np.inf
+
+
+def _reporting(rp: dict):
+    users = _num(rp, "number_of_users")
+    recurring = _zeros_like(users)
+    recurring[..., BI_USERS] = users
+    zero = np.zeros_like(users)
+    return recurring, np.zeros_like(recurring), zero, zero, np.inf
+
+
+def _llm(llm: dict):
+    requests_per_day = _num(llm, "requests_per_day")
+    recurring = _zeros_like(requests_per_day)
+    recurring[..., LLM_REQUESTS] = requests_per_day * DAYS_PER_MONTH / 1000
+    zero = np.zeros_like(requests_per_day)
+    return recurring, np.zeros_like(recurring), zero, zero, np.inf
+
+
+_USE_CASE_MODELS = {
+    "data_migration": _data_migration,
+    "ml": _ml,
+    "reporting": _reporting,
+    "llm": _llm,
+}
+
+
+# ------------------------------------------------------------
+# Prices
+# ------------------------------------------------------------
+def unit_rates(stores: Dict[str, dict]) -> np.ndarray:
+    rates = BASE_UNIT_RATES.copy()
+
+    rp = stores.get("reporting") or {}
+    rates[:, BI_USERS] = BI_LICENSE_PER_USER_MONTH.get(
+        (rp.get("tool"), rp.get("user_type")), 0.0
+    )
+
+    llm = stores.get("llm") or {}
+    rates[:, LLM_REQUESTS] = (
+        LLM_PRICE_PER_1K_REQUESTS.get(llm.get("llm_model"), 6.0)
+        * LLM_CATEGORY_FACTOR.get(llm.get("llm_category"), 1.0)
+    )
+    return rates
+
+
+def cloud_mask(stores: Dict[str, dict]) -> np.ndarray:
+    """USE_CASES x CLOUDS; a use case with no cloud_type selected is priced on all clouds."""
+    mask = np.zeros((len(USE_CASES), len(CLOUDS)))
+    for u, use_case in enumerate(USE_CASES):
+        selected = (stores.get(use_case) or {}).get("cloud_type") or CLOUDS
+        mask[u] = [cloud in selected for cloud in CLOUDS]
+    return mask
+
+
+# ------------------------------------------------------------
+# Markets x months
+# ------------------------------------------------------------
+def market_arrays(markets: List[dict]):
+    """multipliers, start_months as float arrays of shape (markets,)."""
+    if not markets:
+        # No market configuration: one market at full scale from month 1
+        return np.ones(1), np.ones(1)
+    multipliers = np.array([float(m.get("multiplier") or 0) for m in markets])
+    start_months = np.array([float(m.get("start_month") or 1) for m in markets])
+    return multipliers, start_months
+
+
+def usage(
+    stores: Dict[str, dict],
+    multipliers: np.ndarray,
+    start_months: np.ndarray,
+    months: int = 12,
+) -> np.ndarray:
+    """
+    Resource quantities with shape (..., use_cases, markets, months, resources).
+    Leading batch dimensions of store values / market arrays broadcast through,
+    which is what the scenario sweep relies on.
+    """
+    t = np.arange(1, months + 1)
+    months_active = np.clip(t - start_months[..., :, None] + 1, 0, None)  # (..., M, T)
+    active = (months_active > 0).astype(float)
+    first_month = (months_active == 1).astype(float)
+    scale = multipliers[..., :, None]                                     # (..., M, 1)
+
+    per_use_case = []
+    for use_case in USE_CASES:
+        recurring, one_time, storage_base, growth, cap = _USE_CASE_MODELS[use_case](
+            stores.get(use_case) or {}
+        )
+
+        # (..., R) -> (..., 1, 1, R) against (..., M, T, 1)
+        q = (
+            recurring[..., None, None, :] * active[..., None]
+            + one_time[..., None, None, :] * first_month[..., None]
+        )
+
+        storage = (
+            np.asarray(storage_base)[..., None, None]
+            + np.minimum(np.asarray(growth)[..., None, None] * months_active,
+                         np.asarray(cap)[..., None, None])
+        ) * active
+        q = q + storage[..., None] * np.eye(len(RESOURCES))[STORAGE]
+
+        per_use_case.append(q * scale[..., None])
+
+    # Swept inputs give some use cases a batch dimension and not others
+    return np.stack(np.broadcast_arrays(*per_use_case), axis=-4)
+
+
+# ------------------------------------------------------------
+# Estimate
+# ------------------------------------------------------------
+@dataclass
+class CostEstimate:
+    usage: np.ndarray        # (use_cases, markets, months, resources)
+    cost: np.ndarray         # (clouds, use_cases, markets, months, resources)
+    budget: Optional[float]
+
+    @property
+    def monthly_by_cloud(self) -> np.ndarray:      # (clouds, months)
+        return self.cost.sum(axis=(1, 2, 4))
+
+    @property
+    def annual_by_cloud(self) -> np.ndarray:       # (clouds,)
+        return self.cost.sum(axis=(1, 2, 3, 4))
+
+    @property
+    def by_resource(self) -> np.ndarray:           # (clouds, resources)
+        return self.cost.sum(axis=(1, 2, 3))
+
+    @property
+    def by_use_case(self) -> np.ndarray:           # (clouds, use_cases)
+        return self.cost.sum(axis=(2, 3, 4))
+
+    @property
+    def by_market(self) -> np.ndarray:             # (clouds, markets)
+        return self.cost.sum(axis=(1, 3, 4))
+
+    def over_budget(self) -> np.ndarray:           # (clouds,) bool
+        if not self.budget:
+            return np.zeros(len(CLOUDS), dtype=bool)
+        return self.annual_by_cloud > self.budget
+
+
+def price(stores: Dict[str, dict], quantities: np.ndarray) -> np.ndarray:
+    """(..., use_cases, markets, months, resources) -> (..., clouds, use_cases, markets, months, resources)"""
+    return np.einsum(
+        "...umtr,uc,cr->...cumtr",
+        quantities,
+        cloud_mask(stores),
+        unit_rates(stores),
+    )
+
+
+def estimate(
+    stores: Dict[str, dict],
+    markets: List[dict],
+    annual_budget: Optional[float] = None,
+    months: int = 12,
+) -> CostEstimate:
+    """
+    Deterministic preliminary estimate from the sidebar inputs.
+
+    stores: {"data_migration": {...}, "ml": {...}, "reporting": {...}, "llm": {...}}
+            (the *_store session-state dicts)
+    """
+    multipliers, start_months = market_arrays(markets)
+    quantities = usage(stores, multipliers, start_months, months)
+    return CostEstimate(
+        usage=quantities,
+        cost=price(stores, quantities),
+        budget=annual_budget,
+    )
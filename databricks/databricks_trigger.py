@@ -1,8 +1,29 @@
 import os
 import json
 import time
+import hashlib
+import threading
+import contextvars
 import requests
-from azure.storage.blob import BlobServiceClient
+from typing import Callable, Dict, Optional, Tuple
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ClientAuthenticationError,
+    HttpResponseError,
+    ResourceNotFoundError,
+    ResourceNotModifiedError,
+)
+from databricks.clients import blob_service, http_session, timeout_for
+from databricks.polling import (
+    BLOB_STORAGE,
+    RETRYABLE_STATUS_CODES,
+    FatalError,
+    RetryableError,
+    parse_retry_after,
+)
+from databricks.run_status import RunStatusService
+from databricks.schema import canonical_json
+from databricks import telemetry
 # from databricks.sdk.runtime import dbutils
 
 
@@ -26,6 +47,27 @@ AZURE_BLOB_CONTAINER = require_env("AZURE_BLOB_CONTAINER")
 
 CONN_STR = require_env("AZURE_STORAGE_CONNECTION_STRING")
 
+RUN_STATUS_FANOUT = int(os.getenv("RUN_STATUS_FANOUT", "4"))
+
+# run-now rejects python_params whose JSON encoding exceeds this
+PYTHON_PARAMS_MAX_BYTES = 10_000
+RUNS_LIST_MAX_PAGES = int(os.getenv("RUNS_LIST_MAX_PAGES", "10"))
+
+# Submission mode:
+#   job  - jobs/run-now on DATABRICKS_JOB_ID; every run starts a job cluster
+#   warm - jobs/runs/submit of the job's task onto WARM_CLUSTER_ID while it
+#          is running, else onto a cluster from WARM_INSTANCE_POOL_ID while
+#          the pool has idle instances, else run-now as in "job" mode
+SUBMIT_MODE = os.getenv("SUBMIT_MODE", "job")
+WARM_CLUSTER_ID = os.getenv("WARM_CLUSTER_ID")
+WARM_INSTANCE_POOL_ID = os.getenv("WARM_INSTANCE_POOL_ID")
+
+# Seconds a capacity check and the job's task definition are reused
+WARM_CHECK_TTL = float(os.getenv("WARM_CHECK_TTL", "30"))
+
+if SUBMIT_MODE not in ("job", "warm"):
+    raise RuntimeError(f"SUBMIT_MODE must be 'job' or 'warm', got '{SUBMIT_MODE}'")
+
 if not all([
     DATABRICKS_WORKSPACE_URL,
     DATABRICKS_TOKEN,
@@ -36,127 +78,646 @@ if not all([
     raise RuntimeError("❌ Missing required environment variables")
 
 
+# ------------------------------------------------------------
+# Jobs API response handling
+# ------------------------------------------------------------
+def _check_response(resp: requests.Response) -> dict:
+    """
+    Splits Jobs API failures into retryable (429 / 5xx) and fatal
+    (auth, bad request, malformed JSON) so pollers fail fast on the latter.
+    """
+    if resp.status_code in RETRYABLE_STATUS_CODES:
+        raise RetryableError(
+            f"Databricks API returned {resp.status_code}",
+            retry_after=parse_retry_after(resp.headers.get("Retry-After")),
+            status_code=resp.status_code
+        )
+    if resp.status_code >= 400:
+        raise FatalError(
+            f"❌ Databricks API error {resp.status_code}: {resp.text[:500]}"
+        )
+    try:
+        return resp.json()
+    except ValueError:
+        raise FatalError("❌ Databricks API returned malformed JSON")
+
+
+# ------------------------------------------------------------
+# Warm capacity
+# ------------------------------------------------------------
+_warm_lock = threading.Lock()
+# key -> (expires_at, value)
+_warm_cache: Dict[str, tuple] = {}
+
+# Runs submitted per capacity type since the process started
+SUBMISSION_COUNTS = {"warm_cluster": 0, "instance_pool": 0, "job_cluster": 0}
+
+# Warm runs leave PENDING far sooner than a job cluster boots; polls for
+# them are seeded accordingly (see polling.TYPICAL_STATE_SECONDS)
+CAPACITY_TYPICAL_SECONDS = {
+    "warm_cluster": {"PENDING": 5},
+    "instance_pool": {"PENDING": 40},
+}
+# run_id -> capacity, until wait_for_run picks it up
+_run_capacity: Dict[int, str] = {}
+
+
+def _api_get(path: str, endpoint: str, params: dict) -> dict:
+    resp = http_session().get(
+        f"{DATABRICKS_WORKSPACE_URL}/api/{path}",
+        headers={"Authorization": f"Bearer {DATABRICKS_TOKEN}"},
+        params=params,
+        timeout=timeout_for(endpoint)
+    )
+    return _check_response(resp)
+
+
+def _cached(key: str, load: Callable[[], object]):
+    with _warm_lock:
+        entry = _warm_cache.get(key)
+    if entry and entry[0] > time.time():
+        return entry[1]
+
+    value = load()
+    with _warm_lock:
+        _warm_cache[key] = (time.time() + WARM_CHECK_TTL, value)
+    return value
+
+
+def _job_task() -> Tuple[dict, Optional[dict]]:
+    """The job's only task and the cluster spec it runs on."""
+    settings = _cached(
+        "job",
+        lambda: _api_get("2.1/jobs/get", "jobs/get", {"job_id": int(DATABRICKS_JOB_ID)})["settings"]
+    )
+    tasks = settings.get("tasks") or []
+    if len(tasks) != 1:
+        raise FatalError(f"Warm submission needs a single-task job, job has {len(tasks)} tasks")
+
+    task = tasks[0]
+    cluster = task.get("new_cluster")
+    for job_cluster in settings.get("job_clusters") or []:
+        if job_cluster.get("job_cluster_key") == task.get("job_cluster_key"):
+            cluster = job_cluster.get("new_cluster")
+    return task, cluster
+
+
+def _cluster_running() -> bool:
+    state = _api_get("2.0/clusters/get", "clusters/get", {"cluster_id": WARM_CLUSTER_ID})
+    return state.get("state") == "RUNNING"
+
+
+def _pool_has_idle() -> bool:
+    pool = _api_get(
+        "2.0/instance-pools/get", "instance-pools/get", {"instance_pool_id": WARM_INSTANCE_POOL_ID}
+    )
+    return (pool.get("stats") or {}).get("idle_count", 0) > 0
+
+
+def _available(key: str, check: Callable[[], bool]) -> bool:
+    try:
+        return _cached(key, check)
+    except Exception as e:
+        print(f"   {key} check failed ({type(e).__name__}), treating as unavailable")
+        return False
+
+
+def pick_capacity() -> str:
+    """'warm_cluster' | 'instance_pool' | 'job_cluster' for the next submission."""
+    if SUBMIT_MODE != "warm":
+        return "job_cluster"
+    if WARM_CLUSTER_ID and _available("warm_cluster", _cluster_running):
+        return "warm_cluster"
+    if WARM_INSTANCE_POOL_ID and _available("instance_pool", _pool_has_idle):
+        return "instance_pool"
+    return "job_cluster"
+
+
+def _warm_submit_body(capacity: str, payload_param: str) -> dict:
+    task, cluster = _job_task()
+
+    if capacity == "warm_cluster":
+        placement = {"existing_cluster_id": WARM_CLUSTER_ID}
+    else:
+        if not cluster:
+            raise FatalError("Job task has no cluster spec to place on the instance pool")
+        pooled = {
+            k: v for k, v in cluster.items()
+            if k not in ("node_type_id", "driver_node_type_id", "aws_attributes", "azure_attributes")
+        }
+        placement = {"new_cluster": dict(pooled, instance_pool_id=WARM_INSTANCE_POOL_ID)}
+
+    # python_params in run-now replace these task parameters
+    for task_type in ("spark_python_task", "python_wheel_task"):
+        if task_type in task:
+            submitted = {
+                "task_key": task["task_key"],
+                task_type: dict(task[task_type], parameters=[payload_param]),
+                **placement,
+            }
+            if task.get("libraries"):
+                submitted["libraries"] = task["libraries"]
+            return {
+                "run_name": f"{task['task_key']} (warm)",
+                "tasks": [submitted],
+            }
+
+    raise FatalError("Warm submission supports spark_python_task and python_wheel_task jobs")
+
+
+def submission_stats() -> dict:
+    with _warm_lock:
+        counts = dict(SUBMISSION_COUNTS)
+    counts["cold_starts_avoided"] = counts["warm_cluster"] + counts["instance_pool"]
+    return counts
+
+
 # ------------------------------------------------------------
 # Trigger Databricks job
 # ------------------------------------------------------------
-def trigger_job(payload: dict) -> int:
+def _post(endpoint: str, body: dict) -> dict:
+    resp = http_session().post(
+        f"{DATABRICKS_WORKSPACE_URL}/api/2.1/{endpoint}",
+        headers={
+            "Authorization": f"Bearer {DATABRICKS_TOKEN}",
+            "Content-Type": "application/json"
+        },
+        json=body,
+        timeout=timeout_for(endpoint)
+    )
+    return _check_response(resp)
+
+
+def idempotency_token(payload: dict, attempt: int = 0) -> Optional[str]:
+    """
+    Same token for every submission of one tracked run (its result_path),
+    so submitting it again, e.g. from a replica that took the run over,
+    returns the run already started instead of starting a second one.
+    A new attempt (after the run was skipped) gets a new token.
+    """
+    result_path = payload.get("result_path")
+    if not result_path:
+        return None
+    key = f"{result_path}#{attempt}" if attempt else result_path
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def trigger_job(payload: dict, attempt: int = 0) -> int:
+    """
+    Starts one run for the payload and returns its run_id.
+    In SUBMIT_MODE=warm the run goes to warm capacity when there is any
+    (see pick_capacity); a warm submission the workspace rejects falls
+    back to run-now, so the estimate still runs.
+    """
     print("🚀 Triggering Databricks job...")
     print("Payload:")
     print(json.dumps(payload, indent=2))
 
-    url = f"{DATABRICKS_WORKSPACE_URL}/api/2.1/jobs/run-now"
+    # Compact, deterministic encoding keeps the job parameter small
+    payload_param = canonical_json(payload)
+    param_bytes = len(json.dumps([payload_param]).encode("utf-8"))
+    if param_bytes > PYTHON_PARAMS_MAX_BYTES:
+        # The workspace would answer 400; say why instead
+        raise FatalError(
+            f"❌ Payload is {param_bytes:,} bytes as a job parameter, "
+            f"the Jobs API accepts at most {PYTHON_PARAMS_MAX_BYTES:,}. "
+            "Shorten the prompt or attach documents by URI instead of inline text."
+        )
+    token = idempotency_token(payload, attempt)
+    idempotent = {"idempotency_token": token} if token else {}
+
+    with telemetry.span("trigger_job") as attrs:
+        capacity = pick_capacity()
+        run_id = None
+
+        if capacity != "job_cluster":
+            try:
+                run_id = _post(
+                    "jobs/runs/submit",
+                    dict(_warm_submit_body(capacity, payload_param), **idempotent)
+                )["run_id"]
+            except FatalError as e:
+                print(f"   Warm submission rejected, using the job cluster: {e}")
+                capacity = "job_cluster"
+
+        if run_id is None:
+            run_id = _post("jobs/run-now", {
+                "job_id": int(DATABRICKS_JOB_ID),
+                "python_params": [payload_param],
+                **idempotent
+            })["run_id"]
+
+        attrs.update(run_id=run_id, capacity=capacity)
+
+    with _warm_lock:
+        SUBMISSION_COUNTS[capacity] += 1
+        if capacity in CAPACITY_TYPICAL_SECONDS:
+            _run_capacity[run_id] = capacity
+    print(f"✅ Job triggered on {capacity.replace('_', ' ')}. run_id = {run_id}")
+    return run_id
 
-    headers = {
-        "Authorization": f"Bearer {DATABRICKS_TOKEN}",
-        "Content-Type": "application/json"
-    }
 
-    body = {
+# ------------------------------------------------------------
+# Run status (single calls, used by the shared status service)
+# ------------------------------------------------------------
+def get_run_status(run_id: int) -> dict:
+    resp = http_session().get(
+        f"{DATABRICKS_WORKSPACE_URL}/api/2.1/jobs/runs/get",
+        headers={"Authorization": f"Bearer {DATABRICKS_TOKEN}"},
+        params={"run_id": run_id},
+        timeout=timeout_for("jobs/runs/get")
+    )
+    return _check_response(resp)
+
+
+def list_job_runs(start_time_from_ms: int) -> list:
+    """
+    All runs of DATABRICKS_JOB_ID started after start_time_from_ms,
+    newest first. One call covers up to 25 runs.
+    """
+    runs = []
+    params = {
         "job_id": int(DATABRICKS_JOB_ID),
-        "python_params": [json.dumps(payload)]
+        "start_time_from": start_time_from_ms,
+        "limit": 25,
     }
 
-    resp = requests.post(url, headers=headers, json=body, timeout=30)
-    resp.raise_for_status()
+    for _ in range(RUNS_LIST_MAX_PAGES):
+        resp = http_session().get(
+            f"{DATABRICKS_WORKSPACE_URL}/api/2.1/jobs/runs/list",
+            headers={"Authorization": f"Bearer {DATABRICKS_TOKEN}"},
+            params=params,
+            timeout=timeout_for("jobs/runs/list")
+        )
+        page = _check_response(resp)
+        runs.extend(page.get("runs", []))
+
+        if not page.get("has_more") or not page.get("next_page_token"):
+            break
+        params["page_token"] = page["next_page_token"]
 
-    run_id = resp.json()["run_id"]
-    print(f"✅ Job triggered. run_id = {run_id}")
-    return run_id
+    return runs
+
+
+# One polling loop for every session in this process
+RUN_STATUS = RunStatusService(
+    list_runs=list_job_runs,
+    get_run=get_run_status,
+    max_fanout=RUN_STATUS_FANOUT
+)
 
 
 # ------------------------------------------------------------
 # Wait for Databricks job to finish
 # ------------------------------------------------------------
-def wait_for_run(run_id: int, poll_interval: int = 10) -> None:
-    print("⏳ Waiting for Databricks job to complete...")
+class RunSkipped(RuntimeError):
+    """
+    The workspace did not start the run, typically because the job was
+    at max_concurrent_runs. Submitting again later can succeed.
+    """
 
-    url = f"{DATABRICKS_WORKSPACE_URL}/api/2.1/jobs/runs/get"
-    headers = {"Authorization": f"Bearer {DATABRICKS_TOKEN}"}
 
-    while True:
-        resp = requests.get(
-            url,
-            headers=headers,
-            params={"run_id": run_id},
-            timeout=30
+class _JobPhases:
+    """
+    Records the time spent in each life_cycle_state as job.<state>.
+    The first state also covers the time before it was first observed.
+    """
+
+    def __init__(self, run_id: int):
+        self.run_id = run_id
+        self.state: Optional[str] = None
+        self.since = time.perf_counter()
+
+    def observe(self, state: str) -> None:
+        if state == self.state:
+            return
+        now = time.perf_counter()
+        if self.state is not None:
+            telemetry.record(f"job.{self.state.lower()}", now - self.since, run_id=self.run_id)
+            self.since = now
+        self.state = state
+
+    def close(self) -> None:
+        # The terminal state has no duration of its own
+        if self.state not in (None, "TERMINATED", "SKIPPED", "INTERNAL_ERROR"):
+            telemetry.record(
+                f"job.{self.state.lower()}",
+                time.perf_counter() - self.since,
+                run_id=self.run_id,
+            )
+
+
+def _typical_seconds(run_id: int) -> Optional[dict]:
+    with _warm_lock:
+        capacity = _run_capacity.pop(run_id, None)
+    return CAPACITY_TYPICAL_SECONDS.get(capacity)
+
+
+def _run_error(state: dict) -> Optional[Exception]:
+    """RunSkipped for a skipped run, RuntimeError for any other unsuccessful end."""
+    if state.get("life_cycle_state") == "SKIPPED":
+        return RunSkipped(f"⏭️ Databricks skipped the run: {state.get('state_message', '')}")
+    if state.get("result_state") != "SUCCESS":
+        return RuntimeError(f"❌ Databricks job failed: {json.dumps(state, indent=2)}")
+    return None
+
+
+def wait_for_run(
+    run_id: int,
+    on_state: Optional[Callable[[str], None]] = None
+) -> None:
+    """
+    Blocks until the run terminates.
+    The run is registered with the process-wide RUN_STATUS service, which
+    refreshes all in-flight runs with a single jobs/runs/list call per
+    cycle (backoff and 429 handling as per databricks.polling), so API
+    traffic does not grow with the number of waiting sessions.
+    on_state is called with every life_cycle_state seen, so background
+    trackers can surface progress without polling a second time.
+    """
+    print("⏳ Waiting for Databricks job to complete...")
+    phases = _JobPhases(run_id)
+
+    def on_transition(state: str) -> None:
+        phases.observe(state)
+        if on_state:
+            on_state(state)
+
+    try:
+        state = RUN_STATUS.wait(
+            run_id,
+            on_state=on_transition,
+            typical_seconds=_typical_seconds(run_id)
         )
-        resp.raise_for_status()
+    finally:
+        phases.close()
 
-        run = resp.json()
-        state = run["state"]["life_cycle_state"]
-        result_state = run["state"].get("result_state")
+    error = _run_error(state)
+    if error:
+        raise error
 
-        print(f"   Job state: {state}")
+    print("✅ Databricks job completed successfully")
 
-        if state == "TERMINATED":
-            if result_state != "SUCCESS":
-                raise RuntimeError(
-                    f"❌ Databricks job failed: {json.dumps(run['state'], indent=2)}"
-                )
 
+def watch_run(
+    run_id: int,
+    on_done: Callable[[Optional[Exception]], None],
+    on_state: Optional[Callable[[str], None]] = None
+) -> None:
+    """
+    wait_for_run without a blocked thread: returns at once, and
+    on_done(error) is called when the run terminates, with None on
+    success, a RunSkipped, a RuntimeError for a failed, cancelled or
+    timed out run, or the error that stopped polling. Callbacks run on the
+    RUN_STATUS thread and must return quickly; the job.<state> stages
+    are recorded under the caller's trace.
+    """
+    print(f"⏳ Watching Databricks run {run_id}...")
+    phases = _JobPhases(run_id)
+    context = contextvars.copy_context()
+
+    def on_transition(state: str) -> None:
+        phases.observe(state)
+        if on_state:
+            on_state(state)
+
+    def finished(state: Optional[dict], error: Optional[Exception]) -> None:
+        phases.close()
+        if error is None:
+            error = _run_error(state or {})
+        if error is None:
             print("✅ Databricks job completed successfully")
-            return
+        on_done(error)
 
-        time.sleep(poll_interval)
+    RUN_STATUS.watch(
+        run_id,
+        on_state=lambda state: context.run(on_transition, state),
+        on_done=lambda state, error: context.run(finished, state, error),
+        typical_seconds=_typical_seconds(run_id)
+    )
+
+
+# ------------------------------------------------------------
+# Read the result from the run's output
+# ------------------------------------------------------------
+# Job contract: the estimate job is a Python task, so it has no exit
+# value. Its last line of stdout must be {"drive_link": "..."}; that
+# line comes back in the `logs` field of jobs/runs/get-output. Jobs that
+# do not print it are read from result.json instead.
+def _parse_log_tail(logs: Optional[str]) -> Optional[str]:
+    """drive_link from the final {"drive_link": ...} line of the task's stdout."""
+    lines = [line for line in (logs or "").splitlines() if line.strip()]
+    if not lines:
+        return None
+    try:
+        parsed = json.loads(lines[-1])
+    except ValueError:
+        return None
+    return parsed.get("drive_link") if isinstance(parsed, dict) else None
+
+
+def _parse_exit_value(value: Optional[str]) -> Optional[str]:
+    """Notebook tasks exit with {"drive_link": ...} JSON or the bare link."""
+    if not value:
+        return None
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = value.strip()
+
+    if isinstance(parsed, dict):
+        return parsed.get("drive_link")
+    if isinstance(parsed, str) and parsed.startswith("http"):
+        return parsed
+    return None
+
+
+def get_run_output(run_id: int) -> dict:
+    resp = http_session().get(
+        f"{DATABRICKS_WORKSPACE_URL}/api/2.1/jobs/runs/get-output",
+        headers={"Authorization": f"Bearer {DATABRICKS_TOKEN}"},
+        params={"run_id": run_id},
+        timeout=timeout_for("jobs/runs/get-output")
+    )
+    return _check_response(resp)
+
+
+def fetch_drive_link_from_run_output(run_id: int) -> Optional[str]:
+    """
+    Reads the drive link from the output of a finished run: the final
+    stdout line of the Python task (see the job contract above), or the
+    exit value when the task is a notebook. Returns None when the run
+    printed neither (older job versions only write result.json).
+    """
+    try:
+        outputs = [get_run_output(run_id)]
+    except FatalError:
+        # Multi-task runs only expose output per task run; last task first
+        tasks = get_run_status(run_id).get("tasks") or []
+        outputs = (get_run_output(t["run_id"]) for t in reversed(tasks))
+
+    for output in outputs:
+        link = (
+            _parse_log_tail(output.get("logs"))
+            or _parse_exit_value((output.get("notebook_output") or {}).get("result"))
+        )
+        if link:
+            return link
+    return None
+
+
+def fetch_result(payload: dict, run_id: int) -> str:
+    """
+    Drive link of a successfully finished run.
+    One jobs/runs/get-output call in the common case; result.json in
+    ADLS is only read when the run output has no link or cannot be read.
+    """
+    with telemetry.span("fetch_result") as attrs:
+        try:
+            drive_link = fetch_drive_link_from_run_output(run_id)
+        except Exception as e:
+            print(f"   Run output unavailable ({type(e).__name__}: {e}), falling back to ADLS")
+            drive_link = None
+
+        if drive_link:
+            attrs["source"] = "run_output"
+            print("✅ Drive link read from run output")
+            return drive_link
+
+        attrs["source"] = "blob"
+        return fetch_drive_link_from_adls(payload)
 
 
 # ------------------------------------------------------------
 # Read result.json from Azure Blob
 # ------------------------------------------------------------
-def fetch_drive_link_from_adls(payload: dict, timeout: int = 300) -> str:
+
+def result_prefix(payload: dict) -> str:
+    """
+    Folder in finops-output holding the run's result.json / progress.json.
+    Runs submitted through run_tracker carry their own result_path so
+    concurrent runs for the same client / use case do not collide.
+    """
+    return payload.get("result_path") or (
+        f"{payload['client_name']}/{payload['use_case_name']}"
+    )
+
+
+# ETag of the last result.json read per shared (client/use_case) path.
+# A read that returns the same ETag is a previous run's result.
+# Per-run result paths are never reused, so they are not tracked.
+_result_etags: Dict[str, str] = {}
+_etags_lock = threading.Lock()
+
+
+def fetch_drive_link_from_adls(payload: dict) -> str:
     """
     Securely reads result.json from ADLS using account key.
     Works with private storage accounts.
+
+    Called once the run has finished, and the job writes result.json
+    before it exits, so this is a single read. On a shared path it is
+    conditional on the ETag of the last read: an unchanged object is a
+    previous run's result, not this one's.
     """
 
     connect_str = CONN_STR
     if not connect_str:
         raise RuntimeError("AZURE_STORAGE_CONNECTION_STRING not set")
 
-    client_name = payload["client_name"]
-    use_case_name = payload["use_case_name"]
+    shared_path = not payload.get("result_path")
+    blob_path = f"{result_prefix(payload)}/result.json"
 
-    blob_path = f"{client_name}/{use_case_name}/result.json"
+    print(f"🔎 Reading finops-output/{blob_path}")
 
-    print("🔎 Polling ADLS using Azure SDK")
-    print(f"Blob path: finops-output/{blob_path}")
-
-    blob_service = BlobServiceClient.from_connection_string(connect_str)
-    blob_client = blob_service.get_blob_client(
+    blob_client = blob_service(connect_str).get_blob_client(
         container="finops-output",
         blob=blob_path
     )
 
-    start = time.time()
-    attempt = 0
+    with _etags_lock:
+        seen_etag = _result_etags.get(blob_path) if shared_path else None
+    conditions = (
+        {"etag": seen_etag, "match_condition": MatchConditions.IfModified}
+        if seen_etag else {}
+    )
 
-    while time.time() - start < timeout:
-        attempt += 1
-        try:
-            print(f"   Attempt {attempt}: downloading result.json")
-            data = blob_client.download_blob().readall()
-            result = json.loads(data)
+    try:
+        downloader = blob_client.download_blob(**conditions)
+        data = downloader.readall()
+    except ResourceNotFoundError:
+        raise FatalError("❌ Run finished without a drive link or result.json")
+    except ResourceNotModifiedError:
+        raise FatalError("❌ result.json is from a previous run; this run wrote none")
+    except ClientAuthenticationError as e:
+        raise FatalError(f"❌ ADLS authentication failed: {e.message}")
+    except HttpResponseError as e:
+        if e.status_code == 429 and e.response is not None:
+            BLOB_STORAGE.throttled(parse_retry_after(e.response.headers.get("Retry-After")))
+        raise RuntimeError(f"❌ ADLS error {e.status_code} reading result.json: {e.message}")
 
-            if "drive_link" not in result:
-                raise RuntimeError("drive_link missing in result.json")
+    try:
+        result = json.loads(data)
+    except ValueError:
+        raise FatalError("❌ result.json is not valid JSON")
 
-            print("✅ result.json read successfully")
-            return result["drive_link"]
+    if "drive_link" not in result:
+        raise FatalError("❌ drive_link missing in result.json")
+
+    if shared_path:
+        with _etags_lock:
+            _result_etags[blob_path] = downloader.properties.etag
+
+    print("✅ result.json read successfully")
+    return result["drive_link"]
+
+
+# ------------------------------------------------------------
+# Progress and cancellation
+# ------------------------------------------------------------
+def read_progress(payload: dict, etag: Optional[str] = None) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Conditional read of the progress.json the job writes next to
+    result.json (stage, resources extracted so far, running subtotal).
+    With the etag of the previous read, an unchanged object comes back
+    as 304 without a body.
+
+    Returns (etag, progress); progress is None when the object is
+    unchanged, not written yet or not a JSON object.
+    """
+    blob_client = blob_service(CONN_STR).get_blob_client(
+        container="finops-output",
+        blob=f"{result_prefix(payload)}/progress.json"
+    )
+    conditions = {"etag": etag, "match_condition": MatchConditions.IfModified} if etag else {}
+
+    try:
+        downloader = blob_client.download_blob(**conditions)
+        data = downloader.readall()
+    except (ResourceNotModifiedError, ResourceNotFoundError):
+        return etag, None
+
+    try:
+        progress = json.loads(data)
+    except ValueError:
+        progress = None
+    return downloader.properties.etag, progress if isinstance(progress, dict) else None
 
-        except Exception as e:
-            print(f"   Not ready yet ({type(e).__name__})")
-            time.sleep(5)
 
-    raise TimeoutError("Timed out waiting for result.json in ADLS")
+def cancel_run(run_id: int) -> None:
+    """Asks Databricks to stop the run; wait_for_run then sees it terminate."""
+    _post("jobs/runs/cancel", {"run_id": run_id})
+    print(f"🛑 Cancel requested for run_id = {run_id}")
 
 
 # ------------------------------------------------------------
-# Orchestrator (call this from Streamlit / CLI)
+# Orchestrator (blocking, for CLI use)
+# Streamlit should use run_tracker.submit_estimate instead.
 # ------------------------------------------------------------
 def run_job_and_get_gdrive_link(payload: dict) -> str:
     run_id = trigger_job(payload)
     wait_for_run(run_id)
-    drive_link = fetch_drive_link_from_adls(payload)
+    drive_link = fetch_result(payload, run_id)
 
     print("🎉 Google Drive link retrieved successfully")
     return drive_link
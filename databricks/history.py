@@ -0,0 +1,206 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+HISTORY_PATH = os.getenv("HISTORY_PATH", ".cache/history.sqlite3")
+HISTORY_SEARCH_LIMIT = int(os.getenv("HISTORY_SEARCH_LIMIT", "50"))
+
+# Columns returned by search(); the payload is only loaded by get()
+_SUMMARY_COLUMNS = (
+    "handle_id, payload_key, client_name, use_case_name, status, run_id, "
+    "drive_link, error, cached, submitted_at, finished_at, duration_s, stages"
+)
+
+
+# ------------------------------------------------------------
+# Estimate history
+# ------------------------------------------------------------
+class EstimateHistory:
+    """
+    Every submitted estimate with its payload, run, timings and result,
+    kept across sessions so past results can be found and re-opened
+    without running the job again.
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        # Readers (the sidebar) do not block the run tracker's writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS estimates (
+                handle_id TEXT PRIMARY KEY,
+                payload_key TEXT NOT NULL,
+                client_name TEXT NOT NULL COLLATE NOCASE,
+                use_case_name TEXT NOT NULL COLLATE NOCASE,
+                status TEXT NOT NULL,
+                run_id INTEGER,
+                drive_link TEXT,
+                error TEXT,
+                cached INTEGER NOT NULL DEFAULT 0,
+                submitted_at REAL NOT NULL,
+                finished_at REAL,
+                duration_s REAL,
+                stages TEXT,
+                payload TEXT NOT NULL
+            )
+            """
+        )
+        # Prefix LIKE on a NOCASE column can use these indexes. The trailing
+        # columns cover the other filters, so only the rows returned are read
+        # from the table.
+        for name, columns in (
+            ("client", "client_name, submitted_at, status, use_case_name"),
+            ("use_case", "use_case_name, submitted_at, status, client_name"),
+            ("payload_key", "payload_key, submitted_at"),
+            ("submitted_at", "submitted_at"),
+        ):
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_estimates_{name} ON estimates({columns})"
+            )
+        # Refreshes planner statistics when the table has grown
+        self._db.execute("PRAGMA optimize")
+        self._db.commit()
+
+    # --------------------------------------------------------
+    # Writes (run tracker)
+    # --------------------------------------------------------
+    def record(self, handle, stages: Optional[dict] = None) -> None:
+        """Inserts or updates the row for a RunHandle."""
+        payload = handle.payload
+        duration = round(handle.elapsed, 3) if handle.finished_at else None
+
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT INTO estimates (
+                    handle_id, payload_key, client_name, use_case_name, status,
+                    run_id, drive_link, error, cached, submitted_at, finished_at,
+                    duration_s, stages, payload
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(handle_id) DO UPDATE SET
+                    status = excluded.status,
+                    run_id = excluded.run_id,
+                    drive_link = excluded.drive_link,
+                    error = excluded.error,
+                    finished_at = excluded.finished_at,
+                    duration_s = excluded.duration_s,
+                    stages = COALESCE(excluded.stages, stages)
+                """,
+                (
+                    handle.handle_id,
+                    handle.cache_key,
+                    payload.get("client_name") or "",
+                    payload.get("use_case_name") or "",
+                    handle.status,
+                    handle.run_id,
+                    handle.drive_link,
+                    handle.error,
+                    int(handle.cached),
+                    handle.submitted_at,
+                    handle.finished_at,
+                    duration,
+                    json.dumps(stages) if stages else None,
+                    json.dumps(payload, sort_keys=True, default=str),
+                )
+            )
+            self._db.commit()
+
+    # --------------------------------------------------------
+    # Reads (sidebar)
+    # --------------------------------------------------------
+    def search(
+        self,
+        client: str = "",
+        use_case: str = "",
+        status: Optional[str] = None,
+        payload_key: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = HISTORY_SEARCH_LIMIT,
+    ) -> List[dict]:
+        """
+        Newest first. client / use_case match case-insensitively by prefix.
+        Rows do not include the payload; use get() for that.
+        """
+        clauses, params = [], []
+        for column, prefix in (("client_name", client), ("use_case_name", use_case)):
+            prefix = (prefix or "").strip()
+            if prefix:
+                escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                clauses.append(f"{column} LIKE ? ESCAPE '\\'")
+                params.append(escaped + "%")
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if payload_key:
+            clauses.append("payload_key = ?")
+            params.append(payload_key)
+        if since is not None:
+            clauses.append("submitted_at >= ?")
+            params.append(since)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {_SUMMARY_COLUMNS} FROM estimates {where} "
+                "ORDER BY submitted_at DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def get(self, handle_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {_SUMMARY_COLUMNS}, payload FROM estimates WHERE handle_id = ?",
+                (handle_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = self._row(row)
+        entry["payload"] = json.loads(row["payload"])
+        return entry
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM estimates").fetchone()[0]
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        entry = {k: row[k] for k in row.keys() if k != "payload"}
+        entry["cached"] = bool(entry["cached"])
+        entry["stages"] = json.loads(entry["stages"]) if entry["stages"] else {}
+        return entry
+
+
+HISTORY = EstimateHistory()
+
+
+def record_safely(handle, stages: Optional[dict] = None) -> None:
+    """History is a convenience; a write failure must not fail the estimate."""
+    try:
+        HISTORY.record(handle, stages)
+    except sqlite3.Error as e:
+        print(f"   History write failed ({type(e).__name__}): {e}")
+
+
+def format_age(timestamp: float) -> str:
+    seconds = time.time() - timestamp
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m ago"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}h ago"
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
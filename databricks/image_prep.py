@@ -0,0 +1,94 @@
+import io
+import os
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+# Longest side after downscaling; vision models gain nothing beyond this
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "WEBP").upper()  # WEBP | JPEG
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    format: str
+    width: int
+    height: int
+    original_bytes: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(0, self.original_bytes - len(self.data))
+
+
+def _has_metadata(img: Image.Image) -> bool:
+    """EXIF (GPS, device info), XMP or comments that re-encoding would strip."""
+    return bool(img.getexif()) or any(
+        key in img.info for key in ("xmp", "XML:com.adobe.xmp", "comment")
+    )
+
+
+def preprocess_image(
+    file,
+    max_dimension: int = IMAGE_MAX_DIMENSION,
+    image_format: str = IMAGE_FORMAT,
+    quality: int = IMAGE_QUALITY,
+) -> PreparedImage:
+    """
+    Downscales to max_dimension, applies the EXIF orientation, then
+    re-encodes as WebP/JPEG at `quality`. Re-encoding without passing
+    exif/icc data strips all metadata (GPS, device info). A source
+    without metadata is kept as is when re-encoding would not make it
+    smaller.
+    CPU-bound but releases the GIL in Pillow, so it is run from the
+    upload worker threads.
+    """
+    file.seek(0)
+    original = file.read()
+    file.seek(0)
+
+    with Image.open(io.BytesIO(original)) as source:
+        keep_original = PreparedImage(
+            data=original,
+            format=source.format,
+            width=source.width,
+            height=source.height,
+            original_bytes=len(original),
+        )
+        has_metadata = _has_metadata(source)
+
+        img = ImageOps.exif_transpose(source)
+        img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+        if img.mode in ("P", "PA", "LA") or "transparency" in img.info:
+            # Palette and colour-key transparency only survive through RGBA
+            img = img.convert("RGBA")
+        if img.mode == "RGBA" and image_format == "JPEG":
+            # JPEG has no alpha: composite onto white instead of letting
+            # transparent areas turn black
+            background = Image.new("RGB", img.size, "white")
+            background.paste(img, mask=img.getchannel("A"))
+            img = background
+        elif img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGB")
+
+        out = io.BytesIO()
+        img.save(out, format=image_format, quality=quality, optimize=True)
+
+        if len(out.getvalue()) >= len(original) and not has_metadata:
+            return keep_original
+
+        return PreparedImage(
+            data=out.getvalue(),
+            format=image_format,
+            width=img.width,
+            height=img.height,
+            original_bytes=len(original),
+        )
@@ -1,4 +1,11 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
+
+from databricks.schema import (
+    SCHEMA_VERSION,
+    SchemaError,
+    compact_use_cases,
+    parse_markets,
+)
 
 
 def payload_setter(
@@ -8,23 +15,55 @@ def payload_setter(
     use_case_name: str,
     markets: List[dict],
     user_prompt: Optional[str],
-    budget: Optional[float]
+    budget: Optional[float],
+    documents: Optional[List[dict]] = None,
+    use_cases: Optional[Dict[str, dict]] = None
 ) -> dict:
     """
     Builds the payload for Databricks job execution.
+    Raises SchemaError listing every invalid input.
 
     image_uris: list of image URLs (can be empty)
     file_uris: list of document URLs (can be empty)
+    documents: references to pre-extracted PDF chunks in storage, see
+               pdf_extract.build_document_manifest (can be empty; the job
+               then parses file_uris itself)
+    use_cases: {"data_migration" | "ml" | "reporting" | "llm": store dict};
+               validated against databricks.schema, zero / empty fields and
+               untouched use cases dropped
     """
+    problems = []
+    if not (client_name or "").strip():
+        problems.append("client_name is required")
+    if not (use_case_name or "").strip():
+        problems.append("use_case_name is required")
+    if budget is not None and budget < 0:
+        problems.append("budget must not be negative")
+
+    try:
+        parsed_markets = [vars(m) for m in parse_markets(markets)]
+    except SchemaError as e:
+        problems += e.problems
+    try:
+        compact_blocks = compact_use_cases(use_cases or {})
+    except SchemaError as e:
+        problems += e.problems
+
+    if problems:
+        raise SchemaError(problems)
 
     payload = {
-        "image_uris": image_uris or [],
-        "file_uris": file_uris or [],
-        "client_name": client_name,
-        "use_case_name": use_case_name,
-        "markets": markets,
+        "schema_version": SCHEMA_VERSION,
+        # De-duplicated, first occurrence wins
+        "image_uris": list(dict.fromkeys(image_uris or [])),
+        "file_uris": list(dict.fromkeys(file_uris or [])),
+        "client_name": client_name.strip(),
+        "use_case_name": use_case_name.strip(),
+        "markets": parsed_markets,
         "user_prompt": user_prompt,
-        "budget": budget,
+        "budget": float(budget) if budget else None,
+        "documents": documents or [],
+        "use_cases": compact_blocks,
     }
 
     return payload
@@ -0,0 +1,238 @@
+import hashlib
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+CHUNK_TOKENS = int(os.getenv("PDF_CHUNK_TOKENS", "400"))
+
+# Upper bound on extracted tokens the job reads for one payload (all documents)
+DOCUMENT_TOKEN_BUDGET = int(os.getenv("DOCUMENT_TOKEN_BUDGET", "8000"))
+
+# A line is treated as a table row when it splits into this many cells
+MIN_TABLE_CELLS = 3
+_CELL_SPLIT = re.compile(r"\t|\s{2,}|\s\|\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+# ------------------------------------------------------------
+# Worker side (runs in the process pool)
+# ------------------------------------------------------------
+def _extract_pages(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    reader = PdfReader(path)
+    pages = []
+    for index in range(start, end):
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception:
+            # One unreadable page should not lose the whole document
+            text = ""
+        pages.append((index + 1, text))
+    return pages
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded app server is not safe
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+# ------------------------------------------------------------
+# Post-processing
+# ------------------------------------------------------------
+def _normalize(line: str) -> str:
+    return " ".join(line.split()).lower()
+
+
+def _repeated_lines(pages: List[Tuple[int, str]]) -> set:
+    """Headers, footers and boilerplate printed on most pages."""
+    if len(pages) < 3:
+        return set()
+    counts = Counter()
+    for _, text in pages:
+        counts.update({_normalize(line) for line in text.splitlines() if line.strip()})
+    threshold = max(3, len(pages) // 2)
+    return {line for line, n in counts.items() if n >= threshold}
+
+
+def _blocks(pages: List[Tuple[int, str]]) -> List[dict]:
+    """Splits page text into prose and table blocks, dropping boilerplate."""
+    boilerplate = _repeated_lines(pages)
+    blocks = []
+
+    for page, text in pages:
+        current_kind, current_lines = None, []
+
+        for line in text.splitlines():
+            if not line.strip() or _normalize(line) in boilerplate:
+                continue
+
+            cells = [c.strip() for c in _CELL_SPLIT.split(line.strip()) if c.strip()]
+            if len(cells) >= MIN_TABLE_CELLS:
+                kind, line = "table", " | ".join(cells)
+            else:
+                kind, line = "text", " ".join(line.split())
+
+            if kind != current_kind and current_lines:
+                blocks.append({"page": page, "kind": current_kind, "lines": current_lines})
+                current_lines = []
+            current_kind = kind
+            current_lines.append(line)
+
+        if current_lines:
+            blocks.append({"page": page, "kind": current_kind, "lines": current_lines})
+
+    return blocks
+
+
+def _chunk(blocks: List[dict], chunk_tokens: int) -> List[dict]:
+    chunks = []
+    for block in blocks:
+        joiner = "\n" if block["kind"] == "table" else " "
+        current, size = [], 0
+        for line in block["lines"]:
+            tokens = estimate_tokens(line)
+            if current and size + tokens > chunk_tokens:
+                chunks.append({"page": block["page"], "kind": block["kind"], "text": joiner.join(current)})
+                current, size = [], 0
+            current.append(line)
+            size += tokens
+        if current:
+            chunks.append({"page": block["page"], "kind": block["kind"], "text": joiner.join(current)})
+    return chunks
+
+
+# ------------------------------------------------------------
+# Public API
+# ------------------------------------------------------------
+def extract_pdf(path: str, chunk_tokens: int = CHUNK_TOKENS) -> dict:
+    """
+    Extracts text and table rows from a PDF on disk, parsing page ranges
+    in parallel in the process pool. Returns {"pages": n, "chunks": [...]}.
+    """
+    page_count = len(PdfReader(path).pages)
+    ranges = [
+        (start, min(start + PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PAGES_PER_TASK)
+    ]
+
+    pool = _get_pool()
+    futures = [pool.submit(_extract_pages, path, start, end) for start, end in ranges]
+
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+
+    return {"pages": page_count, "chunks": _chunk(_blocks(pages), chunk_tokens)}
+
+
+def extract_uploaded_pdf(uploaded_file) -> dict:
+    """extract_pdf for an in-memory upload; the bytes are staged in a temp file."""
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        while True:
+            chunk = uploaded_file.read(4 * 1024 * 1024)
+            if not chunk:
+                break
+            tmp.write(chunk)
+        path = tmp.name
+    uploaded_file.seek(0)
+
+    try:
+        return extract_pdf(path)
+    finally:
+        os.unlink(path)
+
+
+def _ranges(indexes: List[int]) -> List[List[int]]:
+    """[0, 1, 2, 5, 6] -> [[0, 3], [5, 7]] (end exclusive)."""
+    ranges = []
+    for i in indexes:
+        if ranges and ranges[-1][1] == i:
+            ranges[-1][1] = i + 1
+        else:
+            ranges.append([i, i + 1])
+    return ranges
+
+
+def build_document_manifest(
+    documents: List[dict],
+    token_budget: int = DOCUMENT_TOKEN_BUDGET,
+) -> List[dict]:
+    """
+    documents: [{"uri", "name", "sha256", "pages", "chunks", "chunks_uri"}, ...]
+
+    Drops chunks whose text already appeared (in any document) and trims
+    the rest to token_budget, shared evenly between documents so one long
+    RFP cannot crowd out the others. The result is what payload_setter
+    ships as `documents`.
+
+    The chunk text itself stays in storage at chunks_uri (see
+    uploads.upload_document_chunks); each entry only lists the kept
+    chunks as [start, end) index ranges, so the job parameter stays far
+    below the Jobs API limit however long the documents are.
+    """
+    if not documents:
+        return []
+
+    seen = set()
+    per_doc_budget = token_budget // len(documents)
+    manifest = []
+
+    for doc in documents:
+        used = 0
+        kept = []
+        truncated = False
+
+        for index, chunk in enumerate(doc["chunks"]):
+            digest = hashlib.sha1(_normalize(chunk["text"]).encode("utf-8")).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+
+            tokens = estimate_tokens(chunk["text"])
+            if used + tokens > per_doc_budget:
+                truncated = True
+                break
+            used += tokens
+            kept.append(index)
+
+        manifest.append({
+            "uri": doc["uri"],
+            "name": doc["name"],
+            "sha256": doc["sha256"],
+            "pages": doc["pages"],
+            "chunks_uri": doc["chunks_uri"],
+            "chunk_ranges": _ranges(kept),
+            "tokens": used,
+            "truncated": truncated,
+        })
+
+    return manifest
@@ -0,0 +1,158 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+# ------------------------------------------------------------
+# Typical time spent in each Databricks life_cycle_state.
+# The first wait after entering a state is seeded from these,
+# so a fresh PENDING run is not polled every few seconds while
+# its cluster boots.
+# ------------------------------------------------------------
+TYPICAL_STATE_SECONDS = {
+    "QUEUED": 30,
+    "BLOCKED": 30,
+    "WAITING_FOR_RETRY": 30,
+    "PENDING": 120,
+    "RUNNING": 60,
+    "TERMINATING": 5,
+}
+DEFAULT_TYPICAL_SECONDS = 10
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Multiplies every poll delay and throttle pause. Only the offline
+# benchmark (bench/) sets this, to replay long runs in compressed time.
+POLL_TIME_SCALE = float(os.getenv("POLL_TIME_SCALE", "1"))
+
+
+class RetryableError(Exception):
+    """Transient failure: the poller should back off and try again."""
+
+    def __init__(
+        self,
+        message: str,
+        retry_after: Optional[float] = None,
+        status_code: Optional[int] = None,
+    ):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class FatalError(RuntimeError):
+    """Failure that will not fix itself (auth, bad data). Surface at once."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header (delta-seconds or HTTP-date).
+    Returns seconds to wait, or None if absent / unparseable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# ------------------------------------------------------------
+# Per-poller backoff
+# ------------------------------------------------------------
+class PollSchedule:
+    """
+    Exponential backoff with jitter for a single poll loop.
+
+    The first wait in a state is a fraction of that state's typical
+    duration; later waits grow by `factor` up to `max_delay`.
+    Entering a new state starts the sequence again.
+    """
+
+    def __init__(
+        self,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+        factor: float = 2.0,
+        jitter: float = 0.3,
+        seed_fraction: float = 0.5,
+        typical_seconds: Optional[Dict[str, float]] = None,
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.seed_fraction = seed_fraction
+        # Per-run overrides of TYPICAL_STATE_SECONDS, e.g. a short PENDING on a warm cluster
+        self.typical_seconds = {**TYPICAL_STATE_SECONDS, **(typical_seconds or {})}
+        self._state = None
+        self._attempt = 0
+
+    def next_delay(
+        self,
+        state: Optional[str] = None,
+        retry_after: Optional[float] = None,
+    ) -> float:
+        if retry_after is not None:
+            # Server told us exactly how long to wait; keep the curve where it is
+            return (retry_after + random.uniform(0, self.base_delay)) * POLL_TIME_SCALE
+
+        if state != self._state:
+            self._state = state
+            self._attempt = 0
+
+        if self._attempt == 0 and state is not None:
+            typical = self.typical_seconds.get(state, DEFAULT_TYPICAL_SECONDS)
+            delay = max(self.base_delay, typical * self.seed_fraction)
+        else:
+            delay = self.base_delay * (self.factor ** self._attempt)
+
+        self._attempt += 1
+        delay = min(delay, self.max_delay)
+        return delay * random.uniform(1 - self.jitter, 1) * POLL_TIME_SCALE
+
+
+# ------------------------------------------------------------
+# Shared scheduler (one per remote service)
+# ------------------------------------------------------------
+class PollScheduler:
+    """
+    Process-wide coordination for every poll loop that talks to the
+    same service. A 429 seen by one session pauses all of them until
+    the Retry-After window has passed.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def schedule(self, **kwargs) -> PollSchedule:
+        return PollSchedule(**kwargs)
+
+    def throttled(self, retry_after: Optional[float]) -> None:
+        wait = (retry_after if retry_after is not None else 5.0) * POLL_TIME_SCALE
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.time() + wait)
+        print(f"   {self.name}: throttled, pausing pollers for {wait:.1f}s")
+
+    def sleep(self, delay: float, deadline: Optional[float] = None) -> None:
+        """Sleeps for delay, extended by any shared cooldown, capped at deadline."""
+        with self._lock:
+            until = max(time.time() + delay, self._cooldown_until)
+        if deadline is not None:
+            until = min(until, deadline)
+        remaining = until - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+JOBS_API = PollScheduler("jobs-api")
+BLOB_STORAGE = PollScheduler("blob-storage")
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from databricks.state_store import STATE, StateStore
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", ".cache/results.sqlite3")
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+
+# Keys that identify a particular run rather than the estimate itself
+VOLATILE_KEYS = {"result_path"}
+
+
+# ------------------------------------------------------------
+# Payload normalization
+# ------------------------------------------------------------
+def _clean_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = " ".join(str(value).split())
+    return value or None
+
+
+def normalize_payload(payload: dict) -> dict:
+    """
+    Canonical form of a payload_setter dict: URI lists sorted and
+    de-duplicated, markets ordered by name, whitespace collapsed and
+    numbers as floats. Two payloads that would produce the same
+    estimate normalize to the same dict.
+    """
+    normalized = {}
+
+    for key, value in payload.items():
+        if key in VOLATILE_KEYS:
+            continue
+
+        if key in ("image_uris", "file_uris"):
+            value = sorted(set(value or []))
+        elif key == "markets":
+            value = sorted(
+                (
+                    {
+                        "market": m.get("market"),
+                        "multiplier": float(m.get("multiplier") or 0),
+                        "start_month": int(m.get("start_month") or 1),
+                    }
+                    for m in value or []
+                ),
+                key=lambda m: str(m["market"])
+            )
+        elif key == "budget":
+            value = float(value or 0)
+        elif isinstance(value, str) or value is None:
+            value = _clean_str(value)
+
+        normalized[key] = value
+
+    return normalized
+
+
+def payload_key(payload: dict) -> str:
+    canonical = json.dumps(
+        normalize_payload(payload),
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------------------------------
+# SQLite-backed cache (TTL + LRU)
+# ------------------------------------------------------------
+class ResultCache:
+    """
+    With a `store` (the shared state store when it spans replicas),
+    results are written through to it and local misses are looked up
+    there, so a result computed on one replica is a hit on all of them.
+    """
+
+    def __init__(
+        self,
+        path: str = RESULT_CACHE_PATH,
+        ttl_seconds: int = RESULT_CACHE_TTL_SECONDS,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        store: Optional[StateStore] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._store = store
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                drive_link TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT drive_link, metadata, created_at FROM results WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+            if row is not None and now - row[2] > self.ttl_seconds:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+
+            if row is not None:
+                self._db.execute(
+                    "UPDATE results SET last_access = ? WHERE key = ?", (now, key)
+                )
+                self._db.commit()
+
+        if row is None:
+            return self._get_shared(key)
+
+        return {
+            "drive_link": row[0],
+            "metadata": json.loads(row[1]),
+            "created_at": row[2],
+        }
+
+    def _get_shared(self, key: str) -> Optional[dict]:
+        if self._store is None:
+            return None
+        entry = self._store.get(f"result:{key}")
+        if entry is None:
+            return None
+        self._put_local(key, entry["drive_link"], entry["metadata"], entry["created_at"])
+        return entry
+
+    def put(self, key: str, drive_link: str, metadata: Optional[dict] = None) -> None:
+        now = time.time()
+        self._put_local(key, drive_link, metadata, now)
+        if self._store is not None:
+            self._store.put(
+                f"result:{key}",
+                {"drive_link": drive_link, "metadata": metadata or {}, "created_at": now},
+                ttl=self.ttl_seconds
+            )
+
+    def _put_local(self, key: str, drive_link: str, metadata: Optional[dict], created_at: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO results
+                    (key, drive_link, metadata, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (key, drive_link, json.dumps(metadata or {}), created_at, now)
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._db.commit()
+        if self._store is not None:
+            self._store.delete(f"result:{key}")
+
+    def _evict(self, now: float) -> None:
+        self._db.execute(
+            "DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        self._db.execute(
+            """
+            DELETE FROM results WHERE key IN (
+                SELECT key FROM results
+                ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,)
+        )
+
+
+RESULT_CACHE = ResultCache(store=STATE if STATE.distributed else None)
@@ -0,0 +1,317 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import requests
+
+from databricks.polling import (
+    JOBS_API,
+    POLL_TIME_SCALE,
+    FatalError,
+    PollSchedule,
+    RetryableError,
+)
+
+
+TERMINAL_STATES = {"TERMINATED", "SKIPPED", "INTERNAL_ERROR"}
+
+# Unexpected refresh errors in a row (not 429 / 5xx / connection) after
+# which a run's waiters get the error instead of waiting on
+MAX_REFRESH_FAILURES = 5
+
+# Waiters re-check this often that the polling thread is still alive
+LIVENESS_CHECK_SECONDS = 5.0
+
+
+# ------------------------------------------------------------
+# Tracked run
+# ------------------------------------------------------------
+class _TrackedRun:
+    def __init__(self, run_id: int, typical_seconds: Optional[Dict[str, float]] = None):
+        self.run_id = run_id
+        self.registered_at = time.time()
+        self.state: Optional[dict] = None
+        self.error: Optional[Exception] = None
+        self.version = 0
+        self.waiters = 0
+        # (on_state, on_done) callbacks of watch()
+        self.watchers: List[tuple] = []
+        self.failures = 0
+        self.schedule = PollSchedule(typical_seconds=typical_seconds)
+        self.next_due = 0.0
+
+    @property
+    def life_cycle_state(self) -> Optional[str]:
+        return self.state["life_cycle_state"] if self.state else None
+
+    @property
+    def finished(self) -> bool:
+        return self.error is not None or self.life_cycle_state in TERMINAL_STATES
+
+
+# ------------------------------------------------------------
+# Process-wide status service
+# ------------------------------------------------------------
+class RunStatusService:
+    """
+    One polling loop for every run this process is waiting on.
+
+    Each refresh makes a single jobs/runs/list call for the job and only
+    falls back to per-run jobs/runs/get (bounded fan-out) for runs the
+    listing did not cover, e.g. one-off runs/submit runs. Waiters block
+    on a condition variable and are woken when their run's state changes;
+    watchers hold no thread at all and are called back instead.
+
+    list_runs(start_time_from_ms) -> iterable of run dicts
+    get_run(run_id) -> run dict
+    """
+
+    def __init__(
+        self,
+        list_runs: Callable[[int], Iterable[dict]],
+        get_run: Callable[[int], dict],
+        max_fanout: int = 4,
+    ):
+        self._list_runs = list_runs
+        self._get_run = get_run
+        self._fanout = ThreadPoolExecutor(
+            max_workers=max_fanout,
+            thread_name_prefix="run-status",
+        )
+        self._runs: Dict[int, _TrackedRun] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.api_calls = 0
+
+    # --------------------------------------------------------
+    # Waiter side
+    # --------------------------------------------------------
+    def register(
+        self,
+        run_id: int,
+        typical_seconds: Optional[Dict[str, float]] = None,
+    ) -> None:
+        with self._cond:
+            if run_id not in self._runs:
+                self._runs[run_id] = _TrackedRun(run_id, typical_seconds)
+            self._ensure_loop()
+            self._cond.notify_all()
+
+    def wait(
+        self,
+        run_id: int,
+        on_state: Optional[Callable[[str], None]] = None,
+        typical_seconds: Optional[Dict[str, float]] = None,
+    ) -> dict:
+        """
+        Blocks until the run reaches a terminal state and returns its
+        `state` dict. on_state is called on every life_cycle_state change.
+        typical_seconds overrides the poll seeding for this run.
+        """
+        self.register(run_id, typical_seconds)
+
+        with self._cond:
+            run = self._runs[run_id]
+            run.waiters += 1
+            seen = 0
+            try:
+                while True:
+                    while run.version == seen:
+                        if not self._cond.wait(timeout=LIVENESS_CHECK_SECONDS * POLL_TIME_SCALE):
+                            # Restarts the loop should it have died
+                            self._ensure_loop()
+                    seen = run.version
+
+                    if run.error is not None:
+                        raise run.error
+
+                    state = run.life_cycle_state
+                    if on_state:
+                        on_state(state)
+
+                    if run.finished:
+                        return run.state
+            finally:
+                run.waiters -= 1
+                if run.waiters == 0 and run.finished and not run.watchers:
+                    self._runs.pop(run_id, None)
+
+    def watch(
+        self,
+        run_id: int,
+        on_state: Optional[Callable[[str], None]] = None,
+        on_done: Optional[Callable[[Optional[dict], Optional[Exception]], None]] = None,
+        typical_seconds: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """
+        Like wait(), without blocking: on_state(life_cycle_state) is
+        called on every change and on_done(state, error) once, when the
+        run is terminal or polling it failed. Both run on the polling
+        thread and must return quickly.
+        """
+        self.register(run_id, typical_seconds)
+        with self._cond:
+            run = self._runs[run_id]
+            run.watchers.append((on_state, on_done))
+            finished = run.finished
+        if finished:
+            self._notify([run])
+
+    def ensure_running(self) -> None:
+        """Restarts the polling thread if it is gone while runs are watched."""
+        with self._cond:
+            if self._pending():
+                self._ensure_loop()
+
+    def active_runs(self) -> int:
+        with self._cond:
+            return sum(1 for r in self._runs.values() if not r.finished)
+
+    def _notify(self, changed: List[_TrackedRun]) -> None:
+        for tracked in changed:
+            with self._cond:
+                watchers = list(tracked.watchers)
+                if tracked.finished:
+                    tracked.watchers = []
+                    if tracked.waiters == 0:
+                        self._runs.pop(tracked.run_id, None)
+            for on_state, on_done in watchers:
+                try:
+                    if on_state and tracked.error is None:
+                        on_state(tracked.life_cycle_state)
+                    if on_done and tracked.finished:
+                        on_done(tracked.state, tracked.error)
+                except Exception as e:
+                    print(f"   Run {tracked.run_id} callback failed ({type(e).__name__}): {e}")
+
+    # --------------------------------------------------------
+    # Polling loop
+    # --------------------------------------------------------
+    def _ensure_loop(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._loop,
+                name="run-status-loop",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def _pending(self) -> List[_TrackedRun]:
+        return [r for r in self._runs.values() if not r.finished]
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                pending = self._pending()
+                if not pending:
+                    # Nothing left to watch; register() restarts the loop
+                    self._thread = None
+                    return
+
+                now = time.time()
+                next_due = min(r.next_due for r in pending)
+                if next_due > now:
+                    self._cond.wait(timeout=next_due - now)
+                    continue
+
+            try:
+                JOBS_API.sleep(0)
+                self._refresh(pending)
+            except Exception as e:
+                # Keep the one shared thread alive whatever a refresh hits
+                print(f"   Run status loop error ({type(e).__name__}: {e}), backing off")
+                self._backoff(pending, None)
+
+    def _refresh(self, pending: List[_TrackedRun]) -> None:
+        try:
+            by_id = self._list(pending)
+            missing = [r for r in pending if r.run_id not in by_id]
+            if missing:
+                ids = [r.run_id for r in missing]
+                for tracked, run in zip(missing, self._fanout.map(self._fetch_one, ids)):
+                    if isinstance(run, FatalError):
+                        # e.g. unknown run_id: only that waiter fails
+                        self._fail([tracked], run)
+                    else:
+                        by_id[tracked.run_id] = run
+        except RetryableError as e:
+            if e.status_code == 429:
+                JOBS_API.throttled(e.retry_after)
+            self._backoff(pending, e.retry_after)
+            return
+        except (requests.ConnectionError, requests.Timeout) as e:
+            print(f"   Run status refresh failed ({type(e).__name__}), backing off")
+            self._backoff(pending, None)
+            return
+        except FatalError as e:
+            self._fail(pending, e)
+            return
+        except Exception as e:
+            # e.g. ChunkedEncodingError mid-response; retried, but not forever
+            print(f"   Run status refresh failed ({type(e).__name__}: {e}), backing off")
+            self._unexpected(pending, e)
+            return
+
+        malformed, changed = [], []
+        with self._cond:
+            for tracked in pending:
+                run = by_id.get(tracked.run_id)
+                if run is None or tracked.error is not None:
+                    continue
+                state = run.get("state")
+                if not isinstance(state, dict) or "life_cycle_state" not in state:
+                    malformed.append(tracked)
+                    continue
+                tracked.failures = 0
+                if state.get("life_cycle_state") != tracked.life_cycle_state:
+                    tracked.version += 1
+                    changed.append(tracked)
+                    print(f"   Run {tracked.run_id}: {state.get('life_cycle_state')}")
+                tracked.state = state
+                tracked.next_due = time.time() + tracked.schedule.next_delay(
+                    tracked.life_cycle_state
+                )
+            self._cond.notify_all()
+        self._notify(changed)
+
+        if malformed:
+            self._unexpected(malformed, FatalError("❌ Databricks returned a run without a state"))
+
+    def _list(self, pending: List[_TrackedRun]) -> Dict[int, dict]:
+        # Runs are listed from just before the oldest registration onwards
+        since_ms = int((min(r.registered_at for r in pending) - 600) * 1000)
+        self.api_calls += 1
+        return {run["run_id"]: run for run in self._list_runs(since_ms)}
+
+    def _fetch_one(self, run_id: int):
+        self.api_calls += 1
+        try:
+            return self._get_run(run_id)
+        except FatalError as e:
+            return e
+
+    def _backoff(self, pending: List[_TrackedRun], retry_after: Optional[float]) -> None:
+        with self._cond:
+            for tracked in pending:
+                tracked.next_due = time.time() + tracked.schedule.next_delay(
+                    tracked.life_cycle_state, retry_after
+                )
+
+    def _unexpected(self, pending: List[_TrackedRun], error: Exception) -> None:
+        """Backs off; runs that keep failing get the error."""
+        self._backoff(pending, None)
+        with self._cond:
+            for tracked in pending:
+                tracked.failures += 1
+            failing = [t for t in pending if t.failures >= MAX_REFRESH_FAILURES]
+        if failing:
+            self._fail(failing, error)
+
+    def _fail(self, pending: List[_TrackedRun], error: Exception) -> None:
+        with self._cond:
+            for tracked in pending:
+                tracked.error = error
+                tracked.version += 1
+            self._cond.notify_all()
+        self._notify(pending)
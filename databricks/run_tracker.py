@@ -0,0 +1,617 @@
+import os
+import time
+import uuid
+import threading
+from dataclasses import asdict, dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from databricks.admission import ADMISSION, Ticket
+from databricks.databricks_trigger import (
+    RUN_STATUS,
+    RunSkipped,
+    cancel_run,
+    trigger_job,
+    watch_run,
+    fetch_result,
+    read_progress,
+)
+from databricks.history import record_safely
+from databricks.polling import JOBS_API, POLL_TIME_SCALE, RetryableError
+from databricks.result_cache import RESULT_CACHE, payload_key
+from databricks.schema import payload_tokens
+from databricks.state_store import REPLICA_ID, STATE
+from databricks import telemetry
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+# Workers submit runs and fetch results; no worker is held while a job
+# runs, so this does not cap how many runs are in flight
+TRACKER_MAX_WORKERS = int(os.getenv("TRACKER_MAX_WORKERS", "32"))
+
+# Finished handles are kept this long so reruns can still read them.
+HANDLE_TTL_SECONDS = int(os.getenv("HANDLE_TTL_SECONDS", "3600"))
+
+# Seconds between conditional reads of a running job's progress.json
+PROGRESS_POLL_SECONDS = float(os.getenv("PROGRESS_POLL_SECONDS", "5"))
+
+# A replica polls a run only while it holds the run's lease; it renews
+# every third of this. A run whose replica died is taken over by the
+# next replica asked about it once the lease has expired.
+RUN_LEASE_SECONDS = float(os.getenv("RUN_LEASE_SECONDS", "30"))
+
+# Snapshots of unfinished runs expire from the shared store after this
+RUN_STATE_TTL_SECONDS = int(os.getenv("RUN_STATE_TTL_SECONDS", str(24 * 3600)))
+
+# Submissions the workspace pushes back on (429, 5xx, run skipped at
+# max_concurrent_runs) are retried this many times in all
+SUBMIT_ATTEMPTS = int(os.getenv("SUBMIT_ATTEMPTS", "5"))
+ADMISSION_RETRY_SECONDS = float(os.getenv("ADMISSION_RETRY_SECONDS", "15"))
+
+# Order matters: the UI derives a progress fraction from the index.
+STAGES = ["QUEUED", "SUBMITTING", "RUNNING", "FETCHING_RESULT", "DONE"]
+FINAL_STATES = {"DONE", "FAILED", "CANCELLED"}
+
+
+# ------------------------------------------------------------
+# Run handle
+# ------------------------------------------------------------
+@dataclass
+class RunHandle:
+    """
+    Snapshot of one estimate submission.
+    Returned immediately by submit_estimate and updated in the
+    background while the Databricks run progresses. Every update is
+    also published to the shared state store, where other replicas
+    read it.
+    """
+
+    handle_id: str
+    payload: dict
+    cache_key: str = ""
+    cached: bool = False
+    status: str = "QUEUED"
+    run_id: Optional[int] = None
+    job_state: Optional[str] = None
+    drive_link: Optional[str] = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    # Latest progress.json written by the job, if it writes one
+    partial_result: Optional[dict] = None
+    cancel_requested: bool = False
+    # While QUEUED for an admission slot: 1 = next, and the estimated wait
+    queue_position: Optional[int] = None
+    queue_wait_s: Optional[float] = None
+    # Submission attempt; a run skipped by the workspace is queued again
+    attempt: int = 0
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL_STATES
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at or time.time()
+        return end - self.submitted_at
+
+    @property
+    def progress(self) -> float:
+        if self.status in ("FAILED", "CANCELLED"):
+            return 1.0
+        return STAGES.index(self.status) / (len(STAGES) - 1)
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=TRACKER_MAX_WORKERS,
+    thread_name_prefix="run-tracker",
+)
+_progress_readers = ThreadPoolExecutor(
+    max_workers=TRACKER_MAX_WORKERS,
+    thread_name_prefix="run-progress",
+)
+# Runs this replica is tracking (it holds their lease) or has finished
+_handles: Dict[str, RunHandle] = {}
+# handle_id -> admission ticket of the run's current attempt
+_tickets: Dict[str, Ticket] = {}
+# handle_id -> ETag of the last progress.json read
+_progress_etags: Dict[str, Optional[str]] = {}
+_lock = threading.Lock()
+_lease_thread: Optional[threading.Thread] = None
+_progress_thread: Optional[threading.Thread] = None
+
+
+# ------------------------------------------------------------
+# Shared state
+# Keys: run:{handle_id} snapshot, inflight:{cache_key} -> handle_id,
+# cancel:{handle_id} flag, lease run:{handle_id}.
+# ------------------------------------------------------------
+def _publish(handle: RunHandle) -> None:
+    with _lock:
+        snapshot = asdict(handle)
+    ttl = HANDLE_TTL_SECONDS if handle.done else RUN_STATE_TTL_SECONDS
+    try:
+        STATE.put(f"run:{handle.handle_id}", snapshot, ttl=ttl)
+    except Exception as e:
+        # This replica keeps tracking the run; only other replicas miss the update
+        print(f"   State publish failed ({type(e).__name__}): {e}")
+
+
+def _update(handle: RunHandle, **changes) -> None:
+    with _lock:
+        for key, value in changes.items():
+            setattr(handle, key, value)
+        tracking = _handles.get(handle.handle_id) is handle
+    # A run another replica took over is only published by that replica
+    if tracking:
+        _publish(handle)
+
+
+def _tracking(handle: RunHandle) -> bool:
+    with _lock:
+        return _handles.get(handle.handle_id) is handle
+
+
+def _stop_tracking(handle: RunHandle) -> None:
+    """
+    Another replica holds the run's lease (this one stalled past its
+    expiry): drop the run here so only the owner polls and publishes
+    it. get_run then reads the owner's snapshot.
+    """
+    with _lock:
+        if _handles.get(handle.handle_id) is handle:
+            del _handles[handle.handle_id]
+        ticket = _tickets.pop(handle.handle_id, None)
+    _progress_etags.pop(handle.handle_id, None)
+    if ticket is not None:
+        # Still queued: leave the queue. An admitted run keeps its slot
+        # until its start or finish callback sees it is no longer tracked.
+        ADMISSION.withdraw(ticket)
+
+
+def _cancel_requested(handle: RunHandle) -> bool:
+    """Cancel from this replica, or from another one via the shared flag."""
+    if not handle.cancel_requested and STATE.get(f"cancel:{handle.handle_id}"):
+        _update(handle, cancel_requested=True)
+    return handle.cancel_requested
+
+
+def _inflight_handle(cache_key: str) -> Optional[RunHandle]:
+    entry = STATE.get(f"inflight:{cache_key}")
+    if entry is None:
+        return None
+    running = get_run(entry["handle_id"])
+    if running is None or running.done:
+        # Left behind by a run that ended without clearing it
+        _clear_inflight(cache_key, entry["handle_id"])
+        return None
+    return running
+
+
+def _clear_inflight(cache_key: str, handle_id: str) -> None:
+    entry = STATE.get(f"inflight:{cache_key}")
+    if entry and entry["handle_id"] == handle_id:
+        STATE.delete(f"inflight:{cache_key}")
+
+
+def _ensure_lease_loop() -> None:
+    global _lease_thread
+    with _lock:
+        if _lease_thread is None or not _lease_thread.is_alive():
+            _lease_thread = threading.Thread(target=_renew_leases, name="run-leases", daemon=True)
+            _lease_thread.start()
+
+
+def _renew_leases() -> None:
+    global _lease_thread
+    while True:
+        time.sleep(RUN_LEASE_SECONDS / 3)
+        with _lock:
+            tracked = [h for h in _handles.values() if not h.done]
+            if not tracked:
+                # submit_estimate / a takeover restarts the loop
+                _lease_thread = None
+                return
+        for handle in tracked:
+            try:
+                if not STATE.acquire_lease(f"run:{handle.handle_id}", REPLICA_ID, RUN_LEASE_SECONDS):
+                    print(f"⚠️ Run {handle.handle_id} was taken over by another replica; no longer tracking it")
+                    _stop_tracking(handle)
+                    continue
+                # Shows a cancel from another replica while the run is
+                # queued or waited on
+                if _cancel_requested(handle):
+                    _withdraw(handle)
+            except Exception as e:
+                print(f"   Lease renewal failed ({type(e).__name__}): {e}")
+        try:
+            ADMISSION.renew()
+        except Exception as e:
+            print(f"   Slot renewal failed ({type(e).__name__}): {e}")
+        # Watched runs rely on the shared status thread being up
+        RUN_STATUS.ensure_running()
+
+
+def _prune_finished() -> None:
+    cutoff = time.time() - HANDLE_TTL_SECONDS
+    expired = [
+        handle_id for handle_id, h in _handles.items()
+        if h.done and h.finished_at < cutoff
+    ]
+    for handle_id in expired:
+        del _handles[handle_id]
+
+
+# ------------------------------------------------------------
+# Background worker
+# ------------------------------------------------------------
+def _track(handle: RunHandle, ticket: Optional[Ticket] = None) -> None:
+    with telemetry.trace(handle.handle_id):
+        _start(handle, ticket)
+
+
+def _queue(handle: RunHandle) -> None:
+    """
+    Queues the run for an admission slot. No worker is held while it
+    waits; the dispatcher starts _track on the executor once admitted.
+    """
+    if not _tracking(handle):
+        return
+    if _cancel_requested(handle):
+        _end(handle, RuntimeError("Cancelled before submission"))
+        return
+
+    # The dispatcher can admit the ticket as soon as it is queued; holding
+    # _lock until it is registered keeps _finish / _withdraw (which take
+    # _lock) from running before it is known
+    with _lock:
+        _tickets[handle.handle_id] = ADMISSION.enqueue(
+            handle.handle_id,
+            handle.payload.get("client_name") or "",
+            payload_tokens(handle.payload),
+            on_admit=lambda ticket: _executor.submit(_track, handle, ticket),
+            on_update=lambda position, wait_s: _update(
+                handle, queue_position=position, queue_wait_s=round(wait_s)
+            ),
+        )
+
+
+def _withdraw(handle: RunHandle) -> None:
+    """Ends a cancelled run that is still waiting for a slot."""
+    with _lock:
+        ticket = _tickets.get(handle.handle_id)
+    if ticket is not None and ADMISSION.withdraw(ticket):
+        _end(handle, RuntimeError("Cancelled before submission"))
+
+
+def _ensure_progress_loop() -> None:
+    global _progress_thread
+    with _lock:
+        if _progress_thread is None or not _progress_thread.is_alive():
+            _progress_thread = threading.Thread(target=_tail_progress, name="run-progress", daemon=True)
+            _progress_thread.start()
+
+
+def _tail_progress() -> None:
+    """
+    One loop re-reads progress.json of every RUNNING job this replica
+    tracks, fanned out over _progress_readers. Reads are conditional on
+    the last ETag, so an unchanged object costs a 304.
+    """
+    global _progress_thread
+    while True:
+        time.sleep(PROGRESS_POLL_SECONDS * POLL_TIME_SCALE)
+        with _lock:
+            tracked = [h for h in _handles.values() if not h.done]
+            if not tracked:
+                # _watch restarts the loop
+                _progress_thread = None
+                return
+            running = [h for h in tracked if h.status == "RUNNING" and h.job_state == "RUNNING"]
+        list(_progress_readers.map(_read_progress, running))
+
+
+def _read_progress(handle: RunHandle) -> None:
+    try:
+        etag, progress = read_progress(handle.payload, _progress_etags.get(handle.handle_id))
+    except Exception as e:
+        # Progress is best effort; the run itself is unaffected
+        print(f"   Progress read failed ({type(e).__name__}): {e}")
+        return
+    _progress_etags[handle.handle_id] = etag
+    if progress is not None:
+        _update(handle, partial_result=progress)
+
+
+def _submit(handle: RunHandle, attempt: int) -> int:
+    """
+    trigger_job, retried on 429 / 5xx. A 429 also narrows admission so
+    fewer runs are started while the workspace is rate limiting.
+    """
+    _update(handle, status="SUBMITTING", job_state=None)
+    for retry in range(SUBMIT_ATTEMPTS):
+        try:
+            # A run taken over while SUBMITTING is submitted again; the
+            # idempotency token returns the run the first replica started
+            run_id = trigger_job(handle.payload, attempt=attempt)
+            break
+        except RetryableError as e:
+            if retry == SUBMIT_ATTEMPTS - 1:
+                raise
+            if e.status_code == 429:
+                JOBS_API.throttled(e.retry_after)
+                ADMISSION.throttle(e.retry_after)
+            JOBS_API.sleep((e.retry_after or 2 ** (retry + 1)) * POLL_TIME_SCALE)
+
+    _update(handle, status="RUNNING", run_id=run_id)
+    record_safely(handle)
+    # Cancelled while run-now was in flight
+    if _cancel_requested(handle):
+        cancel_run(run_id)
+    return run_id
+
+
+def _start(handle: RunHandle, ticket: Optional[Ticket]) -> None:
+    """
+    Submits an admitted run and hands it to RUN_STATUS. The worker
+    returns straight away; _finish runs on a worker again once the run
+    terminates, so no thread is held while the job runs.
+    """
+    if ticket is not None and not _tracking(handle):
+        ADMISSION.release(ticket)
+        return
+
+    try:
+        if ticket is None:
+            # Taken over from another replica after the run was started; it
+            # is already on the workspace, so it does not queue for a slot
+            run_id = handle.run_id
+        else:
+            telemetry.record("admission", ticket.admitted_at - ticket.enqueued_at)
+            telemetry.record("queue", time.time() - ticket.admitted_at)
+            _update(handle, queue_position=None, queue_wait_s=None)
+            if _cancel_requested(handle):
+                raise RuntimeError("Cancelled before submission")
+            run_id = _submit(handle, handle.attempt)
+        _watch(handle, run_id, ticket)
+    except Exception as e:
+        if ticket is not None:
+            ADMISSION.release(ticket)
+        _end(handle, e)
+
+
+def _watch(handle: RunHandle, run_id: int, ticket: Optional[Ticket]) -> None:
+    _ensure_progress_loop()
+    watch_run(
+        run_id,
+        on_state=lambda state: _update(handle, job_state=state),
+        on_done=lambda error: _executor.submit(_finish, handle, run_id, ticket, error),
+    )
+
+
+def _finish(
+    handle: RunHandle,
+    run_id: int,
+    ticket: Optional[Ticket],
+    error: Optional[Exception],
+) -> None:
+    with telemetry.trace(handle.handle_id):
+        if ticket is not None:
+            # The run is over; its slot is free while the result is read
+            ADMISSION.release(ticket)
+        if not _tracking(handle):
+            # Taken over meanwhile; the owning replica finishes it
+            return
+
+        if (
+            isinstance(error, RunSkipped)
+            and handle.attempt < SUBMIT_ATTEMPTS - 1
+            and not _cancel_requested(handle)
+        ):
+            _requeue(handle)
+            return
+
+        try:
+            if error is not None:
+                raise error
+            _complete(handle, run_id)
+        except Exception as e:
+            _end(handle, e)
+
+
+def _requeue(handle: RunHandle) -> None:
+    """
+    The job was at max_concurrent_runs (too high a cap, or runs started
+    outside this app): narrow admission and queue the run again after a
+    pause; a new attempt gets a new run.
+    """
+    ADMISSION.throttle()
+    _update(handle, status="QUEUED", run_id=None, job_state=None, attempt=handle.attempt + 1)
+    retry = threading.Timer(ADMISSION_RETRY_SECONDS * POLL_TIME_SCALE, _queue, (handle,))
+    retry.daemon = True
+    retry.start()
+
+
+def _complete(handle: RunHandle, run_id: int) -> None:
+    _update(handle, status="FETCHING_RESULT")
+    drive_link = fetch_result(handle.payload, run_id)
+
+    _update(
+        handle,
+        status="DONE",
+        drive_link=drive_link,
+        finished_at=time.time(),
+    )
+    telemetry.record("total", handle.elapsed)
+    record_safely(handle, telemetry.trace_stages(handle.handle_id))
+    RESULT_CACHE.put(
+        handle.cache_key,
+        drive_link,
+        {"run_id": handle.run_id, "duration_s": round(handle.elapsed, 1)},
+    )
+    print(f"🎉 Run {handle.handle_id} finished: {drive_link}")
+    _release_run(handle)
+
+
+def _end(handle: RunHandle, error: Exception) -> None:
+    """Marks the run FAILED (or CANCELLED) and lets go of it."""
+    with telemetry.trace(handle.handle_id):
+        cancelled = _cancel_requested(handle)
+        _update(
+            handle,
+            status="CANCELLED" if cancelled else "FAILED",
+            error="Cancelled by user" if cancelled else str(error),
+            queue_position=None,
+            queue_wait_s=None,
+            finished_at=time.time(),
+        )
+        telemetry.record("total", handle.elapsed, status="error", error=type(error).__name__)
+        record_safely(handle, telemetry.trace_stages(handle.handle_id))
+    if cancelled:
+        print(f"🛑 Run {handle.handle_id} cancelled")
+    else:
+        print(f"❌ Run {handle.handle_id} failed ({type(error).__name__}): {error}")
+    _release_run(handle)
+
+
+def _release_run(handle: RunHandle) -> None:
+    with _lock:
+        _tickets.pop(handle.handle_id, None)
+    _progress_etags.pop(handle.handle_id, None)
+    _clear_inflight(handle.cache_key, handle.handle_id)
+    STATE.release_lease(f"run:{handle.handle_id}", REPLICA_ID)
+
+
+# ------------------------------------------------------------
+# Public API
+# ------------------------------------------------------------
+def submit_estimate(payload: dict, force_recompute: bool = False) -> RunHandle:
+    """
+    Queues the payload for execution and returns straight away.
+    Poll get_run(handle.handle_id) for progress.
+
+    An identical (normalized) payload that already has a cached result
+    returns a finished handle without touching Databricks, unless
+    force_recompute is set. An identical payload that is still running
+    (another session, or a double click) returns that run's handle, so
+    only one job is triggered and every caller shares its result.
+
+    Each run writes its output under its own result_path
+    ({client}/{use_case}/{handle_id}), so concurrent runs for the same
+    client and use case cannot overwrite or read each other's result.json.
+    """
+    cache_key = payload_key(payload)
+
+    running = _inflight_handle(cache_key)
+    if running is not None:
+        print(f"🔗 Attached to in-flight run {running.handle_id} for {cache_key[:12]}")
+        return running
+
+    handle_id = uuid.uuid4().hex
+    handle = RunHandle(
+        handle_id=handle_id,
+        payload=dict(
+            payload,
+            result_path=f"{payload['client_name']}/{payload['use_case_name']}/{handle_id}",
+        ),
+        cache_key=cache_key,
+    )
+
+    hit = None if force_recompute else RESULT_CACHE.get(cache_key)
+    if hit:
+        print(f"⚡ Cache hit for {cache_key[:12]}")
+        handle.cached = True
+        handle.status = "DONE"
+        handle.drive_link = hit["drive_link"]
+        handle.run_id = hit["metadata"].get("run_id")
+        handle.finished_at = time.time()
+    else:
+        # Snapshot and lease exist before the run is claimed, so whoever
+        # finds the claim can read the run and does not take it over
+        _publish(handle)
+        STATE.acquire_lease(f"run:{handle_id}", REPLICA_ID, RUN_LEASE_SECONDS)
+
+        # Lost a race with an identical submission (any replica): share its run
+        while not STATE.put_if_absent(
+            f"inflight:{cache_key}", {"handle_id": handle_id}, ttl=RUN_STATE_TTL_SECONDS
+        ):
+            running = _inflight_handle(cache_key)
+            if running is not None:
+                STATE.release_lease(f"run:{handle_id}", REPLICA_ID)
+                STATE.delete(f"run:{handle_id}")
+                return running
+
+    with _lock:
+        _prune_finished()
+        _handles[handle.handle_id] = handle
+
+    _publish(handle)
+    record_safely(handle)
+    if not hit:
+        _queue(handle)
+        _ensure_lease_loop()
+    return handle
+
+
+def cancel_estimate(handle_id: str) -> bool:
+    """
+    Stops a queued or running estimate (jobs/runs/cancel once it has a
+    run_id). Sessions attached to the same run, on any replica, see it
+    cancelled too. Returns False when there is nothing left to cancel.
+    """
+    handle = get_run(handle_id)
+    if handle is None or handle.done or handle.cancel_requested:
+        return False
+
+    # The replica tracking the run picks the flag up before it submits
+    # and when its wait ends
+    STATE.put(f"cancel:{handle_id}", {"at": time.time()}, ttl=RUN_STATE_TTL_SECONDS)
+    with _lock:
+        local = _handles.get(handle_id) is handle
+    if local:
+        _update(handle, cancel_requested=True)
+        _withdraw(handle)
+    else:
+        handle.cancel_requested = True
+    if handle.run_id is not None:
+        cancel_run(handle.run_id)
+    return True
+
+
+def get_run(handle_id: str) -> Optional[RunHandle]:
+    """
+    The live handle when this replica tracks the run, otherwise the
+    latest snapshot from the shared store. An unfinished run whose
+    lease has expired (its replica went away) is taken over here.
+    """
+    with _lock:
+        handle = _handles.get(handle_id)
+    if handle is not None:
+        return handle
+
+    snapshot = STATE.get(f"run:{handle_id}")
+    if snapshot is None:
+        return None
+    handle = RunHandle(**snapshot)
+
+    if not handle.done and STATE.acquire_lease(f"run:{handle_id}", REPLICA_ID, RUN_LEASE_SECONDS):
+        with _lock:
+            # Another thread of this replica took it over first
+            if handle_id in _handles:
+                return _handles[handle_id]
+            _handles[handle_id] = handle
+        print(f"🔁 Taking over run {handle_id} (run_id = {handle.run_id})")
+        if handle.run_id is None:
+            _queue(handle)
+        else:
+            _executor.submit(_track, handle)
+        _ensure_lease_loop()
+    return handle
+
+
+def active_runs() -> int:
+    with _lock:
+        return sum(1 for h in _handles.values() if not h.done)
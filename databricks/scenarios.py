@@ -0,0 +1,222 @@
+import itertools
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from databricks import cost_engine
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+# Scenarios evaluated per NumPy batch; bounds peak memory for big grids
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "256"))
+MAX_SCENARIOS = int(os.getenv("MAX_SCENARIOS", "20000"))
+
+# Axis names:
+#   "budget"
+#   "<market>.multiplier" / "<market>.start_month"    e.g. "M3.start_month"
+#   "<use_case>.<numeric field>"                      e.g. "ml.inference_requests_per_day"
+COMMON_WORKLOAD_AXES = [
+    "data_migration.daily_incremental_gb",
+    "ml.inference_requests_per_day",
+    "llm.requests_per_day",
+]
+
+
+def axis_options(markets: List[dict], stores: Dict[str, dict]) -> List[str]:
+    """Budget, market and workload axes; workload axes only for selected use cases."""
+    options = ["budget"]
+    for m in markets:
+        options += [f"{m['market']}.multiplier", f"{m['market']}.start_month"]
+    return options + [a for a in COMMON_WORKLOAD_AXES if a.partition(".")[0] in stores]
+
+
+def parse_values(text: str) -> List[float]:
+    """'1, 1.2, 1.4' or an inclusive range 'start:stop:step' -> sorted unique floats."""
+    text = text.strip()
+    if ":" in text:
+        start, stop, step = (float(p) for p in text.split(":"))
+        if step <= 0:
+            raise ValueError("range step must be positive")
+        values = np.arange(start, stop + step / 2, step)
+    else:
+        values = [float(v) for v in text.replace(";", ",").split(",") if v.strip()]
+    if not len(values):
+        raise ValueError("no values given")
+    return sorted(set(float(round(v, 10)) for v in values))
+
+
+# ------------------------------------------------------------
+# Result
+# ------------------------------------------------------------
+@dataclass
+class SweepResult:
+    axes: List[str]
+    axis_values: List[List[float]]
+    scenarios: np.ndarray   # (S, axes) input values, grid order (last axis fastest)
+    annual: np.ndarray      # (S, clouds)
+    budget: np.ndarray      # (S,)
+
+    @property
+    def breach(self) -> np.ndarray:          # (S, clouds)
+        return (self.budget[:, None] > 0) & (self.annual > self.budget[:, None])
+
+    def grid(self, values: np.ndarray) -> np.ndarray:
+        """(S, ...) -> (n_axis_0, ..., n_axis_k, ...)"""
+        return values.reshape([len(v) for v in self.axis_values] + list(values.shape[1:]))
+
+    @staticmethod
+    def frontier_direction(axis: str) -> str:
+        """
+        "min" for axes where a larger value lowers cost or raises the
+        limit (budget, a later start_month), "max" where it adds cost
+        (multipliers, workload volumes).
+        """
+        return "min" if axis == "budget" or axis.endswith(".start_month") else "max"
+
+    def frontier(self, cloud: str, axis: str) -> np.ndarray:
+        """
+        Budget-breach frontier: for every combination of the other axes,
+        the value of `axis` closest to the breach that still stays within
+        budget on `cloud` - the largest for cost-increasing axes, the
+        smallest budget or earliest start_month (see frontier_direction).
+        NaN when no value of the axis stays within budget.
+        Shape: the grid without `axis`.
+        """
+        k = self.axes.index(axis)
+        c = cost_engine.CLOUDS.index(cloud)
+
+        within = ~self.breach[:, c]
+        if axis == "budget":
+            # A zero budget means no budget, not one that the estimate meets
+            within = within & (self.budget > 0)
+        within = np.moveaxis(self.grid(within), k, -1)
+        values = np.asarray(self.axis_values[k])
+
+        if self.frontier_direction(axis) == "min":
+            # First index along the axis that is within budget
+            index = np.argmax(within, axis=-1)
+        else:
+            # Last index along the axis that is within budget
+            index = within.shape[-1] - 1 - np.argmax(within[..., ::-1], axis=-1)
+        return np.where(within.any(axis=-1), values[index], np.nan)
+
+    def frontier_records(self, cloud: str, axis: str) -> List[dict]:
+        """frontier() flattened to one row per combination of the other axes."""
+        k = self.axes.index(axis)
+        others = [a for i, a in enumerate(self.axes) if i != k]
+        other_values = [v for i, v in enumerate(self.axis_values) if i != k]
+        column = f"{self.frontier_direction(axis)} {axis} within budget"
+
+        rows = []
+        for combo, limit in zip(itertools.product(*other_values), self.frontier(cloud, axis).ravel()):
+            row = dict(zip(others, combo))
+            row[column] = None if np.isnan(limit) else float(limit)
+            rows.append(row)
+        return rows
+
+    def records(self) -> List[dict]:
+        rows = []
+        breach = self.breach
+        for s in range(len(self.scenarios)):
+            row = dict(zip(self.axes, self.scenarios[s].tolist()))
+            for c, cloud in enumerate(cost_engine.CLOUDS):
+                row[cloud] = float(self.annual[s, c])
+                row[f"{cloud} over budget"] = bool(breach[s, c])
+            rows.append(row)
+        return rows
+
+
+# ------------------------------------------------------------
+# Sweep
+# ------------------------------------------------------------
+def _apply_axes(stores, multipliers, start_months, budget, markets, axes, columns):
+    """Overlays one batch of axis values (columns[i] has shape (B,))."""
+    batch = len(columns[0])
+    stores = {name: dict(store or {}) for name, store in stores.items()}
+    multipliers = np.tile(multipliers, (batch, 1))
+    start_months = np.tile(start_months, (batch, 1))
+    budget = np.full(batch, float(budget or 0))
+    market_index = {m["market"]: i for i, m in enumerate(markets)}
+
+    for axis, values in zip(axes, columns):
+        scope, _, field = axis.partition(".")
+        if axis == "budget":
+            budget = values
+        elif scope in market_index and field == "multiplier":
+            multipliers[:, market_index[scope]] = values
+        elif scope in market_index and field == "start_month":
+            start_months[:, market_index[scope]] = values
+        elif scope in cost_engine.USE_CASES and field:
+            # Sweeping an unselected use case would price a phantom workload
+            if scope not in stores:
+                raise ValueError(f"Sweep axis {axis} needs the {scope} use case selected")
+            stores[scope][field] = values
+        else:
+            raise ValueError(f"Unknown sweep axis: {axis}")
+
+    return stores, multipliers, start_months, budget
+
+
+def sweep(
+    stores: Dict[str, dict],
+    markets: List[dict],
+    annual_budget: Optional[float],
+    axes: Dict[str, Sequence[float]],
+    months: int = 12,
+) -> SweepResult:
+    """
+    Evaluates every combination of the axis values in vectorized batches
+    with the local cost engine. Non-swept inputs keep their sidebar values.
+    """
+    names = list(axes)
+    values = [sorted(float(v) for v in axes[name]) for name in names]
+    total = int(np.prod([len(v) for v in values])) if values else 0
+    if total == 0:
+        raise ValueError("Select at least one axis with values")
+    if total > MAX_SCENARIOS:
+        raise ValueError(f"{total} scenarios exceeds MAX_SCENARIOS={MAX_SCENARIOS}")
+
+    market_axes = [n for n in names if n.partition(".")[0] not in ("budget", *cost_engine.USE_CASES)]
+    if market_axes and not markets:
+        raise ValueError("Market axes need at least one configured market")
+
+    base_multipliers, base_starts = cost_engine.market_arrays(markets)
+    scenarios = np.array(list(itertools.product(*values)))   # (S, A), last axis fastest
+
+    # Prices and cloud selection do not depend on swept numeric fields
+    mask = cost_engine.cloud_mask(stores)
+    rates = cost_engine.unit_rates(stores)
+
+    annual = np.empty((total, len(cost_engine.CLOUDS)))
+    budget = np.empty(total)
+
+    for start in range(0, total, SWEEP_BATCH_SIZE):
+        chunk = scenarios[start:start + SWEEP_BATCH_SIZE]
+        batch_stores, multipliers, start_months, batch_budget = _apply_axes(
+            stores, base_multipliers, base_starts, annual_budget,
+            markets, names, [chunk[:, a] for a in range(len(names))]
+        )
+
+        quantities = cost_engine.usage(batch_stores, multipliers, start_months, months)
+        # Sum over markets and months before pricing: (B, U, R)
+        yearly = quantities.sum(axis=(-3, -2))
+        annual[start:start + len(chunk)] = np.einsum(
+            "bur,uc,cr->bc",
+            yearly,
+            mask,
+            rates,
+        )
+        budget[start:start + len(chunk)] = batch_budget
+
+    return SweepResult(
+        axes=names,
+        axis_values=values,
+        scenarios=scenarios,
+        annual=annual,
+        budget=budget,
+    )
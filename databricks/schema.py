@@ -0,0 +1,236 @@
+import json
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional
+
+from databricks.pdf_extract import estimate_tokens
+
+
+SCHEMA_VERSION = 1
+
+CLOUD_OPTIONS = ["Databricks", "AWS", "Azure"]
+
+
+class SchemaError(ValueError):
+    """Invalid estimate inputs. `problems` lists every failed check."""
+
+    def __init__(self, problems: List[str]):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+def _choice(default: str, choices: List[str]):
+    return field(default=default, metadata={"choices": choices})
+
+
+def _clouds():
+    return field(default_factory=list, metadata={"choices": CLOUD_OPTIONS})
+
+
+# ------------------------------------------------------------
+# Use case blocks
+# ------------------------------------------------------------
+@dataclass
+class DataMigrationInputs:
+    cloud_type: List[str] = _clouds()
+    migration_type: str = _choice(
+        "One-time Historical Load",
+        ["One-time Historical Load", "Ongoing Incremental", "Both"]
+    )
+    pipeline_mode: str = _choice("Batch", ["Batch", "Streaming"])
+    historical_data_gb: float = 0
+    daily_incremental_gb: float = 0
+    pipelines: int = 0
+    runs_per_day: int = 0
+    avg_runtime_hours: float = 0
+    source_systems: int = 0
+    destination_systems: int = 0
+    transformation_complexity: str = _choice(
+        "Low (Copy)",
+        ["Low (Copy)", "Medium (Joins)", "High (Aggregations / Enrichment)"]
+    )
+    concurrent_pipelines: int = 0
+    storage_retention_days: int = 0
+
+
+@dataclass
+class MLInputs:
+    cloud_type: List[str] = _clouds()
+    workload_types: List[str] = field(
+        default_factory=list,
+        metadata={"choices": ["Training", "Batch Inference", "Real-time Inference"]}
+    )
+    training_data_gb: float = 0
+    training_frequency: str = _choice("Daily", ["Daily", "Weekly", "Monthly", "On Demand"])
+    avg_training_hours: float = 0
+    models_count: int = 0
+    inference_requests_per_day: int = 0
+    peak_concurrency: int = 0
+    use_gpu: str = _choice("No", ["No", "Yes"])
+    gpu_hours_per_day: float = 0
+    model_retention_days: int = 0
+
+
+@dataclass
+class ReportingInputs:
+    cloud_type: List[str] = _clouds()
+    tool: str = _choice("Power BI", ["Power BI", "Tableau"])
+    user_type: str = _choice("Viewer", ["Viewer", "Pro", "Premium"])
+    number_of_users: int = 0
+
+
+@dataclass
+class LLMInputs:
+    cloud_type: List[str] = _clouds()
+    llm_category: str = _choice(
+        "Generative AI",
+        [
+            "Generative AI",
+            "Embedding / Vector Search",
+            "Fine-tuning",
+            "RAG (Retrieval Augmented Generation)"
+        ]
+    )
+    llm_model: str = _choice("GPT-4.1", ["GPT-4.1", "GPT-4o", "GPT-4.0"])
+    requests_per_day: int = 0
+
+
+# Payload key -> schema (keys match the cost engine's store names)
+USE_CASE_SCHEMAS = {
+    "data_migration": DataMigrationInputs,
+    "ml": MLInputs,
+    "reporting": ReportingInputs,
+    "llm": LLMInputs,
+}
+
+
+@dataclass
+class Market:
+    market: str
+    multiplier: float = 0
+    start_month: int = 1
+
+
+# ------------------------------------------------------------
+# Validation
+# ------------------------------------------------------------
+def _check(obj, prefix: str) -> List[str]:
+    problems = []
+
+    for f in fields(obj):
+        value = getattr(obj, f.name)
+        name = f"{prefix}.{f.name}"
+        choices = f.metadata.get("choices")
+
+        if f.type in (int, float):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                problems.append(f"{name} must be a number")
+            elif value < 0:
+                problems.append(f"{name} must not be negative")
+            elif f.type is int and value != int(value):
+                problems.append(f"{name} must be a whole number")
+        elif f.type is str:
+            if choices and value not in choices:
+                problems.append(f"{name} must be one of {choices}")
+        elif f.type == List[str]:
+            if not isinstance(value, list):
+                problems.append(f"{name} must be a list")
+            elif choices:
+                unknown = [v for v in value if v not in choices]
+                if unknown:
+                    problems.append(f"{name} has unknown values {unknown}")
+
+    return problems
+
+
+def parse_use_case(name: str, values: dict):
+    schema = USE_CASE_SCHEMAS.get(name)
+    if schema is None:
+        raise SchemaError([f"unknown use case '{name}'"])
+
+    known = {f.name for f in fields(schema)}
+    unknown = sorted(set(values) - known)
+    if unknown:
+        raise SchemaError([f"{name}: unknown fields {unknown}"])
+
+    block = schema(**values)
+    problems = _check(block, name)
+    if problems:
+        raise SchemaError(problems)
+    return block
+
+
+def parse_markets(markets: List[dict]) -> List[Market]:
+    parsed, problems = [], []
+    for i, m in enumerate(markets or []):
+        market = Market(
+            market=str(m.get("market") or f"M{i + 1}"),
+            multiplier=m.get("multiplier", 0),
+            start_month=m.get("start_month", 1),
+        )
+        problems += _check(market, f"markets[{i}]")
+        if isinstance(market.start_month, int) and not 1 <= market.start_month <= 12:
+            problems.append(f"markets[{i}].start_month must be between 1 and 12")
+        parsed.append(market)
+
+    if problems:
+        raise SchemaError(problems)
+    return parsed
+
+
+# ------------------------------------------------------------
+# Compact, canonical serialization
+# ------------------------------------------------------------
+def _is_empty(value) -> bool:
+    return value is None or value == "" or value == [] or value == 0
+
+
+def _clean_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def compact(block) -> Optional[dict]:
+    """
+    Drops zero / empty fields. A block with no numbers and no selections
+    (a use case the analyst never filled in) compacts to None.
+    Choice fields are kept so the reader never has to know UI defaults.
+    """
+    out = {}
+    has_input = False
+
+    for f in fields(block):
+        value = getattr(block, f.name)
+        if _is_empty(value):
+            continue
+        if f.type is not str:
+            has_input = True
+        out[f.name] = sorted(value) if isinstance(value, list) else _clean_number(value)
+
+    return out if has_input else None
+
+
+def compact_use_cases(use_cases: Dict[str, dict]) -> Dict[str, dict]:
+    """Validates every block and keeps only the ones with inputs."""
+    result, problems = {}, []
+    for name, values in (use_cases or {}).items():
+        try:
+            block = compact(parse_use_case(name, values or {}))
+        except SchemaError as e:
+            problems += e.problems
+            continue
+        if block:
+            result[name] = block
+
+    if problems:
+        raise SchemaError(problems)
+    return result
+
+
+def canonical_json(obj) -> str:
+    """Deterministic, whitespace-free JSON: same inputs, same bytes."""
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def payload_tokens(payload: dict) -> int:
+    return estimate_tokens(canonical_json(payload))
@@ -0,0 +1,225 @@
+import json
+import os
+from abc import ABC, abstractmethod
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+# sqlite: one node (all processes share the file) | redis: several replicas
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite").lower()
+STATE_STORE_PATH = os.getenv("STATE_STORE_PATH", ".cache/state.sqlite3")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "finops:")
+
+# Identifies this app process as a lease owner
+REPLICA_ID = os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+# ------------------------------------------------------------
+# Interface
+# ------------------------------------------------------------
+class StateStore(ABC):
+    """
+    JSON values by key, with optional expiry, plus leases.
+
+    A lease is held by one owner at a time until it expires; the owner
+    renews it by acquiring it again. `distributed` is True when the
+    store is shared between machines (not only between processes).
+    """
+
+    distributed = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, value: dict, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def put_if_absent(self, key: str, value: dict, ttl: Optional[float] = None) -> bool:
+        """Atomically stores value unless the key exists; True when stored."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Takes or renews the lease; False while another owner holds it."""
+
+    @abstractmethod
+    def release_lease(self, name: str, owner: str) -> None:
+        ...
+
+
+# ------------------------------------------------------------
+# SQLite (single node)
+# ------------------------------------------------------------
+class SQLiteStateStore(StateStore):
+    # Expired rows are purged every this many writes
+    PURGE_EVERY = 200
+
+    def __init__(self, path: str = STATE_STORE_PATH):
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Every statement commits on its own; each is atomic across processes
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                owner TEXT,
+                expires_at REAL
+            )
+            """
+        )
+
+    @staticmethod
+    def _expires(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl is not None else None
+
+    def _write(self, sql: str, params: tuple) -> int:
+        with self._lock:
+            changed = self._db.execute(sql, params).rowcount
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM state WHERE expires_at < ?", (time.time(),))
+        return changed
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: dict, ttl: Optional[float] = None) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO state (key, value, owner, expires_at) VALUES (?, ?, NULL, ?)",
+            (key, json.dumps(value, default=str), self._expires(ttl))
+        )
+
+    def put_if_absent(self, key: str, value: dict, ttl: Optional[float] = None) -> bool:
+        # An expired row counts as absent
+        return self._write(
+            """
+            INSERT INTO state (key, value, owner, expires_at) VALUES (?, ?, NULL, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value,
+                expires_at = excluded.expires_at
+            WHERE state.expires_at < ?
+            """,
+            (key, json.dumps(value, default=str), self._expires(ttl), time.time())
+        ) > 0
+
+    def delete(self, key: str) -> None:
+        self._write("DELETE FROM state WHERE key = ?", (key,))
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return self._write(
+            """
+            INSERT INTO state (key, value, owner, expires_at) VALUES (?, '{}', ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                owner = excluded.owner,
+                expires_at = excluded.expires_at
+            WHERE state.owner = excluded.owner OR state.expires_at < ?
+            """,
+            (f"lease:{name}", owner, self._expires(ttl), time.time())
+        ) > 0
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self._write("DELETE FROM state WHERE key = ? AND owner = ?", (f"lease:{name}", owner))
+
+
+# ------------------------------------------------------------
+# Redis (several replicas)
+# ------------------------------------------------------------
+class RedisStateStore(StateStore):
+    """
+    Works with any client exposing redis-py's get / set(nx, px) /
+    delete / pexpire, e.g. redis.Redis or a local stand-in.
+    """
+
+    distributed = True
+
+    def __init__(self, client, prefix: str = STATE_KEY_PREFIX):
+        self._redis = client
+        self._prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str = REDIS_URL) -> "RedisStateStore":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("STATE_BACKEND=redis needs the `redis` package") from e
+        return cls(redis.Redis.from_url(url, socket_timeout=5))
+
+    @staticmethod
+    def _ms(ttl: Optional[float]) -> Optional[int]:
+        return max(1, int(ttl * 1000)) if ttl is not None else None
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self._redis.get(self._prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def put(self, key: str, value: dict, ttl: Optional[float] = None) -> None:
+        self._redis.set(self._prefix + key, json.dumps(value, default=str), px=self._ms(ttl))
+
+    def put_if_absent(self, key: str, value: dict, ttl: Optional[float] = None) -> bool:
+        return bool(self._redis.set(
+            self._prefix + key, json.dumps(value, default=str), px=self._ms(ttl), nx=True
+        ))
+
+    def delete(self, key: str) -> None:
+        self._redis.delete(self._prefix + key)
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        key = f"{self._prefix}lease:{name}"
+        if self._redis.set(key, owner, px=self._ms(ttl), nx=True):
+            return True
+        # Renewal. Not atomic with the check: a lease that expires in
+        # between can be extended for its new owner, which at worst has
+        # two replicas poll the same run for one ttl.
+        current = self._redis.get(key)
+        if current is not None and _text(current) == owner:
+            self._redis.pexpire(key, self._ms(ttl))
+            return True
+        return False
+
+    def release_lease(self, name: str, owner: str) -> None:
+        key = f"{self._prefix}lease:{name}"
+        current = self._redis.get(key)
+        if current is not None and _text(current) == owner:
+            self._redis.delete(key)
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _from_env() -> StateStore:
+    if STATE_BACKEND == "redis":
+        return RedisStateStore.from_url(REDIS_URL)
+    if STATE_BACKEND != "sqlite":
+        raise RuntimeError(f"Unknown STATE_BACKEND: {STATE_BACKEND}")
+    return SQLiteStateStore(STATE_STORE_PATH)
+
+
+STATE = _from_env()
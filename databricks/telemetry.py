@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+# One JSON object per finished span; empty string disables the log
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", ".cache/traces.jsonl")
+
+# Past this size the log is rotated to <path>.1 (one old file kept); 0 = no limit
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+
+# Traces kept in memory for the in-app timing panel
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "20"))
+
+# Serve Prometheus text format on this port when set
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Loopback only by default; set 0.0.0.0 to let a remote scraper in
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Seconds; covers a fast cache-backed upload up to a cold-cluster job run
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+
+
+# ------------------------------------------------------------
+# Histograms
+# ------------------------------------------------------------
+class Histogram:
+    """Minimal Prometheus-style histogram with one label."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        # label value -> (bucket counts, sum, count)
+        self._series: Dict[str, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        with self._lock:
+            counts, total, n = self._series.get(
+                label_value, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[label_value] = (counts, total + value, n + 1)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for value in sorted(self._series):
+                counts, total, n = self._series[value]
+                label = f'{self.label}="{value}"'
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {n}')
+                lines.append(f"{self.name}_sum{{{label}}} {total:.6f}")
+                lines.append(f"{self.name}_count{{{label}}} {n}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "estimate_stage_seconds",
+    "Duration of each estimate pipeline stage.",
+    label="stage",
+)
+_stage_errors = {}
+_errors_lock = threading.Lock()
+
+
+def prometheus_text() -> str:
+    lines = STAGE_SECONDS.render()
+    lines += [
+        "# HELP estimate_stage_errors_total Stages that ended with an exception.",
+        "# TYPE estimate_stage_errors_total counter",
+    ]
+    with _errors_lock:
+        for stage in sorted(_stage_errors):
+            lines.append(f'estimate_stage_errors_total{{stage="{stage}"}} {_stage_errors[stage]}')
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------------
+# Traces
+# ------------------------------------------------------------
+_current_trace: ContextVar[Optional[str]] = ContextVar("current_trace", default=None)
+
+# trace_id -> {"trace_id", "kind", "started_at", "spans": [...]}
+_recent: "OrderedDict[str, dict]" = OrderedDict()
+_recent_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+@contextmanager
+def trace(trace_id: str, kind: str = "estimate"):
+    """
+    Groups every span recorded in this context (and in threads started
+    with asyncio.to_thread from it) under trace_id. Thread pools do not
+    copy context, so workers open their own trace().
+    """
+    with _recent_lock:
+        if trace_id not in _recent:
+            _recent[trace_id] = {
+                "trace_id": trace_id,
+                "kind": kind,
+                "started_at": time.time(),
+                "spans": [],
+            }
+        while len(_recent) > TRACE_HISTORY:
+            _recent.popitem(last=False)
+
+    token = _current_trace.set(trace_id)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+
+def _write_log(entry: dict) -> None:
+    if not TRACE_LOG_PATH:
+        return
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(TRACE_LOG_PATH) or ".", exist_ok=True)
+            if (
+                TRACE_LOG_MAX_BYTES
+                and os.path.exists(TRACE_LOG_PATH)
+                and os.path.getsize(TRACE_LOG_PATH) >= TRACE_LOG_MAX_BYTES
+            ):
+                os.replace(TRACE_LOG_PATH, TRACE_LOG_PATH + ".1")
+            with open(TRACE_LOG_PATH, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        # Telemetry must never fail an estimate
+        print(f"   Trace log write failed ({type(e).__name__}): {e}")
+
+
+def record(stage: str, seconds: float, status: str = "ok", **attrs) -> None:
+    """Records one finished stage: histogram, trace log and recent traces."""
+    STAGE_SECONDS.observe(stage, seconds)
+    if status != "ok":
+        with _errors_lock:
+            _stage_errors[stage] = _stage_errors.get(stage, 0) + 1
+
+    trace_id = _current_trace.get()
+    entry = {
+        "trace_id": trace_id,
+        "stage": stage,
+        "ended_at": round(time.time(), 3),
+        "seconds": round(seconds, 4),
+        "status": status,
+        **attrs,
+    }
+    _write_log(entry)
+
+    if trace_id:
+        with _recent_lock:
+            current = _recent.get(trace_id)
+            if current is not None:
+                current["spans"].append(entry)
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Times the block as `stage`; an exception marks it as an error and propagates."""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = "error"
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, status, **attrs)
+
+
+def recent_traces(limit: int = TRACE_HISTORY, kind: Optional[str] = None) -> List[dict]:
+    """Newest first. Each trace has per-stage totals in `stages`."""
+    with _recent_lock:
+        traces = [
+            dict(t, spans=list(t["spans"])) for t in reversed(_recent.values())
+            if kind is None or t["kind"] == kind
+        ]
+
+    for t in traces[:limit]:
+        stages = {}
+        for s in t["spans"]:
+            stages[s["stage"]] = stages.get(s["stage"], 0.0) + s["seconds"]
+        t["stages"] = stages
+        t["failed"] = any(s["status"] != "ok" for s in t["spans"])
+    return traces[:limit]
+
+
+def trace_stages(trace_id: str) -> dict:
+    """Seconds per stage of one trace still held in memory."""
+    with _recent_lock:
+        spans = list((_recent.get(trace_id) or {}).get("spans", []))
+    stages = {}
+    for s in spans:
+        stages[s["stage"]] = round(stages.get(s["stage"], 0.0) + s["seconds"], 4)
+    return stages
+
+
+# ------------------------------------------------------------
+# /metrics endpoint
+# ------------------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[int]:
+    """
+    Starts the /metrics endpoint once per process on METRICS_HOST
+    (METRICS_PORT unless port is given). Returns the bound port, or None
+    when disabled or the port cannot be bound.
+    """
+    global _server
+    if _server is not None:
+        return _server.server_address[1]
+
+    port = port if port is not None else (int(METRICS_PORT) if METRICS_PORT else None)
+    if port is None:
+        return None
+
+    try:
+        _server = ThreadingHTTPServer((METRICS_HOST, port), _MetricsHandler)
+    except OSError as e:
+        # Telemetry must never take the app down
+        print(f"⚠️ Metrics server not started on {METRICS_HOST}:{port} ({type(e).__name__}): {e}")
+        return None
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    print(f"📈 Metrics on {METRICS_HOST}:{_server.server_address[1]}/metrics")
+    return _server.server_address[1]
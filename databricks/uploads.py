@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import cloudinary.uploader
+
+from databricks import telemetry
+from databricks.artifact_index import ARTIFACT_INDEX
+from databricks.clients import datalake_service
+from databricks.image_prep import preprocess_image
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+
+# Uploads running at once for one "Upload Files" click
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+
+# PDFs are appended to ADLS in chunks of this size instead of read whole
+ADLS_CHUNK_SIZE = int(os.getenv("ADLS_CHUNK_SIZE", str(4 * 1024 * 1024)))
+
+
+# ------------------------------------------------------------
+# ADLS (PDFs)
+# ------------------------------------------------------------
+def adls_config() -> tuple:
+    account_name = os.getenv("AZURE_STORAGE_ACCOUNT")
+    account_key = os.getenv("ACCOUNT_KEY")
+    file_system = os.getenv("AZURE_BLOB_CONTAINER")
+
+    if not all([account_name, account_key, file_system]):
+        raise RuntimeError(
+            f"Missing ADLS config. "
+            f"AZURE_STORAGE_ACCOUNT={account_name}, "
+            f"ACCOUNT_KEY={'SET' if account_key else None}, "
+            f"ADLS_FILE_SYSTEM={file_system}"
+        )
+
+    return account_name, account_key, file_system
+
+
+def upload_to_adls(uploaded_file, adls_path: str, skip_existing: bool = False) -> str:
+    """
+    Streams the file to ADLS in ADLS_CHUNK_SIZE pieces (append + flush),
+    so a large PDF is never held in memory twice.
+    With skip_existing, a path that already exists is not written again
+    (used for content-addressed paths).
+    Returns the HTTPS blob URL used by the downstream job.
+    """
+    account_name, account_key, file_system = adls_config()
+    url = f"https://{account_name}.blob.core.windows.net/{file_system}/{adls_path}"
+
+    # Shared, keep-alive client; not rebuilt per uploaded file
+    service_client = datalake_service(account_name, account_key)
+
+    fs_client = service_client.get_file_system_client(file_system)
+    file_client = fs_client.get_file_client(adls_path)
+
+    if skip_existing and file_client.exists():
+        return url
+
+    file_client.create_file()
+
+    uploaded_file.seek(0)
+    offset = 0
+    while True:
+        chunk = uploaded_file.read(ADLS_CHUNK_SIZE)
+        if not chunk:
+            break
+        file_client.append_data(chunk, offset=offset, length=len(chunk))
+        offset += len(chunk)
+
+    file_client.flush_data(offset)
+
+    # Return HTTPS blob URL (for downstream LLM)
+    return url
+
+
+def upload_document_chunks(sha256: str, extracted: dict) -> str:
+    """
+    Stores a PDF's extracted chunks next to the PDF itself
+    (uploads/pdfs/{sha256}/chunks.json) and returns the URL. The payload
+    references it instead of carrying the text, as run-now accepts at
+    most 10,000 bytes of python_params.
+    """
+    body = json.dumps(
+        {"pages": extracted["pages"], "chunks": extracted["chunks"]},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+    return upload_to_adls(io.BytesIO(body), f"uploads/pdfs/{sha256}/chunks.json", skip_existing=True)
+
+
+# ------------------------------------------------------------
+# Cloudinary (images)
+# ------------------------------------------------------------
+def upload_image_to_cloudinary(file, public_id: Optional[str] = None) -> str:
+    file.seek(0)
+    result = cloudinary.uploader.upload(
+        file,
+        resource_type="image",
+        public_id=public_id,
+        # Same content -> same public_id; keep the existing asset
+        overwrite=False
+    )
+    return result["secure_url"]
+
+
+# ------------------------------------------------------------
+# Content addressing
+# ------------------------------------------------------------
+def file_sha256(file) -> str:
+    digest = hashlib.sha256()
+    file.seek(0)
+    while True:
+        chunk = file.read(ADLS_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+# ------------------------------------------------------------
+# Concurrent pipeline
+# ------------------------------------------------------------
+@dataclass
+class UploadResult:
+    name: str
+    kind: str  # "pdf" | "image"
+    url: Optional[str] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+    sha256: Optional[str] = None
+    skipped: bool = False  # content was already uploaded
+    bytes_saved: int = 0   # by image pre-processing
+    artifact_id: Optional[str] = None  # when uploaded from an ArtifactReader
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _prepared_image(file, result: UploadResult):
+    """Downscaled, metadata-free copy of the image; the original if that fails."""
+    try:
+        prepared = preprocess_image(file)
+    except Exception as e:
+        print(f"   {file.name}: pre-processing skipped ({type(e).__name__}: {e})")
+        return file
+
+    result.bytes_saved = prepared.bytes_saved
+    return io.BytesIO(prepared.data)
+
+
+def _upload_sync(file) -> UploadResult:
+    kind = "pdf" if file.name.lower().endswith(".pdf") else "image"
+    result = UploadResult(name=file.name, kind=kind, artifact_id=getattr(file, "artifact_id", None))
+    start = time.time()
+
+    try:
+        # Artifact readers already know their hash
+        result.sha256 = getattr(file, "sha256", None) or file_sha256(file)
+        known_url = ARTIFACT_INDEX.get(result.sha256, kind)
+
+        if known_url:
+            result.url = known_url
+            result.skipped = True
+        else:
+            if kind == "pdf":
+                # Content-addressed path: same bytes share one blob,
+                # different files with the same name no longer collide
+                result.url = upload_to_adls(
+                    file,
+                    f"uploads/pdfs/{result.sha256}/{file.name}",
+                    skip_existing=True
+                )
+            else:
+                result.url = upload_image_to_cloudinary(
+                    _prepared_image(file, result),
+                    public_id=f"uploads/{result.sha256}"
+                )
+            ARTIFACT_INDEX.put(
+                result.sha256, kind, result.url, name=file.name, size=getattr(file, "size", None)
+            )
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+
+    result.seconds = time.time() - start
+    telemetry.record(
+        f"upload.{kind}",
+        result.seconds,
+        status="ok" if result.ok else "error",
+        name=file.name,
+        skipped=result.skipped,
+    )
+    return result
+
+
+async def _upload_all(
+    files: list,
+    on_progress: Optional[Callable[[UploadResult, int, int], None]],
+) -> List[UploadResult]:
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+    async def bounded(file):
+        async with semaphore:
+            return await asyncio.to_thread(_upload_sync, file)
+
+    results = []
+    for done, task in enumerate(asyncio.as_completed([bounded(f) for f in files]), 1):
+        result = await task
+        results.append(result)
+        if on_progress:
+            on_progress(result, done, len(files))
+
+    return results
+
+
+def upload_files(
+    files: list,
+    on_progress: Optional[Callable[[UploadResult, int, int], None]] = None,
+) -> List[UploadResult]:
+    """
+    Uploads every file concurrently (at most UPLOAD_CONCURRENCY at once)
+    under a single event loop. Wall time is close to the slowest upload.
+    Files whose SHA-256 is already in the artifact index are not uploaded
+    again; their result has skipped=True and the known URL.
+
+    on_progress(result, done, total) runs on the calling thread as each
+    file finishes, so it is safe to update Streamlit elements from it.
+    A failed file is reported in its UploadResult and does not stop the rest.
+    """
+    return asyncio.run(_upload_all(files, on_progress))
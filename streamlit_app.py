@@ -3,11 +3,18 @@
 
 
 import os
+import time
 import base64
+from contextlib import contextmanager
+import pandas as pd
 import streamlit as st
-from PyPDF2 import PdfReader
-from databricks.databricks_trigger import run_job_and_get_gdrive_link
+from databricks.run_tracker import cancel_estimate, submit_estimate, get_run
+from databricks.admission import ADMISSION
+from databricks.databricks_trigger import submission_stats
+from databricks.history import HISTORY, format_age
 from databricks.payload import payload_setter
+from databricks.schema import SchemaError, payload_tokens
+from databricks import cost_engine, scenarios, telemetry
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -73,24 +80,83 @@ if "final_prompt" not in st.session_state:
 if "gdrive_link" not in st.session_state:
     st.session_state.gdrive_link = None
 
+if "run_handle_id" not in st.session_state:
+    st.session_state.run_handle_id = None
+
+# The run id is kept in the URL: a reconnect, possibly landing on
+# another replica, picks the run up from the shared state store
+if "run_restored" not in st.session_state:
+    st.session_state.run_restored = True
+    if st.query_params.get("run"):
+        st.session_state.run_handle_id = st.query_params["run"]
+
+if "markets" not in st.session_state:
+    st.session_state.markets = []
+
 
 # ======================================================
-# LOAD CSS
+# RERUN TIMER
 # ======================================================
-def load_css():
-    if os.path.exists("style.css"):
-        with open("style.css", "r") as f:
-            st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+SHOW_RERUN_TIMINGS = os.getenv("SHOW_RERUN_TIMINGS", "").lower() in ("1", "true", "yes")
+SLOW_SECTION_MS = float(os.getenv("SLOW_SECTION_MS", "200"))
+
+if "section_timings" not in st.session_state:
+    st.session_state.section_timings = {}
+
+
+def record_timing(name, elapsed_ms):
+    st.session_state.section_timings[name] = elapsed_ms
+    if elapsed_ms > SLOW_SECTION_MS:
+        print(f"🐢 Slow rerun section '{name}': {elapsed_ms:.0f} ms")
+
+
+@contextmanager
+def timed_section(name):
+    """Times a block (used by fragments, which rerun on their own)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, (time.perf_counter() - start) * 1000)
+
+
+_rerun_started = time.perf_counter()
+_lap_started = _rerun_started
+
+
+def lap(name):
+    """Times the top-level script since the previous lap."""
+    global _lap_started
+    now = time.perf_counter()
+    record_timing(name, (now - _lap_started) * 1000)
+    _lap_started = now
 
-load_css()
 
 # ======================================================
-# FIXED BRANDING
+# STATIC ASSETS (computed once per process)
 # ======================================================
+@st.cache_resource
+def load_css_text():
+    if os.path.exists("style.css"):
+        with open("style.css", "r") as f:
+            return f.read()
+    return ""
+
+
+@st.cache_resource
 def get_base64_image(path):
     with open(path, "rb") as f:
         return base64.b64encode(f.read()).decode()
 
+
+# ======================================================
+# LOAD CSS
+# ======================================================
+st.markdown(f"<style>{load_css_text()}</style>", unsafe_allow_html=True)
+
+# ======================================================
+# FIXED BRANDING
+# ======================================================
 logo_base64 = get_base64_image("./assets/sigmoid-logo.jpeg")
 
 # ======================================================
@@ -109,274 +175,371 @@ st.markdown(
 st.markdown("---")
 
 # ======================================================
-# SIDEBAR
+# SIDEBAR SECTIONS
+# Each input group is a fragment: editing a field reruns only
+# that group, not the whole page. Values live in session state.
 # ======================================================
-with st.sidebar:
-    logo_base64 = get_base64_image("./assets/sigmoid-logo.jpeg")
-
-    st.markdown(
-        f"""
-        <div class="sidebar-logo">
-            <img src="data:image/png;base64,{logo_base64}" class="sidebar-logo">
-            <p class="sidebar-text">Powered by <span class="db-red">Databricks</span></p>
-        </div>
-        <hr class="sidebar-divider">
-        """,
-        unsafe_allow_html=True
-    )
-
-    st.header("User Input")
-
-    client_name = st.text_input(
-        "Client Name",
-        placeholder="Acme Corp"
-    )
-
-    use_case_name = st.text_input(
-        "Use Case Name",
-        placeholder="Annual Budget Planning"
-    )
-
-    # =========================
-    # BUDGET
-    # =========================
-    st.subheader("Budget")
-
-    annual_budget = st.number_input(
-        "Annual Cloud Budget (USD)",
-        min_value=0,
-        value=0,
-        step=10000
-    )
-
-
-    # =========================
-    # MARKET CONFIG
-    # =========================
-    st.subheader("Market Configuration")
-    number_of_markets = st.number_input("Number of Markets", min_value=0, value=0)
-
-    markets = []
-    for i in range(int(number_of_markets)):
-        markets.append({
-            "market": f"M{i+1}",
-            "multiplier": st.number_input(
-                f"Consumption Multiplier (M{i+1})",
-                min_value=0.0, value=0.0, step=0.1, key=f"m_mult_{i}"
-            ),
-            "start_month": st.selectbox(
-                f"Market Entry Month (M{i+1})",
-                list(range(1, 13)), key=f"m_month_{i}"
-            )
-        })
-
-    use_case_type = st.selectbox(
-        "Use Case Type",
-        ["Select use case", "Data Migration", "Machine Learning", "Reporting", "LLM"]
-    )
-
-    cloud_options = ["Databricks", "AWS", "Azure"]
-
-    # =========================
-    # DATA MIGRATION
-    # =========================
-    if use_case_type == "Data Migration":
+cloud_options = ["Databricks", "AWS", "Azure"]
+
+
+@st.fragment
+def market_inputs():
+    with timed_section("sidebar: markets"):
+        st.subheader("Market Configuration")
+        number_of_markets = st.number_input("Number of Markets", min_value=0, value=0)
+
+        markets = []
+        for i in range(int(number_of_markets)):
+            markets.append({
+                "market": f"M{i+1}",
+                "multiplier": st.number_input(
+                    f"Consumption Multiplier (M{i+1})",
+                    min_value=0.0, value=0.0, step=0.1, key=f"m_mult_{i}"
+                ),
+                "start_month": st.selectbox(
+                    f"Market Entry Month (M{i+1})",
+                    list(range(1, 13)), key=f"m_month_{i}"
+                )
+            })
+
+        st.session_state.markets = markets
+
+
+# =========================
+# DATA MIGRATION
+# =========================
+@st.fragment
+def data_migration_inputs():
+    with timed_section("sidebar: data migration"):
         dm = st.session_state.data_migration_store
         st.subheader("Data Migration Inputs")
 
-        dm["cloud_type"] = st.multiselect("Cloud Type", cloud_options, default=[])
+        dm["cloud_type"] = st.multiselect("Cloud Type", cloud_options, default=[], key="dm_cloud_type")
 
         dm["migration_type"] = st.radio(
             "Migration Type",
-            ["One-time Historical Load", "Ongoing Incremental", "Both"]
+            ["One-time Historical Load", "Ongoing Incremental", "Both"],
+            key="dm_migration_type"
         )
 
         dm["pipeline_mode"] = st.radio(
-            "Pipeline Mode", ["Batch", "Streaming"]
+            "Pipeline Mode", ["Batch", "Streaming"],
+            key="dm_pipeline_mode"
         )
 
         dm["historical_data_gb"] = st.number_input(
-            "Historical Data Size (GB)", min_value=0, value=0
+            "Historical Data Size (GB)", min_value=0, value=0,
+            key="dm_historical_data_gb"
         )
         dm["daily_incremental_gb"] = st.number_input(
-            "Daily Incremental Data (GB/day)", min_value=0, value=0
+            "Daily Incremental Data (GB/day)", min_value=0, value=0,
+            key="dm_daily_incremental_gb"
         )
         dm["pipelines"] = st.number_input(
-            "Number of Pipelines", min_value=0, value=0
+            "Number of Pipelines", min_value=0, value=0,
+            key="dm_pipelines"
         )
         dm["runs_per_day"] = st.number_input(
-            "Pipeline Runs per Day", min_value=0, value=0
+            "Pipeline Runs per Day", min_value=0, value=0,
+            key="dm_runs_per_day"
         )
         dm["avg_runtime_hours"] = st.number_input(
-            "Avg Runtime per Pipeline (hours)", min_value=0.0, value=0.0
+            "Avg Runtime per Pipeline (hours)", min_value=0.0, value=0.0,
+            key="dm_avg_runtime_hours"
         )
         dm["source_systems"] = st.number_input(
-            "Source Systems", min_value=0, value=0
+            "Source Systems", min_value=0, value=0,
+            key="dm_source_systems"
         )
         dm["destination_systems"] = st.number_input(
-            "Destination Systems", min_value=0, value=0
+            "Destination Systems", min_value=0, value=0,
+            key="dm_destination_systems"
         )
         dm["transformation_complexity"] = st.selectbox(
             "Transformation Complexity",
-            ["Low (Copy)", "Medium (Joins)", "High (Aggregations / Enrichment)"]
+            ["Low (Copy)", "Medium (Joins)", "High (Aggregations / Enrichment)"],
+            key="dm_transformation_complexity"
         )
         dm["concurrent_pipelines"] = st.number_input(
-            "Max Concurrent Pipelines", min_value=0, value=0
+            "Max Concurrent Pipelines", min_value=0, value=0,
+            key="dm_concurrent_pipelines"
         )
         dm["storage_retention_days"] = st.number_input(
-            "Raw Data Retention (days)", min_value=0, value=0
+            "Raw Data Retention (days)", min_value=0, value=0,
+            key="dm_storage_retention_days"
         )
 
-    # =========================
-    # MACHINE LEARNING
-    # =========================
-    if use_case_type == "Machine Learning":
+
+# =========================
+# MACHINE LEARNING
+# =========================
+@st.fragment
+def ml_inputs():
+    with timed_section("sidebar: machine learning"):
         ml = st.session_state.ml_store
         st.subheader("Machine Learning Inputs")
 
-        ml["cloud_type"] = st.multiselect("Cloud Type", cloud_options, default=[])
+        ml["cloud_type"] = st.multiselect("Cloud Type", cloud_options, default=[], key="ml_cloud_type")
 
         ml["workload_types"] = st.multiselect(
             "Workload Type",
             ["Training", "Batch Inference", "Real-time Inference"],
-            default=[]
+            default=[],
+            key="ml_workload_types"
         )
 
         ml["training_data_gb"] = st.number_input(
-            "Training Data Size (GB)", min_value=0, value=0
+            "Training Data Size (GB)", min_value=0, value=0,
+            key="ml_training_data_gb"
         )
         ml["training_frequency"] = st.selectbox(
             "Training Frequency",
-            ["Daily", "Weekly", "Monthly", "On Demand"]
+            ["Daily", "Weekly", "Monthly", "On Demand"],
+            key="ml_training_frequency"
         )
         ml["avg_training_hours"] = st.number_input(
-            "Avg Training Duration (hours)", min_value=0.0, value=0.0
+            "Avg Training Duration (hours)", min_value=0.0, value=0.0,
+            key="ml_avg_training_hours"
         )
         ml["models_count"] = st.number_input(
-            "Number of Models", min_value=0, value=0
+            "Number of Models", min_value=0, value=0,
+            key="ml_models_count"
         )
         ml["inference_requests_per_day"] = st.number_input(
-            "Inference Requests per Day", min_value=0, value=0
+            "Inference Requests per Day", min_value=0, value=0,
+            key="ml_inference_requests_per_day"
         )
         ml["peak_concurrency"] = st.number_input(
-            "Peak Concurrent Inference Requests", min_value=0, value=0
+            "Peak Concurrent Inference Requests", min_value=0, value=0,
+            key="ml_peak_concurrency"
         )
-        ml["use_gpu"] = st.radio("Use GPU?", ["No", "Yes"])
+        ml["use_gpu"] = st.radio("Use GPU?", ["No", "Yes"], key="ml_use_gpu")
         ml["gpu_hours_per_day"] = (
-            st.number_input("GPU Usage (hours/day)", min_value=0, value=0)
+            st.number_input("GPU Usage (hours/day)", min_value=0, value=0, key="ml_gpu_hours_per_day")
             if ml["use_gpu"] == "Yes" else 0
         )
         ml["model_retention_days"] = st.number_input(
-            "Model Retention (days)", min_value=0, value=0
+            "Model Retention (days)", min_value=0, value=0,
+            key="ml_model_retention_days"
         )
 
-    # =========================
-    # REPORTING
-    # =========================
-    if use_case_type == "Reporting":
+
+# =========================
+# REPORTING
+# =========================
+@st.fragment
+def reporting_inputs():
+    with timed_section("sidebar: reporting"):
         rp = st.session_state.reporting_store
         st.subheader("Reporting Inputs")
 
-        rp["cloud_type"] = st.multiselect("Cloud Type", cloud_options, default=[])
+        rp["cloud_type"] = st.multiselect("Cloud Type", cloud_options, default=[], key="rp_cloud_type")
 
-        rp["tool"] = st.selectbox("Reporting Tool", ["Power BI", "Tableau"])
+        rp["tool"] = st.selectbox("Reporting Tool", ["Power BI", "Tableau"], key="rp_tool")
 
-        rp["user_type"] = st.radio("User Type", ["Viewer", "Pro", "Premium"])
+        rp["user_type"] = st.radio("User Type", ["Viewer", "Pro", "Premium"], key="rp_user_type")
 
         rp["number_of_users"] = st.number_input(
-            "Number of Users", min_value=0, value=0
-        )
-    if use_case_type == "LLM":
-            llm = st.session_state.llm_store
-            st.subheader("LLM Inputs")
-            llm["cloud_type"] = st.multiselect("Cloud Type", cloud_options, default=[])
-            llm["llm_category"] = st.selectbox(
-                "LLM Type",
-                [
-                    "Generative AI",
-                    "Embedding / Vector Search",
-                    "Fine-tuning",
-                    "RAG (Retrieval Augmented Generation)"
-                ]
+            "Number of Users", min_value=0, value=0,
+            key="rp_number_of_users"
+        )
+
+
+# =========================
+# LLM
+# =========================
+@st.fragment
+def llm_inputs():
+    with timed_section("sidebar: llm"):
+        llm = st.session_state.llm_store
+        st.subheader("LLM Inputs")
+        llm["cloud_type"] = st.multiselect("Cloud Type", cloud_options, default=[], key="llm_cloud_type")
+        llm["llm_category"] = st.selectbox(
+            "LLM Type",
+            [
+                "Generative AI",
+                "Embedding / Vector Search",
+                "Fine-tuning",
+                "RAG (Retrieval Augmented Generation)"
+            ],
+            key="llm_llm_category"
+        )
+        llm["llm_model"] = st.selectbox(
+            "LLM Model Version",
+            [
+                "GPT-4.1",
+                "GPT-4o",
+                "GPT-4.0"
+            ],
+            key="llm_llm_model"
+        )
+        llm["requests_per_day"] = st.number_input(
+            "Requests per Day", min_value=0, value=0,
+            key="llm_requests_per_day"
+        )
+
+
+# =========================
+# HISTORY
+# =========================
+@st.fragment
+def history_panel():
+    with timed_section("sidebar: history"):
+        with st.expander("🕘 Past estimates"):
+            col1, col2 = st.columns(2)
+            client_filter = col1.text_input("Client", key="history_client")
+            use_case_filter = col2.text_input("Use case", key="history_use_case")
+            finished_only = st.checkbox("With result only", value=True, key="history_finished")
+
+            rows = HISTORY.search(
+                client_filter,
+                use_case_filter,
+                status="DONE" if finished_only else None
             )
-            llm["llm_model"] = st.selectbox(
-                "LLM Model Version",
-                [
-                    "GPT-4.1",
-                    "GPT-4o",
-                     "GPT-4.0"
-                ]
-                                                                                
+            if not rows:
+                st.caption("No matching estimates yet.")
+                return
+
+            by_id = {r["handle_id"]: r for r in rows}
+            handle_id = st.selectbox(
+                "Estimate",
+                list(by_id),
+                format_func=lambda h: (
+                    f"{by_id[h]['client_name']} / {by_id[h]['use_case_name']} · "
+                    f"{format_age(by_id[h]['submitted_at'])} · {by_id[h]['status']}"
+                ),
+                key="history_selected"
             )
-            llm["requests_per_day"] = st.number_input(
-                        "Requests per Day", min_value=0, value=0
-                            )
-            
-                
-     
-                                                                                                                                                                                                                                                
+            row = by_id[handle_id]
+
+            details = [f"run_id {row['run_id']}"] if row["run_id"] else []
+            if row["cached"]:
+                details.append("reused cached result")
+            if row["duration_s"] is not None:
+                details.append(f"{row['duration_s']:.0f}s")
+            details += [f"{stage} {seconds:.1f}s" for stage, seconds in row["stages"].items()]
+            st.caption(" · ".join(details))
+            if row["error"]:
+                st.caption(f"Error: {row['error'][:200]}")
+
+            if st.button(
+                "Re-open result",
+                key="history_reopen",
+                disabled=not row["drive_link"],
+                use_container_width=True
+            ):
+                st.session_state.gdrive_link = row["drive_link"]
+                # A reload should not bring back the last run instead
+                st.query_params.pop("run", None)
+                st.rerun()
+
+            if st.toggle("Show payload", key="history_show_payload"):
+                st.json(HISTORY.get(handle_id)["payload"], expanded=False)
+
+
+USE_CASE_SECTIONS = {
+    "Data Migration": data_migration_inputs,
+    "Machine Learning": ml_inputs,
+    "Reporting": reporting_inputs,
+    "LLM": llm_inputs,
+}
+
+# Sidebar label -> payload / cost engine key
+USE_CASE_KEYS = {
+    "Data Migration": "data_migration",
+    "Machine Learning": "ml",
+    "Reporting": "reporting",
+    "LLM": "llm",
+}
+
 
 # ======================================================
-# UPLOAD ARTIFACTS
+# SIDEBAR
 # ======================================================
-import cloudinary
-import cloudinary.uploader
-import os
-import asyncio
-import streamlit as st
-from PyPDF2 import PdfReader
-from azure.storage.filedatalake import DataLakeServiceClient
+lap("page setup")
 
-# ------------------------------------------------------
-# Cloudinary config
-# ------------------------------------------------------
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
+with st.sidebar:
+    st.markdown(
+        f"""
+        <div class="sidebar-logo">
+            <img src="data:image/png;base64,{logo_base64}" class="sidebar-logo">
+            <p class="sidebar-text">Powered by <span class="db-red">Databricks</span></p>
+        </div>
+        <hr class="sidebar-divider">
+        """,
+        unsafe_allow_html=True
+    )
 
-# ------------------------------------------------------
-# Async Cloudinary upload
-# ------------------------------------------------------
-async def upload_image_to_cloudinary_async(file):
-    result = await asyncio.to_thread(
-        cloudinary.uploader.upload,
-        file,
-        resource_type="image"
+    st.header("User Input")
+
+    client_name = st.text_input(
+        "Client Name",
+        placeholder="Acme Corp"
     )
-    return result["secure_url"]
 
-from azure.storage.filedatalake import DataLakeServiceClient
-import os
+    use_case_name = st.text_input(
+        "Use Case Name",
+        placeholder="Annual Budget Planning"
+    )
 
-def upload_to_adls(uploaded_file, adls_path):
-    account_name = os.getenv("AZURE_STORAGE_ACCOUNT")
-    account_key = os.getenv("ACCOUNT_KEY")
-    file_system = os.getenv("AZURE_BLOB_CONTAINER")
+    # =========================
+    # BUDGET
+    # =========================
+    st.subheader("Budget")
 
-    if not all([account_name, account_key, file_system]):
-        raise RuntimeError(
-            f"Missing ADLS config. "
-            f"AZURE_STORAGE_ACCOUNT={account_name}, "
-            f"ACCOUNT_KEY={'SET' if account_key else None}, "
-            f"ADLS_FILE_SYSTEM={file_system}"
-        )
+    annual_budget = st.number_input(
+        "Annual Cloud Budget (USD)",
+        min_value=0,
+        value=0,
+        step=10000
+    )
+
+    market_inputs()
 
-    service_client = DataLakeServiceClient(
-        account_url=f"https://{account_name}.dfs.core.windows.net",
-        credential=account_key
+    # Every selected use case goes into one payload and one Databricks run
+    use_case_types = st.multiselect(
+        "Use Case Types",
+        list(USE_CASE_SECTIONS),
+        placeholder="Select one or more use cases"
     )
 
-    fs_client = service_client.get_file_system_client(file_system)
-    file_client = fs_client.get_file_client(adls_path)
+    for use_case_type in use_case_types:
+        USE_CASE_SECTIONS[use_case_type]()
+
+    history_panel()
 
-    uploaded_file.seek(0)
-    file_client.upload_data(uploaded_file.read(), overwrite=True)
+lap("sidebar")
 
-    # Return HTTPS blob URL (for downstream LLM)
-    return f"https://{account_name}.blob.core.windows.net/{file_system}/{adls_path}"
+
+# ======================================================
+# UPLOAD ARTIFACTS
+# ======================================================
+import cloudinary
+import os
+import streamlit as st
+import uuid
+from databricks.artifacts import ARTIFACTS, UploadRejected
+from databricks.uploads import upload_document_chunks, upload_files
+from databricks.pdf_extract import (
+    build_document_manifest,
+    estimate_tokens,
+    extract_pdf,
+    extract_uploaded_pdf,
+)
+
+# ------------------------------------------------------
+# Cloudinary config
+# ------------------------------------------------------
+@st.cache_resource
+def configure_cloudinary():
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+        api_key=os.getenv("CLOUDINARY_API_KEY"),
+        api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+        secure=True
+    )
+
+configure_cloudinary()
 
 # ------------------------------------------------------
 # UI
@@ -384,80 +547,335 @@ def upload_to_adls(uploaded_file, adls_path):
 st.header("Upload Artifacts")
 st.info("Upload PNG, JPG, JPEG, or PDF files.")
 
+# Artifacts are tracked per browser session; abandoned sessions are
+# dropped with their spool files after SESSION_IDLE_SECONDS. The id is
+# kept in the URL so uploads survive a reconnect to another replica.
+if "artifact_session" not in st.session_state:
+    st.session_state.artifact_session = st.query_params.get("session") or uuid.uuid4().hex
+artifact_session = st.session_state.artifact_session
+if st.query_params.get("session") != artifact_session:
+    st.query_params["session"] = artifact_session
+ARTIFACTS.prune_idle()
+
+# A new key after each upload empties the uploader, so Streamlit does not
+# keep its own copy of files that are already spooled / uploaded
+if "uploader_key" not in st.session_state:
+    st.session_state.uploader_key = 0
+
 uploaded_files = st.file_uploader(
     "Select files",
     accept_multiple_files=True,
-    type=["png", "jpg", "jpeg", "pdf"]
+    type=["png", "jpg", "jpeg", "pdf"],
+    key=f"uploader_{st.session_state.uploader_key}"
 )
 
-# Session state to prevent re-upload
-if "image_urls" not in st.session_state:
-    st.session_state.image_urls = []
-
-if "pdf_urls" not in st.session_state:
-    st.session_state.pdf_urls = []
-
-if "extracted_text" not in st.session_state:
-    st.session_state.extracted_text = ""
+# sha256 -> extracted chunks for each uploaded PDF
+if "pdf_documents" not in st.session_state:
+    st.session_state.pdf_documents = {}
 
 # ------------------------------------------------------
 # Upload Button (IMPORTANT)
 # ------------------------------------------------------
-adls_urls = []
-pdf_urls = []
-
-if "image_urls" not in st.session_state:
-    st.session_state.image_urls = []
-
-if "pdf_urls" not in st.session_state:
-    st.session_state.adls_urls = []
-
 if st.button("Upload Files"):
     if not uploaded_files:
         st.warning("Please select files first.")
     else:
-        with st.spinner("Uploading..."):
-            for file in uploaded_files:
-                if file.name.lower().endswith(".pdf"):
-                    adls_path = f"uploads/pdfs/{file.name}"
-                    pdf_url = upload_to_adls(file, adls_path)
+        # Large files go to a spool file; small ones stay in memory within the caps
+        artifacts = []
+        for f in uploaded_files:
+            try:
+                artifacts.append(ARTIFACTS.add(artifact_session, f))
+            except UploadRejected as e:
+                st.error(f"{f.name}: not accepted, {e}")
+        already_uploaded = [a for a in artifacts if a.url]
+        pending = list({a.artifact_id: a for a in artifacts if not a.url}.values())
+        # Results are matched back by id: two files can share a name
+        by_id = {a.artifact_id: a for a in pending}
+
+        for a in already_uploaded:
+            st.info(f"{a.name}: already in this session")
+
+        progress = st.progress(0.0, text="Uploading...")
+
+        def on_upload_done(result, done, total):
+            progress.progress(done / total, text=f"Uploaded {done}/{total} files")
+
+            if not result.ok:
+                st.error(f"{result.name}: upload failed ({result.error})")
+                return
+
+            ARTIFACTS.set_url(by_id[result.artifact_id], result.url)
+
+            if result.skipped:
+                st.info(f"{result.name}: already uploaded, reusing existing copy")
+            elif result.kind == "pdf":
+                st.success(f"PDF uploaded to ADLS: {result.name} ({result.seconds:.1f}s)")
+            else:
+                saved = f", {result.bytes_saved / 1024:.0f} KB saved" if result.bytes_saved else ""
+                st.success(f"Image uploaded successfully: {result.name} ({result.seconds:.1f}s{saved})")
+
+            if result.kind == "pdf":
+                st.code(result.url)
+            else:
+                st.image(result.url, width=200)
+
+        # All files upload concurrently under one event loop, streamed
+        # from memory or from the spool file's mmap
+        readers = [a.open() for a in pending]
+        try:
+            with telemetry.trace(f"upload-{int(time.time() * 1000)}", kind="upload"):
+                results = upload_files(readers, on_progress=on_upload_done)
+        finally:
+            for reader in readers:
+                reader.close()
+
+        # Extract PDF text locally so the job does not parse it on cluster time
+        new_pdfs = [
+            r for r in results
+            if r.ok and r.kind == "pdf" and r.sha256 not in st.session_state.pdf_documents
+        ]
+        if new_pdfs:
+            with st.spinner("Extracting text from PDFs..."):
+                for r in new_pdfs:
+                    artifact = by_id[r.artifact_id]
+                    try:
+                        if artifact.spooled:
+                            extracted = extract_pdf(artifact.path)
+                        else:
+                            with artifact.open() as reader:
+                                extracted = extract_uploaded_pdf(reader)
+                        chunks_uri = upload_document_chunks(r.sha256, extracted)
+                    except Exception as e:
+                        st.warning(f"{r.name}: text extraction failed ({e}); the job will parse it")
+                        continue
+
+                    st.session_state.pdf_documents[r.sha256] = {
+                        "uri": r.url,
+                        "name": r.name,
+                        "sha256": r.sha256,
+                        "chunks_uri": chunks_uri,
+                        **extracted
+                    }
+                    st.caption(
+                        f"{r.name}: {extracted['pages']} pages, "
+                        f"{len(extracted['chunks'])} chunks extracted"
+                    )
+
+        # Only the URLs are needed from here on; failed files keep their
+        # content so the next click can retry them
+        for a in pending:
+            if a.url:
+                ARTIFACTS.release(a)
+        if all(a.url for a in artifacts):
+            st.session_state.uploader_key += 1
+
+# ------------------------------------------------------
+# This session's artifacts
+# ------------------------------------------------------
+session_artifacts = ARTIFACTS.session_artifacts(artifact_session)
+
+if session_artifacts:
+    with st.expander(f"Uploaded files ({len(session_artifacts)})"):
+        for a in session_artifacts:
+            if a.url:
+                where = "uploaded"
+            elif a.spooled:
+                where = "on disk, not uploaded"
+            else:
+                where = "in memory, not uploaded"
+            col_name, col_remove = st.columns([5, 1])
+            col_name.markdown(f"**{a.name}** · {a.size / 1024 / 1024:.1f} MB · {where}")
+            if col_remove.button("Remove", key=f"remove_{a.artifact_id}"):
+                ARTIFACTS.remove(artifact_session, a.artifact_id)
+                if not any(o.sha256 == a.sha256 for o in session_artifacts if o is not a):
+                    st.session_state.pdf_documents.pop(a.sha256, None)
+                st.rerun()
+
+# Derived on every run, so repeated clicks and removals are reflected
+st.session_state.image_urls = [a.url for a in session_artifacts if a.kind == "image" and a.url]
+st.session_state.pdf_urls = [a.url for a in session_artifacts if a.kind == "pdf" and a.url]
+
+
+lap("upload artifacts")
+
+# ======================================================
+# PRELIMINARY ESTIMATE (local, instant)
+# ======================================================
+def current_stores():
+    """Input stores of the use cases selected in the sidebar."""
+    stores = {
+        "data_migration": st.session_state.data_migration_store,
+        "ml": st.session_state.ml_store,
+        "reporting": st.session_state.reporting_store,
+        "llm": st.session_state.llm_store,
+    }
+    return {USE_CASE_KEYS[t]: stores[USE_CASE_KEYS[t]] for t in use_case_types}
+
+
+@st.fragment
+def preliminary_estimate():
+    with timed_section("preliminary estimate"):
+        st.header("Preliminary Estimate")
+        st.caption(
+            "Deterministic local estimate from the inputs above, using indicative "
+            "list prices. Use the AI estimate below for the full analysis."
+        )
+        st.button("Refresh preview", key="refresh_preview")
+
+        est = cost_engine.estimate(
+            current_stores(),
+            st.session_state.markets,
+            annual_budget or None
+        )
+
+        if len(use_case_types) > 1:
+            st.caption(f"Combined cost of {', '.join(use_case_types)} (one run)")
+
+        cols = st.columns(len(cost_engine.CLOUDS))
+        for col, cloud, total, over in zip(
+            cols, cost_engine.CLOUDS, est.annual_by_cloud, est.over_budget()
+        ):
+            col.metric(
+                f"{cloud} (12 months)",
+                f"${total:,.0f}",
+                delta="over budget" if over else None,
+                delta_color="inverse"
+            )
+
+        monthly = pd.DataFrame(
+            est.monthly_by_cloud.T,
+            columns=cost_engine.CLOUDS,
+            index=pd.RangeIndex(1, est.monthly_by_cloud.shape[1] + 1, name="Month")
+        )
+        st.line_chart(monthly)
+
+        if len(use_case_types) > 1:
+            selected = [cost_engine.USE_CASES.index(USE_CASE_KEYS[t]) for t in use_case_types]
+            by_use_case = pd.DataFrame(
+                est.by_use_case[:, selected],
+                index=cost_engine.CLOUDS,
+                columns=use_case_types
+            )
+            by_use_case["Total"] = by_use_case.sum(axis=1)
+            st.dataframe(by_use_case.round(0), use_container_width=True)
+
+        st.dataframe(
+            pd.DataFrame(
+                est.by_resource,
+                index=cost_engine.CLOUDS,
+                columns=cost_engine.RESOURCES
+            ).round(0),
+            use_container_width=True
+        )
 
-                    st.session_state.pdf_urls.append(pdf_url)
 
-                    st.success("PDF uploaded to ADLS")
-                    st.code(pdf_url)
+preliminary_estimate()
+lap("preliminary estimate")
 
-                else:
-                    img_url = asyncio.run(
-                        upload_image_to_cloudinary_async(file)
+
+# ======================================================
+# SCENARIO SWEEP
+# ======================================================
+@st.fragment
+def scenario_sweep():
+    with timed_section("scenario sweep"):
+        with st.expander("Scenario Sweep (what-if across market rollouts and inputs)"):
+            options = scenarios.axis_options(st.session_state.markets, current_stores())
+            # Drop axes whose market or use case was removed since they were picked
+            if "sweep_axes" in st.session_state:
+                st.session_state.sweep_axes = [
+                    a for a in st.session_state.sweep_axes if a in options
+                ]
+            axes = st.multiselect(
+                "Inputs to sweep",
+                options,
+                key="sweep_axes"
+            )
+            value_text = {
+                axis: st.text_input(
+                    f"Values for {axis}",
+                    placeholder="e.g. 1, 1.2, 1.4  or  0.5:2:0.1",
+                    key=f"sweep_values_{axis}"
+                )
+                for axis in axes
+            }
+
+            if st.button("Run sweep", key="run_sweep", disabled=not axes):
+                try:
+                    st.session_state.sweep_result = scenarios.sweep(
+                        current_stores(),
+                        st.session_state.markets,
+                        annual_budget or None,
+                        {axis: scenarios.parse_values(text) for axis, text in value_text.items()}
                     )
+                except ValueError as e:
+                    st.error(f"Sweep failed: {e}")
+                    return
+
+            result = st.session_state.get("sweep_result")
+            if result is None:
+                return
+
+            breach = result.breach
+            st.caption(
+                f"{len(result.scenarios)} scenarios evaluated; "
+                + ", ".join(
+                    f"{cloud}: {int(breach[:, c].sum())} over budget"
+                    for c, cloud in enumerate(cost_engine.CLOUDS)
+                )
+            )
+
+            col_cloud, col_axis = st.columns(2)
+            cloud = col_cloud.selectbox("Cloud", cost_engine.CLOUDS, key="sweep_cloud")
+            axis = col_axis.selectbox("Frontier along", result.axes, key="sweep_frontier_axis")
 
-                    st.session_state.image_urls.append(img_url)
+            st.subheader("Budget-breach frontier")
+            st.dataframe(pd.DataFrame(result.frontier_records(cloud, axis)), use_container_width=True)
 
-                    st.success("Image uploaded successfully!")
-                    st.image(img_url, width=200)
+            st.subheader("All scenarios")
+            st.dataframe(pd.DataFrame(result.records()).round(2), use_container_width=True)
 
 
+scenario_sweep()
+lap("scenario sweep")
+
 # ======================================================
 # AI ANALYSIS
 # ======================================================
 st.header("AI Analysis & Cost Estimation")
 
+def build_payload(user_prompt):
+    return payload_setter(
+        image_uris=st.session_state.image_urls,
+        file_uris=st.session_state.pdf_urls,
+        client_name=client_name,
+        use_case_name=use_case_name,
+        markets=st.session_state.markets,
+        user_prompt=user_prompt,
+        budget=annual_budget,
+        documents=build_document_manifest(
+            list(st.session_state.pdf_documents.values())
+        ),
+        use_cases=current_stores()
+    )
+
+
+# The inputs travel as structured fields of the payload (use_cases,
+# markets, budget); the prompt only carries the instructions
 if st.button(
     "Finish Input & Copy to Prompt",
     type="primary",
     use_container_width=True
 ):
-    st.session_state.final_prompt = f"""
-DATA MIGRATION:
-{st.session_state.data_migration_store}
-
-MACHINE LEARNING:
-{st.session_state.ml_store}
-
-REPORTING:
-{st.session_state.reporting_store}
-""".strip()
+    try:
+        build_payload(None)   # surfaces input problems before copying
+        st.session_state.final_prompt = (
+            "Extract cloud resources and estimate consumption for each use case "
+            "in use_cases and their combined total, across the given markets "
+            "and budget (zero and empty fields omitted). Output JSON only."
+        )
+    except SchemaError as e:
+        st.error("Please fix these inputs:\n\n" + "\n".join(f"- {p}" for p in e.problems))
 
 
 prompt_input = st.text_area(
@@ -467,29 +885,143 @@ prompt_input = st.text_area(
     height=260
 )
 
+
+try:
+    payload_preview_tokens = payload_tokens(build_payload(prompt_input))
+except SchemaError:
+    payload_preview_tokens = None
+
+st.caption(
+    f"Prompt ≈ {estimate_tokens(prompt_input):,} tokens"
+    + (f" · full payload ≈ {payload_preview_tokens:,} tokens" if payload_preview_tokens else "")
+)
+
 st.markdown("---")
 col1, col2 = st.columns([3, 1])
 
+with col2:
+    force_recompute = st.checkbox(
+        "Force recompute",
+        help="Ignore any cached result for identical inputs and run the job again."
+    )
+
 with col1:
-    if st.button("Generate Cost Estimate with AI", type="primary", use_container_width=True):
-        with st.spinner("Analyzing and estimating..."):
-            payload = payload_setter(
-                image_uris=st.session_state.image_urls,
-                file_uris=st.session_state.pdf_urls,
-                client_name=client_name,
-                use_case_name=use_case_name,
-                markets=markets,
-                user_prompt=prompt_input,
-                budget=annual_budget
-            )
+    if st.button(
+        "Generate Cost Estimate with AI",
+        type="primary",
+        use_container_width=True,
+        disabled=st.session_state.run_handle_id is not None
+    ):
+        try:
+            payload = build_payload(prompt_input)
+        except SchemaError as e:
+            st.error("Please fix these inputs:\n\n" + "\n".join(f"- {p}" for p in e.problems))
+            st.stop()
+
+        # Returns immediately; the run is tracked by a background worker
+        handle = submit_estimate(payload, force_recompute=force_recompute)
+        st.session_state.gdrive_link = None
+        st.query_params["run"] = handle.handle_id
+
+        if handle.cached:
+            st.session_state.gdrive_link = handle.drive_link
+            st.toast("⚡ Identical estimate found, reusing the previous result")
+        else:
+            st.session_state.run_handle_id = handle.handle_id
+            st.rerun()
+
+
+# ------------------------------------------------------
+# Run progress (auto-refreshes without blocking the app)
+# ------------------------------------------------------
+def render_partial_result(progress):
+    """
+    progress.json as written by the job, e.g.
+    {"stage": "pricing", "stages_done": [...],
+     "resources": [{...}, ...], "subtotal": {"Azure": 1234.0, ...}, "warnings": [...]}
+    Every key is optional.
+    """
+    with st.container(border=True):
+        stage = progress.get("stage")
+        done = progress.get("stages_done") or []
+        if stage:
+            st.markdown(f"**Partial result** · stage: `{stage}`"
+                        + (f" · done: {', '.join(map(str, done))}" if done else ""))
+
+        subtotal = progress.get("subtotal")
+        if isinstance(subtotal, dict) and subtotal:
+            cols = st.columns(len(subtotal))
+            for col, (name, amount) in zip(cols, subtotal.items()):
+                col.metric(f"{name} so far", f"${float(amount):,.0f}")
+        elif isinstance(subtotal, (int, float)):
+            st.metric("Running subtotal", f"${subtotal:,.0f}")
+
+        resources = progress.get("resources")
+        if isinstance(resources, list) and resources:
+            st.caption(f"{len(resources)} resources extracted so far")
+            if isinstance(resources[0], dict):
+                st.dataframe(pd.DataFrame(resources), hide_index=True, use_container_width=True)
+
+        for warning in progress.get("warnings") or []:
+            st.warning(str(warning))
+
+
+@st.fragment(run_every=5)
+def render_run_progress():
+    handle = get_run(st.session_state.run_handle_id)
+
+    if handle is None:
+        # Expired from the shared store
+        st.session_state.run_handle_id = None
+        st.query_params.pop("run", None)
+        st.rerun()
+
+    if handle.done:
+        st.session_state.run_handle_id = None
+        if handle.status == "DONE":
+            st.session_state.gdrive_link = handle.drive_link
+        elif handle.status == "CANCELLED":
+            st.toast("🛑 Estimate cancelled")
+        else:
+            st.session_state.run_error = handle.error
+        st.rerun()
+
+    label = handle.status.replace("_", " ").title()
+    if handle.job_state:
+        label += f" (Databricks: {handle.job_state})"
+    if handle.cancel_requested:
+        label += " — cancelling"
+
+    st.progress(handle.progress, text=f"⏳ {label} — {int(handle.elapsed)}s elapsed")
+
+    col_info, col_cancel = st.columns([3, 1])
+    if handle.run_id:
+        col_info.caption(f"run_id = {handle.run_id}")
+    elif handle.status == "QUEUED" and handle.queue_position:
+        wait_min = max(1, round((handle.queue_wait_s or 0) / 60))
+        col_info.caption(
+            f"🚦 Waiting for a Databricks slot: #{handle.queue_position} in line, "
+            f"about {wait_min} min"
+        )
+    if col_cancel.button(
+        "Cancel run",
+        key="cancel_run",
+        disabled=handle.cancel_requested,
+        use_container_width=True
+    ):
+        if cancel_estimate(handle.handle_id):
+            st.toast("🛑 Cancelling run...")
+
+    if handle.partial_result:
+        render_partial_result(handle.partial_result)
 
-            try:
-                gdrive_link = run_job_and_get_gdrive_link(payload)
-            except Exception as e:
-                st.error(f"Cost estimation failed: {str(e)}")
-                st.stop()
 
-            st.session_state.gdrive_link = gdrive_link
+if st.session_state.run_handle_id:
+    render_run_progress()
+
+if st.session_state.get("run_error"):
+    st.error(f"Cost estimation failed: {st.session_state.run_error}")
+    st.session_state.run_error = None
 
 
 # if st.button("Generate Cost Estimate with AI",type="primary",use_container_width=True):
@@ -526,4 +1058,68 @@ if st.session_state.gdrive_link:
         "Open Result in Google Drive",
         st.session_state.gdrive_link,
         use_container_width=True
-    )
\ No newline at end of file
+    )
+
+
+# ------------------------------------------------------
+# Timing breakdown (last N runs)
+# ------------------------------------------------------
+@st.cache_resource
+def start_metrics_export():
+    return telemetry.start_metrics_server()
+
+
+start_metrics_export()
+
+recent_traces = telemetry.recent_traces()
+if recent_traces:
+    with st.expander(f"⏱ Pipeline timings (last {len(recent_traces)} runs / uploads)"):
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "started": time.strftime("%H:%M:%S", time.localtime(t["started_at"])),
+                    "kind": t["kind"],
+                    "id": t["trace_id"][:12],
+                    "failed": t["failed"],
+                    **{stage: round(seconds, 2) for stage, seconds in t["stages"].items()},
+                }
+                for t in recent_traces
+            ]),
+            hide_index=True,
+            use_container_width=True
+        )
+        st.caption(
+            "Seconds per stage. admission: waiting for a Databricks slot · "
+            "queue: waiting for a worker · job.pending: "
+            "queueing and cluster start · job.running: job runtime · "
+            "fetch_result: reading the run output (or result.json)."
+        )
+        submissions = submission_stats()
+        if submissions["cold_starts_avoided"]:
+            st.caption(
+                f"Warm capacity: {submissions['cold_starts_avoided']} cold starts avoided "
+                f"({submissions['warm_cluster']} on the warm cluster, "
+                f"{submissions['instance_pool']} from the instance pool, "
+                f"{submissions['job_cluster']} on job clusters)"
+            )
+        admission = ADMISSION.stats()
+        if admission["queued"] or admission["throttled"]:
+            st.caption(
+                f"Admission: {admission['active']} / {admission['cap']} runs active, "
+                f"{admission['queued']} queued from {admission['clients_waiting']} clients, "
+                f"throttled {admission['throttled']} times by the workspace"
+            )
+        spool = ARTIFACTS.stats()
+        if spool["artifacts"]:
+            st.caption(
+                f"Upload buffers (all sessions): {spool['memory_bytes'] / 1024 / 1024:.1f} MB in memory, "
+                f"{spool['spooled']} files / {spool['disk_bytes'] / 1024 / 1024:.1f} MB spooled to disk"
+            )
+
+lap("ai analysis")
+record_timing("total", (time.perf_counter() - _rerun_started) * 1000)
+
+if SHOW_RERUN_TIMINGS:
+    with st.sidebar.expander("⏱ Rerun timings (ms)"):
+        for name, elapsed_ms in st.session_state.section_timings.items():
+            st.caption(f"{name}: {elapsed_ms:.1f}")